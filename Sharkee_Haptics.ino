@@ -22,6 +22,7 @@
 #include <Adafruit_DRV2605.h>
 #include <WiFiUdp.h>
 #include <OSCMessage.h>
+#include <OSCBundle.h>
 #include <ArduinoOTA.h>
 #include <DNSServer.h>
 #include <WiFiManager.h> 
@@ -34,6 +35,10 @@
 const unsigned int CLIENT_LISTENER_PORT = 8000;
 // OSC address sent by the Python router. This unit MUST match this address.
 const char* INTERNAL_OSC_ADDRESS = "/sharkeehaptics/set_intensity"; 
+// Multicast group used by the router's "multicast" transport (MUST match MULTICAST_GROUP in
+// sharkee_router.py). Joining it does not stop unicast/broadcast reception on the same port.
+const bool JOIN_MULTICAST_GROUP = true;
+IPAddress MULTICAST_GROUP(239, 255, 72, 83);
 
 
 // Haptic Logic Configuration
@@ -69,7 +74,10 @@ Adafruit_DRV2605 drv;
 WiFiManager wm;
 int myDeviceID = -1;
 int assignedReceiverIndex = 0;
-char incomingPacket[256];
+// Sized for a bundle carrying all 11 roles (router OUTPUT_FORMAT = "bundle", ~600 bytes)
+char incomingPacket[1024];
+// Full OSC address for this unit's role (e.g. "/sharkeehaptics/set_intensity/head")
+String roleOscAddress;
 
 // Helper function to get the mDNS hostname (e.g., "head")
 String getMDNSHostname() {
@@ -206,12 +214,28 @@ void checkRealtimeTimeout() {
 }
 
 // --- Router OSC Input Handler ---
+void handleRoleIntensity(OSCMessage &msg) {
+  if (msg.isFloat(0)) {
+    setMotorRealtime(msg.getFloat(0));
+  }
+}
+
 void handleRouterOscInput() {
   int packetSize = Udp.parsePacket();
   if (packetSize != 0) {
     int len = Udp.read((uint8_t*)incomingPacket, sizeof(incomingPacket));
     if (len <= 0) return;
     
+    // Bundle mode: one datagram carries every changed role; apply only this unit's role
+    if (len >= 8 && memcmp(incomingPacket, "#bundle", 8) == 0) {
+      OSCBundle bundle;
+      bundle.fill((uint8_t*)incomingPacket, len);
+      if (!bundle.hasError()) {
+        bundle.dispatch(roleOscAddress.c_str(), handleRoleIntensity);
+      }
+      return;
+    }
+    
     OSCMessage msg;
     msg.fill((uint8_t*)incomingPacket, len);
     
@@ -684,8 +708,14 @@ void setupWiFiAndNetwork() {
     Serial.println("Web GUI (Port 80) started.");
     
     // START LISTENING ON CLIENT LISTENER PORT (8000)
-    if (Udp.begin(CLIENT_LISTENER_PORT)) {
+    bool listening = JOIN_MULTICAST_GROUP
+        ? Udp.beginMulticast(WiFi.localIP(), MULTICAST_GROUP, CLIENT_LISTENER_PORT)
+        : Udp.begin(CLIENT_LISTENER_PORT);
+    if (listening) {
         Serial.printf("CLIENT: Listening for Router OSC on UDP port %d\n", CLIENT_LISTENER_PORT);
+        if (JOIN_MULTICAST_GROUP) {
+            Serial.printf("CLIENT: Joined multicast group %s\n", MULTICAST_GROUP.toString().c_str());
+        }
     } else {
         Serial.println("CLIENT: Failed to start OSC listener!");
     }
@@ -718,6 +748,7 @@ void setup() {
     EEPROM.begin(EEPROM_SIZE);
     myDeviceID = loadDeviceID();
     assignedReceiverIndex = loadAssignedReceiverIndex();
+    roleOscAddress = String(INTERNAL_OSC_ADDRESS) + "/" + getMDNSHostname();
     loadGammaFromEEPROM(); // load persisted gamma (if any)
 
     Serial.printf("Loaded Device ID: %d\n", myDeviceID);
@@ -0,0 +1,197 @@
+"""
+Audio to haptics: per-band RMS envelopes from a WAV file or a raw PCM pipe.
+
+PcmReader decodes WAV files (8/16/24/32-bit integer PCM) or a headerless little-endian
+int16 stream (a pipe, FIFO or stdin, e.g. `parec --format=s16le` / `ffmpeg -f s16le -`)
+into mono float blocks. BandEnvelope turns those blocks into one row of band
+intensities per hop:
+
+    framing     Hann-windowed frames of 2 x hop samples, 50% overlap, streaming
+                (leftover samples and the previous half frame are kept between calls)
+    band RMS    rfft of all complete frames at once; each band's mean square is its
+                share of the frame energy (Parseval), i.e. an ideal band-pass + RMS
+    level       dBFS mapped linearly from floor_db (0.0) to ceiling_db (1.0)
+    envelope    per-band attack/release smoothing across hops
+
+Needs NumPy; without it the audio source reports a clear error instead of running.
+"""
+import os
+import stat
+import sys
+import wave
+
+# NumPy is imported on first use (load_numpy), so importing this module stays light
+np = None
+_numpy_missing = False
+
+
+def load_numpy():
+    """Imports NumPy on first call and returns it, or None when it is not installed."""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:  # only needed for the audio source
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np
+
+
+class AudioError(ValueError):
+    """Raised for unsupported audio input."""
+
+
+def _require_numpy():
+    if load_numpy() is None:
+        raise AudioError("The audio source needs NumPy (pip install numpy)")
+
+
+class PcmReader:
+    """
+    Reads mono float32 blocks (-1.0..1.0) from a WAV file or a raw int16 stream.
+
+    `path` ending in ".wav" is opened as WAV; anything else (or "-" for stdin) is read as
+    raw interleaved int16 at `sample_rate` with `channels` channels. A FIFO is opened by
+    the first read(), since opening it blocks until a writer connects.
+    """
+
+    def __init__(self, path, sample_rate=48000, channels=2):
+        _require_numpy()
+        self.path = path
+        self._wave = None
+        # A WAV file is read as fast as asked; a stream is paced by its writer
+        self.is_wav = path.lower().endswith(".wav")
+        if self.is_wav:
+            try:
+                self._wave = wave.open(path, "rb")
+            except wave.Error as e:
+                raise AudioError(f"{path}: {e}") from None
+            if self._wave.getcomptype() != "NONE" or self._wave.getsampwidth() not in (1, 2, 3, 4):
+                self._wave.close()
+                raise AudioError(f"{path}: only uncompressed 8/16/24/32-bit PCM WAV is supported")
+            self.sample_rate = self._wave.getframerate()
+            self.channels = self._wave.getnchannels()
+            self.sample_width = self._wave.getsampwidth()
+            self._file = None
+        else:
+            self.sample_rate = sample_rate
+            self.channels = channels
+            self.sample_width = 2
+            if path == "-":
+                self._file = sys.stdin.buffer
+            elif stat.S_ISFIFO(os.stat(path).st_mode):
+                self._file = None
+            else:
+                self._file = open(path, "rb")
+        self._closed = False
+        self.frames_read = 0
+
+    def read(self, frames):
+        """Returns up to `frames` mono samples as float32; an empty array at end of input."""
+        frame_bytes = self.channels * self.sample_width
+        if self._wave:
+            data = self._wave.readframes(frames)
+        else:
+            if self._file is None:
+                # On the reading thread, so waiting for the FIFO's writer blocks nobody else
+                self._file = open(self.path, "rb")
+                if self._closed:
+                    self._file.close()
+                    return np.zeros(0, dtype=np.float32)
+            data = self._file.read(frames * frame_bytes)
+        data = data[:len(data) - len(data) % frame_bytes]
+        if not data:
+            return np.zeros(0, dtype=np.float32)
+        width = self.sample_width
+        if width == 1:
+            samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        elif width == 2:
+            samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+        elif width == 3:
+            raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+            samples = ((ints ^ 0x800000) - 0x800000).astype(np.float32) / 8388608.0
+        else:
+            samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        self.frames_read += len(samples)
+        return samples
+
+    def close(self):
+        self._closed = True
+        if self._wave:
+            self._wave.close()
+        elif self._file is None:
+            # A read() may be waiting in open() for the FIFO's writer: connect once to release it
+            try:
+                os.close(os.open(self.path, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+        elif self._file is not sys.stdin.buffer:
+            self._file.close()
+
+
+class BandEnvelope:
+    """
+    Streaming band envelopes: process(samples) returns an array of shape (hops, bands).
+
+    `bands` is a list of (low_hz, high_hz). One row is produced per `hop` input samples;
+    samples that do not complete a hop are kept for the next call.
+    """
+
+    def __init__(self, sample_rate, bands, hop=1024, attack_ms=10.0, release_ms=150.0,
+                 floor_db=-50.0, ceiling_db=-10.0):
+        _require_numpy()
+        if not bands:
+            raise AudioError("No audio bands configured")
+        self.sample_rate = sample_rate
+        self.hop = hop
+        self.frame_size = 2 * hop
+        self.window = np.hanning(self.frame_size).astype(np.float32)
+        # Mean square of a band = 2 * sum(|X_k|^2) / (N * sum(w^2)) over the band's bins
+        self._scale = 2.0 / (self.frame_size * float(np.sum(self.window.astype(np.float64) ** 2)))
+        freqs = np.fft.rfftfreq(self.frame_size, 1.0 / sample_rate)
+        self._band_matrix = np.zeros((len(freqs), len(bands)), dtype=np.float32)
+        for index, (low_hz, high_hz) in enumerate(bands):
+            in_band = (freqs >= low_hz) & (freqs < high_hz)
+            if not in_band.any():
+                raise AudioError(f"Band {low_hz}-{high_hz} Hz has no FFT bins at {sample_rate} Hz / {self.frame_size}")
+            self._band_matrix[in_band, index] = 1.0
+        hop_s = hop / sample_rate
+        self._attack = 1.0 - np.exp(-hop_s / (attack_ms / 1000.0)) if attack_ms > 0 else 1.0
+        self._release = 1.0 - np.exp(-hop_s / (release_ms / 1000.0)) if release_ms > 0 else 1.0
+        self.floor_db = floor_db
+        self.ceiling_db = ceiling_db
+        self.reset()
+
+    def reset(self):
+        self._pending = np.zeros(self.hop, dtype=np.float32)  # previous half frame, then leftovers
+        self._envelope = np.zeros(self._band_matrix.shape[1])
+
+    def process(self, samples):
+        buffer = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        hops = (len(buffer) - self.hop) // self.hop
+        if hops <= 0:
+            self._pending = buffer
+            return np.zeros((0, self._band_matrix.shape[1]))
+        used = (hops + 1) * self.hop
+        frames = np.lib.stride_tricks.sliding_window_view(buffer[:used], self.frame_size)[::self.hop]
+        spectrum = np.fft.rfft(frames * self.window, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mean_square = (power @ self._band_matrix) * self._scale
+        level_db = 10.0 * np.log10(np.maximum(mean_square, 1e-12))
+        levels = np.clip((level_db - self.floor_db) / (self.ceiling_db - self.floor_db), 0.0, 1.0)
+        self._pending = buffer[used - self.hop:]
+
+        # Attack/release across hops: sequential in time, vectorized across bands
+        envelope = self._envelope
+        out = np.empty_like(levels)
+        for row in range(hops):
+            target = levels[row]
+            coefficient = np.where(target > envelope, self._attack, self._release)
+            envelope = envelope + coefficient * (target - envelope)
+            out[row] = envelope
+        self._envelope = envelope
+        return out
@@ -0,0 +1,1683 @@
+"""
+Micro-benchmarks for the SharkeeHaptics router hot paths.
+
+Usage:
+    python sharkee_bench.py encode [--iterations N]
+    python sharkee_bench.py receive [--packets N] [--rate PPS]
+    python sharkee_bench.py dispatch [--packets N]
+    python sharkee_bench.py output [--ticks N] [--active K] [--tick-hz HZ]
+    python sharkee_bench.py frame [--frames N]
+    python sharkee_bench.py startup [--runs N]
+    python sharkee_bench.py unicast [--seconds S] [--lookup-ms MS] [--offline K]
+    python sharkee_bench.py multicast [--packets N] [--rate PPS] [--group ADDR] [--interface IP]
+    python sharkee_bench.py sinks [--packets N] [--rate PPS] [--slow-ms MS]
+    python sharkee_bench.py limits [--seconds S] [--settle S] [--active K] [--input-hz HZ] [--noise X]
+                                   [--cap-hz HZ] [--budget MS]
+    python sharkee_bench.py quantize [--samples N] [--gamma G] [--low-end X]
+    python sharkee_bench.py conditioning [--ticks N] [--tick-hz HZ] [--noise X] [--smoothing-ms MS]
+                                         [--input-hz HZ] [--wide K]
+    python sharkee_bench.py mixing [--inputs N] [--ticks N]
+    python sharkee_bench.py patterns [--clips N] [--clip-s S] [--ticks N] [--tick-hz HZ]
+    python sharkee_bench.py load [--rate PPS] [--seconds S] [--burst N] [--noise X] [--patterns N]
+                                 [--engines LIST] [--formats LIST] [--json PATH]
+    python sharkee_bench.py devices [--devices N] [--seconds S] [--keepalive-ms MS]
+    python sharkee_bench.py session [--packets N] [--rate PPS] [--seconds S]
+    python sharkee_bench.py audio [--minutes M] [--sample-rate HZ] [--repeat N]
+    python sharkee_bench.py metrics [--samples N] [--scrapes N]
+
+Each benchmark prints its per-packet cost so runs can be compared between versions.
+"""
+import argparse
+import bisect
+import json
+import math
+import os
+import platform
+import queue
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import wave
+
+from pythonosc import dispatcher
+from pythonosc import osc_bundle_builder
+from pythonosc import osc_message_builder
+from pythonosc import osc_server
+
+import sharkee_audio
+import sharkee_conditioning
+import sharkee_emulator
+import sharkee_frame
+import sharkee_metrics
+import sharkee_mixing
+import sharkee_patterns
+import sharkee_session
+import sharkee_router as router
+
+MAX_DATAGRAM = 65535
+
+# Stand-in for a recorded VRChat session: (address, type tag, weight). VRChat streams every
+# avatar parameter to the router, so locomotion/gesture/viseme traffic dominates and the
+# Receiver_* contacts are a minority. Weights approximate one second of play while touched.
+VRCHAT_PACKET_MIX = [
+    ("/avatar/parameters/VelocityX", "f", 90),
+    ("/avatar/parameters/VelocityY", "f", 90),
+    ("/avatar/parameters/VelocityZ", "f", 90),
+    ("/avatar/parameters/VelocityMagnitude", "f", 90),
+    ("/avatar/parameters/AngularY", "f", 90),
+    ("/avatar/parameters/Upright", "f", 45),
+    ("/avatar/parameters/Grounded", "T", 10),
+    ("/avatar/parameters/Viseme", "i", 40),
+    ("/avatar/parameters/Voice", "f", 40),
+    ("/avatar/parameters/GestureLeft", "i", 8),
+    ("/avatar/parameters/GestureRight", "i", 8),
+    ("/avatar/parameters/GestureLeftWeight", "f", 30),
+    ("/avatar/parameters/GestureRightWeight", "f", 30),
+] + [(address, "f", 25) for address in router.VRC_OSC_MAP.keys()]
+
+
+def _per_packet_ns(func, iterations):
+    """Runs func() `iterations` times and returns the mean cost in nanoseconds."""
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _loopback_sink():
+    """Binds a throwaway UDP socket on loopback so routed output never reaches the LAN."""
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    return sink
+
+
+def _drain_forever(sock):
+    """Discards everything arriving on sock (keeps the loopback sink's buffer from filling)."""
+    while True:
+        sock.recv(MAX_DATAGRAM)
+
+
+def build_packet_mix(count, seed=1, bundle_every=50):
+    """
+    Generates `count` datagrams following VRCHAT_PACKET_MIX (seeded, reproducible).
+
+    Every `bundle_every`-th datagram is a two-message bundle so the pythonosc fallback is exercised.
+    """
+    rng = random.Random(seed)
+    addresses = [entry[0] for entry in VRCHAT_PACKET_MIX]
+    weights = [entry[2] for entry in VRCHAT_PACKET_MIX]
+    tags = {entry[0]: entry[1] for entry in VRCHAT_PACKET_MIX}
+
+    def message(address):
+        builder = osc_message_builder.OscMessageBuilder(address=address)
+        tag = tags[address]
+        if tag == "f":
+            builder.add_arg(round(rng.random(), 3), "f")
+        elif tag == "i":
+            builder.add_arg(rng.randrange(0, 15), "i")
+        else:
+            builder.add_arg(rng.random() < 0.5)
+        return builder.build()
+
+    packets = []
+    for index in range(count):
+        picks = rng.choices(addresses, weights, k=2)
+        if bundle_every and index % bundle_every == bundle_every - 1:
+            bundle = osc_bundle_builder.OscBundleBuilder(osc_bundle_builder.IMMEDIATELY)
+            for address in picks:
+                bundle.add_content(message(address))
+            packets.append(bundle.build().dgram)
+        else:
+            packets.append(message(picks[0]).dgram)
+    return packets
+
+
+def bench_encode(args):
+    """Compares the pythonosc builder path against the pre-encoded template cache."""
+    roles = list(router.CLIENT_MAP.keys())
+    addresses = [router.ROLE_OSC_ADDRESSES[name] for name in roles]
+
+    # Both encoders must produce byte-identical datagrams before timing means anything
+    for address in addresses:
+        for value in (0.0, 0.25, 0.5, 1.0):
+            if router.encode_osc_float(address, value) != router.encode_osc_float_with_builder(address, value):
+                raise SystemExit(f"Template encoding differs from builder output for {address}={value}")
+
+    # Sink socket on loopback so the send variants measure the syscall without touching the LAN
+    sink = _loopback_sink()
+    target = sink.getsockname()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    counter = [0]
+
+    def next_value():
+        counter[0] += 1
+        return (counter[0] % 100) / 100.0
+
+    def builder_encode():
+        i = counter[0] % len(addresses)
+        router.encode_osc_float_with_builder(addresses[i], next_value())
+
+    def template_encode():
+        i = counter[0] % len(roles)
+        router.OSC_ROLE_TEMPLATES[roles[i]] + router._PACK_FLOAT_BE(next_value())
+
+    def builder_send():
+        i = counter[0] % len(addresses)
+        sender.sendto(router.encode_osc_float_with_builder(addresses[i], next_value()), target)
+
+    def template_send():
+        i = counter[0] % len(roles)
+        sender.sendto(router.OSC_ROLE_TEMPLATES[roles[i]] + router._PACK_FLOAT_BE(next_value()), target)
+
+    results = [
+        ("builder (encode)", builder_encode),
+        ("template (encode)", template_encode),
+        ("builder + sendto", builder_send),
+        ("template + sendto", template_send),
+    ]
+    print(f"OSC encode benchmark: {args.iterations} packets per variant, {len(roles)} roles")
+    for label, func in results:
+        func()  # warm up
+        print(f"  {label:<20} {_per_packet_ns(func, args.iterations):10.0f} ns/packet")
+
+    sender.close()
+    sink.close()
+
+
+class _ReceiveProbe:
+    """
+    Wraps the router handler and timestamps completion of each packet.
+
+    The float argument of every generated packet carries its sequence number
+    (exact in float32 below 2**24), so latency is matched per packet even when
+    the threaded server reorders them.
+    """
+
+    def __init__(self, count):
+        self.sent_ns = [0] * count
+        self.latencies_ns = []
+        self.last_done_ns = 0
+
+    def handler(self, address, *args):
+        router.sharkeehaptics_router_handler(address, *args)
+        done = time.perf_counter_ns()
+        self.latencies_ns.append(done - self.sent_ns[int(args[0])])
+        self.last_done_ns = done
+
+
+def _start_receive_engine(kind, handler):
+    """Starts the requested engine on an ephemeral loopback port. Returns (target, stop)."""
+    if kind == "threading":
+        d = dispatcher.Dispatcher()
+        for address in router.VRC_OSC_MAP.keys():
+            d.map(address, handler)
+        server = osc_server.ThreadingOSCUDPServer(("127.0.0.1", 0), d)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join(timeout=1)
+        return server.server_address, stop
+
+    engine = router.OscReceiveEngine(("127.0.0.1", 0), handler)
+    engine.start()
+    return engine.sock.getsockname(), engine.stop
+
+
+def _drive_receive(kind, count, rate):
+    """Sends `count` mapped packets at `rate` pps (0 = flood) and collects probe results."""
+    addresses = list(router.VRC_OSC_MAP.keys())
+    packets = [router.encode_osc_float(addresses[seq % len(addresses)], float(seq)) for seq in range(count)]
+    probe = _ReceiveProbe(count)
+    target, stop = _start_receive_engine(kind, probe.handler)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    interval_ns = int(1e9 / rate) if rate else 0
+
+    start = time.perf_counter_ns()
+    next_send = start
+    for seq, packet in enumerate(packets):
+        if interval_ns:
+            while time.perf_counter_ns() < next_send:
+                pass
+            next_send += interval_ns
+        probe.sent_ns[seq] = time.perf_counter_ns()
+        sender.sendto(packet, target)
+
+    # Wait until the engine goes quiet (everything handled or dropped)
+    handled = -1
+    while handled != len(probe.latencies_ns):
+        handled = len(probe.latencies_ns)
+        time.sleep(0.3)
+    stop()
+    sender.close()
+
+    latencies = sorted(probe.latencies_ns)
+    elapsed_s = max(probe.last_done_ns - start, 1) / 1e9
+    return {
+        "handled": handled,
+        "dropped": count - handled,
+        "pps": handled / elapsed_s,
+        "p50_us": _percentile(latencies, 50) / 1000.0,
+        "p99_us": _percentile(latencies, 99) / 1000.0,
+    }
+
+
+def bench_receive(args):
+    """Compares ThreadingOSCUDPServer + Dispatcher against the single-threaded OscReceiveEngine."""
+    sink = _loopback_sink()
+    router.BROADCAST_TARGET = sink.getsockname()
+    threading.Thread(target=_drain_forever, args=(sink,), daemon=True).start()
+
+    print(f"Receive benchmark: {args.packets} packets, flood and paced at {args.rate} pps")
+    print(f"  {'engine':<10} {'phase':<7} {'handled':>8} {'dropped':>8} {'pkt/s':>10} {'p50 us':>9} {'p99 us':>9}")
+    for kind in ("threading", "engine"):
+        for phase, rate in (("flood", 0), ("paced", args.rate)):
+            r = _drive_receive(kind, args.packets, rate)
+            print(f"  {kind:<10} {phase:<7} {r['handled']:>8} {r['dropped']:>8} {r['pps']:>10.0f} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+
+
+def bench_dispatch(args):
+    """Datagram dispatch throughput: pythonosc Dispatcher vs OscPacket + dict vs byte-level fast path."""
+    packets = build_packet_mix(args.packets)
+    routed = []
+
+    def handler(address, *params):
+        routed.append((address, float(params[0])))
+
+    d = dispatcher.Dispatcher()
+    for address in router.VRC_OSC_MAP.keys():
+        d.map(address, handler)
+    engine = router.OscReceiveEngine(("127.0.0.1", 0), handler)  # never started; dispatch only
+
+    variants = [
+        ("Dispatcher", lambda data: d.call_handlers_for_packet(data, ("127.0.0.1", 0))),
+        ("OscPacket + dict", lambda data: router.dispatch_osc_datagram(data, handler)),
+        ("fast path", lambda data: engine.dispatch_datagram(data, len(data))),
+    ]
+    results = {}
+    print(f"Dispatch benchmark: {len(packets)} datagrams, {len(VRCHAT_PACKET_MIX)} parameters in the mix")
+    for label, func in variants:
+        routed.clear()
+        start = time.perf_counter_ns()
+        for data in packets:
+            func(data)
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        results[label] = list(routed)
+        print(f"  {label:<18} {len(packets) / elapsed:12.0f} datagrams/s   {elapsed * 1e9 / len(packets):8.0f} ns/datagram   routed {len(routed)}")
+    engine.sock.close()
+
+    # Float32 rounding is identical on every path, so the routed sequences must match exactly
+    if len({tuple(r) for r in results.values()}) != 1:
+        raise SystemExit("Dispatch variants routed different messages")
+    print(f"  fast-path hits {engine.fast_path_hits}, pythonosc fallbacks {engine.fallbacks}, parse errors {engine.parse_errors}")
+
+
+def bench_output(args):
+    """Message vs bundle output: datagrams, bytes on air and estimated airtime per scheduler tick."""
+    sink = _loopback_sink()
+    router.BROADCAST_TARGET = sink.getsockname()
+    threading.Thread(target=_drain_forever, args=(sink,), daemon=True).start()
+    roles = router.ROLE_NAMES[:args.active]
+
+    print(f"Output benchmark: {args.ticks} ticks, {len(roles)} roles changing every tick, airtime at {args.tick_hz} Hz")
+    print(f"  {'format':<8} {'datagrams/tick':>15} {'payload B/tick':>15} {'on-air B/tick':>14} "
+          f"{'airtime ms/s':>13} {'us/tick (CPU)':>14} {'datagrams/s':>12} {'updates/s':>10}")
+    for name in sorted(router.OUTPUT_FORMATS):
+        scheduler = router.OutputScheduler(tick_hz=args.tick_hz, keepalive_interval_ms=0, output_format=name)
+        elapsed_ns = 0
+        for tick in range(args.ticks):
+            value = 0.2 + 0.5 * (tick % 2)  # always crosses INTENSITY_THRESHOLD
+            for receiver_name in roles:
+                index = router.ROLE_INDEX[receiver_name]
+                router.ROLE_INPUT_VALUES[index] = value
+                router.ROLE_INPUT_SEQ[index] += 1
+            start = time.perf_counter_ns()
+            scheduler.tick()
+            elapsed_ns += time.perf_counter_ns() - start
+
+        output = scheduler.output
+        datagrams_per_tick = output.datagrams / args.ticks
+        payload_per_tick = output.bytes / args.ticks
+        on_air_per_tick = payload_per_tick + datagrams_per_tick * router.WIFI_DATAGRAM_OVERHEAD_BYTES
+        airtime_us_per_tick = router.estimate_airtime_us(output.datagrams, output.bytes) / args.ticks
+        us_per_tick = elapsed_ns / args.ticks / 1000.0
+        print(f"  {name:<8} {datagrams_per_tick:>15.1f} {payload_per_tick:>15.0f} {on_air_per_tick:>14.0f} "
+              f"{airtime_us_per_tick * args.tick_hz / 1000.0:>13.1f} {us_per_tick:>14.1f} "
+              f"{output.datagrams / (elapsed_ns / 1e9):>12.0f} {scheduler.sends / (elapsed_ns / 1e9):>10.0f}")
+    sink.close()
+
+
+def bench_frame(args):
+    """Binary frame protocol: round-trip check over random frames, then encode/decode throughput."""
+    rng = random.Random(7)
+    role_count = len(router.ROLE_NAMES)
+    frames = []
+    for _ in range(args.frames):
+        roles = rng.sample(range(role_count), rng.randint(1, role_count))
+        frames.append((rng.randrange(0x10000), {index: rng.randrange(256) for index in roles}))
+
+    # Round trip, including the clamping/rounding of the float -> level quantizer
+    for sequence, levels in frames:
+        if sharkee_frame.decode_frame(sharkee_frame.encode_frame(sequence, levels)) != (sequence, levels):
+            raise SystemExit(f"Round trip failed for sequence {sequence}: {levels}")
+    for level in range(256):
+        if sharkee_frame.intensity_to_level(level / 255.0) != level:
+            raise SystemExit(f"Quantizer does not round-trip level {level}")
+    for bad in (b"", b"SH\x00\x01", b"XX\x00\x01\x00\x01\x10", b"SH\x00\x01\x00\x03\x10"):
+        try:
+            sharkee_frame.decode_frame(bad)
+        except sharkee_frame.FrameError:
+            continue
+        raise SystemExit(f"Malformed frame {bad!r} was accepted")
+
+    encoded = [sharkee_frame.encode_frame(sequence, levels) for sequence, levels in frames]
+    full_mask = (1 << role_count) - 1
+    full_levels = bytearray(rng.randrange(256) for _ in range(role_count))
+    buffer = bytearray(sharkee_frame.FRAME_MAX_SIZE)
+    print(f"Binary frame benchmark: {len(frames)} random frames round-tripped OK, "
+          f"full {role_count}-role frame = {sharkee_frame.FRAME_HEADER.size + role_count} bytes")
+
+    variants = [
+        ("pack_frame_into (all roles)", lambda i: sharkee_frame.pack_frame_into(buffer, i, full_mask, full_levels)),
+        ("encode_frame (random)", lambda i: sharkee_frame.encode_frame(*frames[i % len(frames)])),
+        ("decode_frame (random)", lambda i: sharkee_frame.decode_frame(encoded[i % len(encoded)])),
+    ]
+    for label, func in variants:
+        start = time.perf_counter_ns()
+        for i in range(args.frames):
+            func(i)
+        elapsed = (time.perf_counter_ns() - start) / 1e9
+        print(f"  {label:<28} {args.frames / elapsed:12.0f} frames/s   {elapsed * 1e9 / args.frames:8.0f} ns/frame")
+
+
+class _StubResolver:
+    """Local resolver stand-in: slow lookups, every hostname on loopback except the offline ones."""
+
+    def __init__(self, offline, lookup_s):
+        self.offline = set(offline)
+        self.lookup_s = lookup_s
+        self.calls = {}
+
+    def __call__(self, hostname):
+        self.calls[hostname] = self.calls.get(hostname, 0) + 1
+        time.sleep(self.lookup_s)
+        if hostname in self.offline:
+            raise OSError(f"{hostname}: no such host (stub)")
+        return "127.0.0.1"
+
+
+def bench_unicast(args):
+    """Unicast transport against a stub resolver: send path never waits on lookups, TTL and negative caching hold."""
+    sink = _loopback_sink()
+    sink.settimeout(0.2)
+    roles = router.ROLE_NAMES
+    offline = [router.CLIENT_MAP[name] for name in roles[len(roles) - args.offline:]]
+    stub = _StubResolver(offline, args.lookup_ms / 1000.0)
+    ttl_s, negative_ttl_s = 1.0, 0.25
+    resolver = router.HostnameResolver(port=sink.getsockname()[1], resolve=stub, ttl_s=ttl_s, negative_ttl_s=negative_ttl_s)
+    transport = router.UnicastTransport(resolver)
+
+    received = {}
+    def drain():
+        while True:
+            try:
+                data = sink.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                return
+            address = data[:data.index(b"\x00")].decode()
+            received[address] = received.get(address, 0) + 1
+    drain_thread = threading.Thread(target=drain, daemon=True)
+    drain_thread.start()
+
+    scheduler = router.OutputScheduler(keepalive_interval_ms=0, output_format="message")
+    router.ACTIVE_TRANSPORT = transport
+    transport.start()
+    tick_ns = []
+    deadline = time.perf_counter() + args.seconds
+    tick = 0
+    try:
+        while time.perf_counter() < deadline:
+            value = 0.2 + 0.5 * (tick % 2)
+            for index in range(len(roles)):
+                router.ROLE_INPUT_VALUES[index] = value
+                router.ROLE_INPUT_SEQ[index] += 1
+            start = time.perf_counter_ns()
+            scheduler.tick()
+            tick_ns.append(time.perf_counter_ns() - start)
+            tick += 1
+            time.sleep(scheduler.period_s)
+    finally:
+        transport.stop()
+        router.ACTIVE_TRANSPORT = router.DEFAULT_TRANSPORT
+    drain_thread.join()
+    sink.close()
+
+    tick_ns.sort()
+    stats = transport.stats()
+    print(f"Unicast benchmark: {args.seconds:.1f} s at {scheduler.tick_hz} Hz, {len(roles)} roles, "
+          f"{len(offline)} offline, stub lookups take {args.lookup_ms:.0f} ms")
+    print(f"  tick cost: p50 {_percentile(tick_ns, 50) / 1000.0:.1f} us, p99 {_percentile(tick_ns, 99) / 1000.0:.1f} us, "
+          f"max {tick_ns[-1] / 1000.0:.1f} us (a blocking lookup would show up as >= {args.lookup_ms:.0f} ms)")
+    print(f"  resolved {stats['resolved']}/{stats['roles']}, {stats['lookups']} lookups ({stats['lookup_failures']} failed), "
+          f"{stats['unresolved']} sends skipped for unresolved roles")
+    online_calls = [stub.calls.get(router.CLIENT_MAP[name], 0) for name in roles if router.CLIENT_MAP[name] not in offline]
+    offline_calls = [stub.calls.get(hostname, 0) for hostname in offline]
+    print(f"  lookups per hostname: online {min(online_calls)}-{max(online_calls)} (TTL {ttl_s} s), "
+          f"offline {min(offline_calls, default=0)}-{max(offline_calls, default=0)} (negative TTL {negative_ttl_s} s)")
+
+    offline_addresses = {router.ROLE_OSC_ADDRESSES[name] for name in roles if router.CLIENT_MAP[name] in offline}
+    leaked = offline_addresses & set(received)
+    if leaked:
+        raise SystemExit(f"Offline roles received datagrams: {sorted(leaked)}")
+    missing = [name for name in roles if router.ROLE_OSC_ADDRESSES[name] not in offline_addresses | set(received)]
+    if missing:
+        raise SystemExit(f"Resolved roles never received a datagram: {missing}")
+    print(f"  delivered {sum(received.values())} datagrams, only to resolved roles")
+
+
+def bench_multicast(args):
+    """Multicast transport loopback test: a local group member receives every datagram; delivery latency."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    listener.bind(("", 0))
+    membership = socket.inet_aton(args.group) + socket.inet_aton(args.interface or "0.0.0.0")
+    listener.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    listener.settimeout(0.5)
+
+    # TTL 0 with loopback: delivered to members on this host only, nothing goes on the wire
+    transport = router.MulticastTransport(group=args.group, port=listener.getsockname()[1], ttl=0,
+                                          interface=args.interface, loopback=True)
+    transport.start()
+    address = router.ROLE_OSC_ADDRESSES[router.ROLE_NAMES[0]]
+    mask = router.ROLE_MASKS[router.ROLE_NAMES[0]]
+    sent_ns = [0] * args.packets
+    latencies = []
+
+    def receive():
+        unpack = struct.Struct(">f").unpack_from
+        while len(latencies) < args.packets:
+            try:
+                data = listener.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                return
+            now = time.perf_counter_ns()
+            # The float argument carries the packet index (exact up to 2**24)
+            latencies.append(now - sent_ns[int(unpack(data, len(data) - 4)[0])])
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    interval = 1.0 / args.rate
+    next_send = time.perf_counter()
+    for seq in range(args.packets):
+        while time.perf_counter() < next_send:
+            pass
+        next_send += interval
+        datagram = router.encode_osc_float(address, float(seq))
+        sent_ns[seq] = time.perf_counter_ns()
+        transport.send(datagram, mask)
+    receiver.join()
+    transport.stop()
+    listener.close()
+
+    latencies.sort()
+    print(f"Multicast loopback test: {args.packets} datagrams to {transport.describe()} at {args.rate} pps")
+    print(f"  delivered {len(latencies)}/{args.packets}, latency p50 {_percentile(latencies, 50) / 1000.0:.1f} us, "
+          f"p99 {_percentile(latencies, 99) / 1000.0:.1f} us, max {latencies[-1] / 1000.0 if latencies else 0.0:.1f} us")
+    if len(latencies) != args.packets:
+        raise SystemExit("Multicast datagrams were lost on loopback")
+
+
+class _SlowTransport:
+    """Sink transport standing in for a stalled recorder: every send blocks for a while."""
+
+    name = "slow"
+
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def send(self, datagram, role_mask):
+        time.sleep(self.delay_s)
+
+    def describe(self):
+        return f"slow sink ({self.delay_s * 1000.0:.0f} ms per send)"
+
+    def stats(self):
+        return {'name': self.name}
+
+
+def _measure_fanout_latency(fanout, receiver, count, rate):
+    """Sends `count` indexed datagrams through the fan-out; returns sorted receive latencies (ns)."""
+    address = router.ROLE_OSC_ADDRESSES[router.ROLE_NAMES[0]]
+    mask = router.ROLE_MASKS[router.ROLE_NAMES[0]]
+    sent_ns = [0] * count
+    latencies = []
+
+    def receive():
+        unpack = struct.Struct(">f").unpack_from
+        while len(latencies) < count:
+            try:
+                data = receiver.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                return
+            latencies.append(time.perf_counter_ns() - sent_ns[int(unpack(data, len(data) - 4)[0])])
+
+    thread = threading.Thread(target=receive, daemon=True)
+    thread.start()
+    interval = 1.0 / rate
+    next_send = time.perf_counter()
+    for seq in range(count):
+        # Sleep rather than spin: a spinning sender would hold the GIL the sink threads need
+        remaining = next_send - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        next_send += interval
+        datagram = router.encode_osc_float(address, float(seq))
+        sent_ns[seq] = time.perf_counter_ns()
+        fanout.send(datagram, mask)
+    thread.join()
+    return sorted(latencies)
+
+
+def bench_sinks(args):
+    """Per-sink queues: a stalled sink next to the broadcast sink must not delay or drop Wi-Fi datagrams."""
+    receiver = _loopback_sink()
+    receiver.settimeout(0.5)
+    router.BROADCAST_TARGET = receiver.getsockname()
+
+    print(f"Sink benchmark: {args.packets} datagrams at {args.rate} pps, slow sink blocks {args.slow_ms:.0f} ms per send")
+    print(f"  {'sinks':<22} {'delivered':>10} {'p50 us':>8} {'p99 us':>8} {'max us':>9}   per-sink stats")
+    for label, with_slow in (("broadcast", False), ("broadcast + slow", True)):
+        sinks = [router.OutputSink("broadcast", router.BroadcastTransport())]
+        if with_slow:
+            sinks.append(router.OutputSink("slow", _SlowTransport(args.slow_ms / 1000.0)))
+        fanout = router.OutputFanout(sinks)
+        fanout.start()
+        latencies = _measure_fanout_latency(fanout, receiver, args.packets, args.rate)
+        stats = [sink.stats() for sink in fanout.sinks]
+        # Do not wait for the slow sink to work through its backlog
+        for sink in fanout.sinks:
+            while not sink.queue.empty():
+                try:
+                    sink.queue.get_nowait()
+                except queue.Empty:
+                    break
+        fanout.stop()
+        summary = "; ".join(f"{sink['sink']}: sent {sink['sent']}, dropped {sink['dropped']}, queue {sink['queue_depth']}"
+                            for sink in stats)
+        print(f"  {label:<22} {len(latencies):>10} {_percentile(latencies, 50) / 1000.0:>8.1f} "
+              f"{_percentile(latencies, 99) / 1000.0:>8.1f} {latencies[-1] / 1000.0 if latencies else 0.0:>9.1f}   {summary}")
+        if len(latencies) != args.packets:
+            raise SystemExit(f"The broadcast sink lost datagrams with sinks: {label}")
+    receiver.close()
+
+
+def _reset_role_state():
+    """Forgets what was sent per role so each limits scenario starts from stopped motors."""
+    router.reset_role_state()
+    router.reset_counters()
+
+
+def bench_limits(args):
+    """Rate cap and adaptive deadband on a noisy trace (active roles) plus near-zero noise (idle roles)."""
+    sink = _loopback_sink()
+    router.BROADCAST_TARGET = sink.getsockname()
+    threading.Thread(target=_drain_forever, args=(sink,), daemon=True).start()
+    active = router.ROLE_NAMES[:args.active]
+    idle = router.ROLE_NAMES[args.active:]
+    scenarios = [
+        ("default", 0, 0),
+        (f"cap {args.cap_hz:g} Hz", args.cap_hz, 0),
+        (f"budget {args.budget:g} ms/s", 0, args.budget),
+    ]
+
+    print(f"Limits benchmark: {args.seconds:g} s per scenario, {len(active)} noisy + {len(idle)} idle roles, "
+          f"inputs at {args.input_hz} Hz per role")
+    print(f"  {'scenario':<18} {'sends/s':>8} {'idle sends':>11} {'suppressed':>11} {'airtime ms/s':>13} "
+          f"{f'windows after {args.settle:g} s: mean min-max':>32} {'deadband x':>11}")
+    for label, cap_hz, budget in scenarios:
+        _reset_role_state()
+        router.DEFAULT_ROLE_MAX_SEND_HZ = cap_hz
+        scheduler = router.OutputScheduler(keepalive_interval_ms=0, airtime_budget_ms_per_s=budget)
+        rng = random.Random(3)
+        levels = {name: 0.5 for name in active}
+        interval = 1.0 / args.input_hz
+        scheduler.start_thread()
+        start = time.perf_counter()
+        next_input = start
+        # Airtime of each adaptive window once the controller had time to settle
+        windows = []
+        next_window = start + args.settle
+        while next_input - start < args.seconds:
+            if next_input >= next_window:
+                next_window += router.ADAPTIVE_DEADBAND_WINDOW_S
+                windows.append(scheduler.airtime_ms_per_s)
+            remaining = next_input - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            next_input += interval
+            for receiver_name in active:
+                # Random walk: mostly small steps, enough to cross the default deadband often
+                level = min(1.0, max(0.0, levels[receiver_name] + rng.gauss(0.0, args.noise)))
+                levels[receiver_name] = level
+                index = router.ROLE_INDEX[receiver_name]
+                router.ROLE_INPUT_VALUES[index] = level
+                router.ROLE_INPUT_SEQ[index] += 1
+            for receiver_name in idle:
+                # Sensor noise around zero, always below the stop threshold
+                index = router.ROLE_INDEX[receiver_name]
+                router.ROLE_INPUT_VALUES[index] = abs(rng.gauss(0.0, router.INTENSITY_THRESHOLD / 8))
+                router.ROLE_INPUT_SEQ[index] += 1
+        scheduler.stop()
+        elapsed = time.perf_counter() - start
+        stats = scheduler.stats()
+        idle_sends = sum(router.ROLE_SENT[router.ROLE_INDEX[name]] for name in idle)
+        airtime_ms = router.estimate_airtime_us(stats['datagrams'], stats['bytes']) / 1000.0
+        spread = (f"{sum(windows) / len(windows):.1f} {min(windows):.1f}-{max(windows):.1f}" if windows else "-")
+        print(f"  {label:<18} {stats['sends'] / elapsed:>8.0f} {idle_sends:>11} {sum(stats['role_suppressed']):>11} "
+              f"{airtime_ms / elapsed:>13.1f} {spread:>32} {stats['deadband_scale']:>11.2f}")
+    router.DEFAULT_ROLE_MAX_SEND_HZ = 0
+    sink.close()
+
+
+def build_contact_trace(samples, seed=5):
+    """
+    Seeded stand-in for one role's recorded contact intensity, one value per input update.
+
+    Cycles through touches: a ramp in, a noisy hold, a slow crawl along the low end (where
+    one motor step is a large relative change), a release and a few idle updates near zero.
+    """
+    rng = random.Random(seed)
+    trace = []
+    while len(trace) < samples:
+        peak = rng.uniform(0.3, 1.0)
+        crawl_from = rng.uniform(0.08, 0.2)
+        steps = rng.randrange(20, 60)
+        trace += [peak * (i + 1) / steps for i in range(steps)]
+        trace += [min(1.0, max(0.0, peak + rng.gauss(0.0, 0.004))) for _ in range(rng.randrange(50, 200))]
+        trace += [crawl_from + (peak - crawl_from) * (1.0 - i / 40) for i in range(40)]
+        trace += [crawl_from * (1.0 - i / 150) + rng.gauss(0.0, 0.001) for i in range(150)]
+        trace += [abs(rng.gauss(0.0, 0.005)) for _ in range(rng.randrange(20, 80))]
+    return trace[:samples]
+
+
+def bench_quantize(args):
+    """
+    Raw-float vs device-level change detection, replayed over a contact trace at the firmware gamma.
+
+    Loss is measured against the unquantized input, independently of either detector: per
+    update, the motor duty the device is left at (the level of the last send) is compared
+    with the duty the raw value asks for (value ** gamma, 0 below DEVICE_MIN_INTENSITY).
+    The "every update" row sends everything and shows the error of quantization alone.
+    """
+    router.DEVICE_GAMMA = args.gamma
+    router.rebuild_level_thresholds()
+    roles = router.ROLE_NAMES
+    traces = [build_contact_trace(args.samples, seed) for seed in range(len(roles))]
+    low_end = ((args.low_end + 0.5) / 255.0) ** (1.0 / args.gamma)
+
+    print(f"Quantize benchmark: {args.samples} updates x {len(roles)} roles, device gamma {args.gamma:g}, "
+          f"deadband {router.INTENSITY_THRESHOLD:g}")
+    print(f"  {'detection':<13} {'sends':>7} {'same-level sends':>17} {'duty err % mean':>16} {'p99':>6} "
+          f"{'low-end mean':>13} {'us/update':>10}")
+    for label, quantize in (("every update", None), ("float", False), ("level", True)):
+        _reset_role_state()
+        router.QUANTIZE_TO_DEVICE = bool(quantize)
+        sent = []
+        send = lambda receiver_name, value: sent.append(value)
+        sends = same_level = 0
+        errors = []
+        low_end_errors = []
+        elapsed_ns = 0
+        for index, receiver_name in enumerate(roles):
+            device_level = 0
+            for value in traces[index]:
+                del sent[:]
+                start = time.perf_counter_ns()
+                if quantize is None:
+                    send(receiver_name, value)
+                else:
+                    router.emit_role_intensity(receiver_name, value, send)
+                elapsed_ns += time.perf_counter_ns() - start
+                if sent:
+                    sends += 1
+                    new_level = router.intensity_to_device_level(index, sent[0])
+                    if new_level == device_level:
+                        same_level += 1
+                    device_level = new_level
+                ideal = min(1.0, value) ** args.gamma if value >= router.DEVICE_MIN_INTENSITY else 0.0
+                error = abs(device_level / 255.0 - ideal) * 100.0
+                errors.append(error)
+                if value <= low_end:
+                    low_end_errors.append(error)
+        errors.sort()
+        total = args.samples * len(roles)
+        low_end_mean = sum(low_end_errors) / len(low_end_errors) if low_end_errors else 0.0
+        print(f"  {label:<13} {sends:>7} {same_level:>17} {sum(errors) / total:>16.3f} "
+              f"{errors[int(0.99 * (total - 1))]:>6.2f} {low_end_mean:>13.3f} {elapsed_ns / total / 1000.0:>10.2f}")
+    router.QUANTIZE_TO_DEVICE = True
+
+
+def _condition_trace(conditioner, ticks, dt):
+    """Runs `conditioner` over per-tick input rows and returns the output rows."""
+    return [conditioner.process(row, dt) for row in ticks]
+
+
+def _replay_sends(ticks, conditioner, dt):
+    """Sends emit_role_intensity makes over the tick rows, re-emitting roles whose conditioned value still moves."""
+    _reset_role_state()
+    previous = [None] * len(router.ROLE_NAMES)
+    send = lambda receiver_name, value: None
+    for row in ticks:
+        values = conditioner.process(row, dt) if conditioner else row
+        for index, receiver_name in enumerate(router.ROLE_NAMES):
+            if values[index] != previous[index]:
+                previous[index] = values[index]
+                router.emit_role_intensity(receiver_name, values[index], send)
+    return router.PACKETS_ROUTED
+
+
+def bench_conditioning(args):
+    """Per-role conditioning: per-tick CPU (NumPy vs Python loop) and packets sent."""
+    roles = router.ROLE_NAMES
+    dt = 1.0 / args.tick_hz
+    rng = random.Random(11)
+    traces = [build_contact_trace(args.ticks, seed) for seed in range(len(roles))]
+    # Latest input per role at every tick, with sensor noise on top of the contact curves
+    ticks = [[trace[tick] + rng.gauss(0.0, args.noise) for trace in traces] for tick in range(args.ticks)]
+    params = [{'smoothing_ms': args.smoothing_ms, 'attack_per_s': 8.0, 'release_per_s': 4.0,
+               'gain': 1.1, 'curve': 1.3}] * len(roles)
+
+    # Correctness of the conditioner itself is covered by test_sharkee_conditioning.py
+    print(f"Conditioning benchmark: {args.ticks} ticks x {len(roles)} roles at {args.tick_hz} Hz")
+
+    # Per-packet conditioning runs once per received update; per-tick once per tick for every role
+    print(f"  {'conditioner':<26} {'roles':>6} {'us/call':>8} {'CPU ms/s':>9}   (inputs at {args.input_hz} Hz per role)")
+    single = sharkee_conditioning.SignalConditioner(params[:1], use_numpy=False)
+    column = [[row[0]] for row in ticks]
+    start = time.perf_counter_ns()
+    for row in column:
+        single.process(row, 1.0 / args.input_hz)
+    us_per_call = (time.perf_counter_ns() - start) / args.ticks / 1000.0
+    print(f"  {'per packet (python)':<26} {len(roles):>6} {us_per_call:>8.2f} "
+          f"{us_per_call * args.input_hz * len(roles) / 1000.0:>9.2f}")
+    for width in (len(roles), args.wide):
+        wide_ticks = [(row * (width // len(roles) + 1))[:width] for row in ticks]
+        for label, use_numpy in (("per tick (python loop)", False), ("per tick (numpy)", True)):
+            if use_numpy and sharkee_conditioning.load_numpy() is None:
+                continue
+            conditioner = sharkee_conditioning.SignalConditioner([params[0]] * width, use_numpy=use_numpy)
+            start = time.perf_counter_ns()
+            for row in wide_ticks:
+                conditioner.process(row, dt)
+            us_per_call = (time.perf_counter_ns() - start) / args.ticks / 1000.0
+            print(f"  {label:<26} {width:>6} {us_per_call:>8.2f} {us_per_call * args.tick_hz / 1000.0:>9.2f}")
+
+    raw = _replay_sends(ticks, None, dt)
+    conditioned = _replay_sends(ticks, sharkee_conditioning.SignalConditioner(params), dt)
+    seconds = args.ticks * dt
+    print(f"  sends/s: raw {raw / seconds:.0f}, conditioned {conditioned / seconds:.0f} "
+          f"({(1.0 - conditioned / raw) * 100.0 if raw else 0.0:.0f}% fewer)")
+
+
+def bench_mixing(args):
+    """Contact-to-motor mixing: NumPy vs Python agreement and cost per tick for each combine policy."""
+    rng = random.Random(13)
+    outputs = len(router.ROLE_NAMES)
+    # Every input drives its own role at 1.0 plus up to two neighbours at lower weights
+    entries = []
+    for input_index in range(args.inputs):
+        roles = rng.sample(range(outputs), rng.randrange(1, 4))
+        entries.append((roles[0], input_index, 1.0))
+        entries += [(role, input_index, round(rng.uniform(0.1, 0.6), 2)) for role in roles[1:]]
+    # Sparse contact activity: most inputs idle, a few touched at any time
+    frames = [[rng.random() if rng.random() < 0.15 else 0.0 for _ in range(args.inputs)]
+              for _ in range(args.ticks)]
+
+    print(f"Mixing benchmark: {args.inputs} inputs -> {outputs} roles, {len(entries)} matrix entries, "
+          f"{args.ticks} ticks")
+    print(f"  {'combine':<8} {'python us/tick':>15} {'numpy us/tick':>14} {'max |diff|':>11}")
+    for combine in sharkee_mixing.MIX_COMBINES:
+        timings = {}
+        results = {}
+        for use_numpy in (False, True):
+            if use_numpy and sharkee_mixing.load_numpy() is None:
+                continue
+            mixer = sharkee_mixing.SparseMixer(entries, args.inputs, outputs, combine, use_numpy=use_numpy)
+            start = time.perf_counter_ns()
+            results[use_numpy] = [mixer.mix(frame) for frame in frames]
+            timings[use_numpy] = (time.perf_counter_ns() - start) / args.ticks / 1000.0
+        if True in results:
+            worst = max(abs(a - b) for row_a, row_b in zip(results[True], results[False]) for a, b in zip(row_a, row_b))
+            if worst > 1e-9:
+                raise SystemExit(f"NumPy and Python {combine} mixing differ by up to {worst:.3g}")
+            numpy_us = f"{timings[True]:>14.2f}"
+        else:
+            worst = 0.0
+            numpy_us = f"{'n/a':>14}"
+        print(f"  {combine:<8} {timings[False]:>15.2f} {numpy_us} {worst:>11.2g}")
+
+
+def bench_patterns(args):
+    """Pattern clips: compile time, per-tick cost with many clips playing, and frame timing on the scheduler."""
+    roles = router.ROLE_NAMES
+    rng = random.Random(17)
+    clips = []
+    for index in range(args.clips):
+        waves = sorted(sharkee_patterns.WAVEFORMS)
+        clips.append({'name': f"clip{index}", 'loop': True, 'tracks': {
+            role: {'wave': rng.choice(waves), 'freq_hz': rng.uniform(0.5, 4.0), 'amplitude': 0.4,
+                   'offset': 0.5, 'duration_s': args.clip_s, 'delay_s': rng.uniform(0.0, 0.5)}
+            for role in rng.sample(roles, rng.randrange(1, len(roles) + 1))}})
+
+    player = router.PatternPlayer(tick_hz=args.tick_hz)
+    start = time.perf_counter()
+    player.load(clips)
+    compile_ms = (time.perf_counter() - start) * 1000.0
+    frames = sum(len(clip.frames) for clip in player.clips.values())
+    print(f"Pattern benchmark: {args.clips} clips of {args.clip_s:g} s at {args.tick_hz} Hz "
+          f"compiled in {compile_ms:.1f} ms ({frames} frames)")
+
+    print(f"  {'playing':>8} {'us/tick':>8}")
+    dt = 1.0 / args.tick_hz
+    for playing in sorted({count for count in (1, 16, args.clips) if count <= args.clips}):
+        player.stop()
+        for index in range(playing):
+            player.play(f"clip{index}")
+        now = 0.0
+        start = time.perf_counter_ns()
+        for _ in range(args.ticks):
+            player.advance(now)
+            now += dt
+        print(f"  {playing:>8} {(time.perf_counter_ns() - start) / args.ticks / 1000.0:>8.2f}")
+    player.stop()
+
+    # Timing on the real scheduler thread: a ramp clip must show every frame, in order, once
+    _reset_role_state()
+    router.QUANTIZE_TO_DEVICE = False
+    ramp_ticks = int(args.tick_hz * 1.0)
+    ramp = {'name': "ramp", 'tracks': {roles[0]: [[0.0, 0.1], [(ramp_ticks - 1) / args.tick_hz, 0.9]]}}
+    player = router.PatternPlayer(tick_hz=args.tick_hz)
+    expected = [frame[0] for frame in player.clips[player.load([ramp])[0]].frames]
+    shown = []
+    scheduler = router.OutputScheduler(tick_hz=args.tick_hz, keepalive_interval_ms=0, conditioner=None, mixer=None,
+                                       emit=lambda receiver_name, value, send: shown.append(value) or True)
+    router.add_input_layer(player)
+    try:
+        scheduler.start_thread()
+        player.play("ramp")
+        time.sleep(len(expected) / args.tick_hz + 0.2)
+        scheduler.stop()
+    finally:
+        router.remove_input_layer(player)
+        router.QUANTIZE_TO_DEVICE = True
+    ramp_shown = [value for value in shown if value in expected]
+    skipped = len(expected) - len(set(ramp_shown))
+    repeated = len(ramp_shown) - len(set(ramp_shown))
+    print(f"  scheduler playback: {len(expected)} frames, {skipped} skipped, {repeated} repeated, "
+          f"{scheduler.overruns} overruns, jitter max {scheduler.jitter_max_s * 1000.0:.2f} ms")
+
+
+LOAD_PATTERNS = ("random", "sweep")
+_F32 = struct.Struct(">f")
+# Output OSC prefix (padded address + ",f" tag) -> role index, for decoding captured output
+_ROLE_BY_TEMPLATE = {router.OSC_ROLE_TEMPLATES[name]: router.ROLE_INDEX[name] for name in router.ROLE_NAMES}
+
+
+def build_load_schedule(pattern, rate, seconds, burst=1, noise=0.3, sweep_hz=0.5, seed=11):
+    """
+    Synthetic VRChat stream: a list of (due_s, datagram, role_index or None, float32 value).
+
+    Contacts come from VRC_OSC_MAP; a `noise` share of the datagrams are other avatar
+    parameters from VRCHAT_PACKET_MIX (role None). "random" touches a random contact with
+    a random value, "sweep" walks the contacts in turn, each following a triangle wave at
+    `sweep_hz` with its own phase. Datagrams go out in bursts of `burst`, back to back,
+    at `rate` datagrams/s on average.
+    """
+    rng = random.Random(seed)
+    contacts = list(router.VRC_OSC_MAP.items())
+    others = [entry for entry in VRCHAT_PACKET_MIX if entry[0] not in router.VRC_OSC_MAP]
+    schedule = []
+    for seq in range(int(rate * seconds)):
+        due_s = (seq // burst) * burst / rate
+        if rng.random() < noise:
+            address, tag, _ = rng.choice(others)
+            value = rng.random()
+            if tag == "f":
+                schedule.append((due_s, router.encode_osc_float(address, value), None, value))
+            else:
+                builder = osc_message_builder.OscMessageBuilder(address=address)
+                builder.add_arg(rng.randrange(0, 15) if tag == "i" else value < 0.5)
+                schedule.append((due_s, builder.build().dgram, None, 0.0))
+            continue
+        if pattern == "random":
+            address, receiver_name = rng.choice(contacts)
+            value = rng.random()
+        else:
+            contact = seq % len(contacts)
+            address, receiver_name = contacts[contact]
+            phase = (due_s * sweep_hz + contact / len(contacts)) % 1.0
+            value = 1.0 - abs(2.0 * phase - 1.0)
+        value = _F32.unpack(_F32.pack(value))[0]
+        schedule.append((due_s, router.encode_osc_float(address, value), router.ROLE_INDEX[receiver_name], value))
+    return schedule
+
+
+def decode_router_output(datagram):
+    """Returns [(role_index, value)] of a captured output datagram (binary frames: value = uint8 level)."""
+    if datagram[:2] == sharkee_frame.FRAME_MAGIC:
+        return list(sharkee_frame.decode_frame(datagram)[1].items())
+    if datagram[:8] == b"#bundle\x00":
+        updates = []
+        offset = 16
+        while offset + 4 <= len(datagram):
+            size = struct.unpack_from(">i", datagram, offset)[0]
+            updates += decode_router_output(datagram[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        return updates
+    index = _ROLE_BY_TEMPLATE.get(datagram[:-4])
+    return [] if index is None else [(index, _F32.unpack_from(datagram, len(datagram) - 4)[0])]
+
+
+def _thread_cpu_s(threads):
+    """Summed CPU time of `threads` (alive ones), or None where per-thread clocks are unavailable."""
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return None
+    total = 0.0
+    for thread in threads:
+        try:
+            total += time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+        except (OSError, TypeError):
+            pass
+    return total
+
+
+def run_load(engine_name, output_format, schedule, settle_s=0.3):
+    """Drives one router engine on loopback with `schedule`; returns the measurements of the run."""
+    capture = _loopback_sink()
+    capture.settimeout(0.2)
+    router.BROADCAST_TARGET = capture.getsockname()
+    router.OUTPUT_FORMAT = output_format
+    router.reset_counters()
+    _reset_role_state()
+    router.ROLE_INPUT_VALUES[:] = [0.0] * len(router.ROLE_NAMES)
+
+    # Latest send time per (role, float32 value) and per (role, frame level), consumed on match
+    sent_float = {}
+    sent_level = {}
+    latencies = []
+    captured = [0, 0]  # datagrams, role updates
+    capturing = threading.Event()
+    capturing.set()
+
+    def capture_output():
+        while capturing.is_set():
+            try:
+                data = capture.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            now = time.perf_counter_ns()
+            captured[0] += 1
+            for index, value in decode_router_output(data):
+                captured[1] += 1
+                sent_ns = (sent_level if isinstance(value, int) else sent_float).pop((index, value), None)
+                if sent_ns is not None:
+                    latencies.append(now - sent_ns)
+
+    before = set(threading.enumerate())
+    engine = router.ROUTER_ENGINES[engine_name](("127.0.0.1", 0))
+    engine.start()
+    capture_thread = threading.Thread(target=capture_output, daemon=True)
+    capture_thread.start()
+    router_threads = [thread for thread in threading.enumerate() if thread not in before and thread is not capture_thread]
+    target = engine.sock.getsockname()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    contact_datagrams = sum(1 for entry in schedule if entry[2] is not None)
+
+    cpu_start = _thread_cpu_s(router_threads)
+    process_start = time.process_time()
+    began = time.perf_counter()
+    for due_s, datagram, index, value in schedule:
+        # Sleep rather than spin: a spinning sender would hold the GIL the router threads need
+        remaining = began + due_s - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        if index is not None:
+            now = time.perf_counter_ns()
+            sent_float[(index, value)] = now
+            sent_level[(index, sharkee_frame.intensity_to_level(value))] = now
+        sender.sendto(datagram, target)
+    send_s = time.perf_counter() - began
+    time.sleep(settle_s)
+    cpu_s = _thread_cpu_s(router_threads)
+    process_s = time.process_time() - process_start
+    elapsed_s = time.perf_counter() - began
+    received, routed = router.PACKETS_RECEIVED, router.PACKETS_ROUTED
+    engine.stop()
+    capturing.clear()
+    capture_thread.join()
+    sender.close()
+    capture.close()
+
+    latencies.sort()
+    if cpu_s is None:
+        cpu_scope, cpu_s = "process", process_s
+    else:
+        cpu_scope, cpu_s = "router threads", cpu_s - cpu_start
+    return {
+        'engine': engine_name,
+        'output_format': output_format,
+        'sent': len(schedule),
+        'send_rate': round(len(schedule) / send_s, 1),
+        'contact_datagrams': contact_datagrams,
+        'received': received,
+        'receive_rate': round(received / send_s, 1),
+        'drop_rate': round(1.0 - received / contact_datagrams, 6) if contact_datagrams else 0.0,
+        'routed': routed,
+        'route_rate': round(routed / send_s, 1),
+        'output_datagrams': captured[0],
+        'output_updates': captured[1],
+        'cpu_scope': cpu_scope,
+        'cpu_s': round(cpu_s, 4),
+        'cpu_pct': round(100.0 * cpu_s / elapsed_s, 2),
+        'latency_matched': len(latencies),
+        'latency_us': {name: round(_percentile(latencies, pct) / 1000.0, 1)
+                       for name, pct in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+    }
+
+
+def bench_load(args):
+    """Load generator: synthetic VRChat streams against each engine and output format, with a JSON report."""
+    try:
+        version = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        version = None
+    report = {
+        'benchmark': "load",
+        'version': version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'rate': args.rate, 'seconds': args.seconds, 'burst': args.burst, 'noise': args.noise,
+                   'tick_hz': router.OUTPUT_TICK_HZ, 'quantize': router.QUANTIZE_TO_DEVICE},
+        'runs': [],
+    }
+    print(f"Load benchmark: {args.rate} datagrams/s for {args.seconds:g} s, bursts of {args.burst}, "
+          f"{args.noise:.0%} non-contact parameters")
+    print(f"  {'engine':<8} {'format':<8} {'pattern':<7} {'recv/s':>8} {'drop':>7} {'routed/s':>9} {'out/s':>7} "
+          f"{'cpu %':>6} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for pattern in args.patterns:
+        schedule = build_load_schedule(pattern, args.rate, args.seconds, args.burst, args.noise)
+        for engine_name in args.engines:
+            for output_format in args.formats:
+                run = run_load(engine_name, output_format, schedule)
+                run['pattern'] = pattern
+                report['runs'].append(run)
+                latency = run['latency_us']
+                print(f"  {engine_name:<8} {output_format:<8} {pattern:<7} {run['receive_rate']:>8.0f} "
+                      f"{run['drop_rate']:>7.2%} {run['route_rate']:>9.0f} {run['output_datagrams'] / args.seconds:>7.0f} "
+                      f"{run['cpu_pct']:>6.1f} {latency['p50']:>8.0f} {latency['p99']:>8.0f} {latency['max']:>8.0f}")
+    router.OUTPUT_FORMAT = "message"
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"  report written to {args.json}")
+
+
+def build_touch_script(seconds, seed=21):
+    """
+    Per-role touches for the device benchmark: a list of (due_s, receiver_name, value), sorted.
+
+    Each role alternates between releases (0.3-1.0 s, one 0.0 sent at the start) and touches
+    (0.3-1.5 s) that either move (a new value every 20 ms, like VRChat sending on change) or
+    hold one value for longer than the sketch's REALTIME_TIMEOUT_MS (sent once).
+    """
+    rng = random.Random(seed)
+    script = []
+    for receiver_name in router.ROLE_NAMES:
+        t = rng.uniform(0.0, 0.5)
+        while t < seconds:
+            touch_s = rng.uniform(0.3, 1.5)
+            if rng.random() < 0.3:
+                touch_s = max(touch_s, sharkee_emulator.REALTIME_TIMEOUT_MS / 1000.0 + 0.4)
+                script.append((t, receiver_name, rng.uniform(0.3, 1.0)))
+            else:
+                value = rng.uniform(0.2, 1.0)
+                step_t = t
+                while step_t < t + touch_s:
+                    value = min(1.0, max(0.1, value + rng.uniform(-0.15, 0.15)))
+                    script.append((step_t, receiver_name, value))
+                    step_t += 0.02
+            t += touch_s
+            script.append((t, receiver_name, 0.0))
+            t += rng.uniform(0.3, 1.0)
+    script.sort()
+    return [(due_s, receiver_name, _F32.unpack(_F32.pack(value))[0]) for due_s, receiver_name, value in script if due_s < seconds]
+
+
+def analyze_device_timeline(timeline, inputs, gamma):
+    """
+    Matches one device's motor timeline against the inputs of its role.
+
+    `inputs` is the role's [(sent_s, value)] in time order. Returns (latencies_s, stops,
+    missed_stops, dropouts): a "packet" change is matched to the latest input mapping to the
+    same realtime value; every release (0.0 input while the motor runs) must end in a "stop"
+    before the next input, a "timeout" or no stop at all is a missed stop; a timeout while
+    the role is touched is a dropout.
+    """
+    device = sharkee_emulator.VirtualDevice("", "", None, gamma)
+    sent_times = [sent_s for sent_s, _ in inputs]
+    latencies = []
+    dropouts = 0
+    for t, value, cause in timeline:
+        position = bisect.bisect_right(sent_times, t)
+        if cause == "packet":
+            for sent_s, input_value in reversed(inputs[max(0, position - 50):position]):
+                if input_value >= sharkee_emulator.MIN_INTENSITY_THRESHOLD and device.intensity_to_realtime_value(input_value) == value:
+                    latencies.append(t - sent_s)
+                    break
+        elif cause == "timeout" and position and inputs[position - 1][1] >= sharkee_emulator.MIN_INTENSITY_THRESHOLD:
+            dropouts += 1
+
+    stops = missed = 0
+    event_times = [t for t, _, _ in timeline]
+    for index, (sent_s, value) in enumerate(inputs):
+        if value != 0.0 or not index or inputs[index - 1][1] < sharkee_emulator.MIN_INTENSITY_THRESHOLD:
+            continue
+        until = inputs[index + 1][0] if index + 1 < len(inputs) else float("inf")
+        position = bisect.bisect_left(event_times, sent_s)
+        if not position or timeline[position - 1][1] == 0:
+            continue  # the motor was not running (never started, or already timed out)
+        ends = [cause for t, value, cause in timeline[position:] if t < until and value == 0][:1]
+        stops += 1
+        if ends != ["stop"]:
+            missed += 1
+    return latencies, stops, missed, dropouts
+
+
+def bench_devices(args):
+    """Emulated sketch clients against the router on loopback: input-to-motor latency, missed stops, dropouts."""
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    router.BROADCAST_TARGET = ("127.255.255.255", port)
+    router.KEEPALIVE_INTERVAL_MS = args.keepalive_ms
+    script = build_touch_script(args.seconds)
+    report_path = os.path.join(tempfile.gettempdir(), f"sharkee_bench_devices_{os.getpid()}.json")
+    print(f"Device benchmark: {args.devices} emulated clients, {len(script)} touch updates over {args.seconds:g} s, "
+          f"keepalive {args.keepalive_ms} ms")
+    print(f"  {'output':<22} {'applied':>8} {'foreign':>8} {'unparsed':>8} {'lat p50':>8} {'p99 ms':>7} "
+          f"{'stops':>6} {'missed':>6} {'dropouts':>8}")
+
+    for label, output_format, exact in (("message", "message", False), ("message (exact addr)", "message", True),
+                                        ("bundle", "bundle", False), ("binary", "binary", False)):
+        command = [sys.executable, sharkee_emulator.__file__, "--devices", str(args.devices), "--port", str(port),
+                   "--listen", "0.0.0.0", "--duration", str(args.seconds + 2.0), "--report", report_path]
+        if exact:
+            command.append("--exact-address")
+        emulator = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        emulator.stdout.readline()  # "Emulating ..." once the sockets are bound
+
+        router.OUTPUT_FORMAT = output_format
+        router.reset_counters()
+        _reset_role_state()
+        router.ROLE_INPUT_VALUES[:] = [0.0] * len(router.ROLE_NAMES)
+        engine = router.OscReceiveEngine(("127.0.0.1", 0))
+        engine.start()
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        target = engine.sock.getsockname()
+        inputs = {receiver_name: [] for receiver_name in router.ROLE_NAMES}
+        addresses = {receiver_name: address for address, receiver_name in router.VRC_OSC_MAP.items()}
+        began = time.perf_counter()
+        for due_s, receiver_name, value in script:
+            remaining = began + due_s - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            inputs[receiver_name].append((time.perf_counter(), value))
+            sender.sendto(router.encode_osc_float(addresses[receiver_name], value), target)
+        sender.close()
+        emulator.communicate()
+        engine.stop()
+
+        with open(report_path, encoding="utf-8") as f:
+            devices = json.load(f)['devices']
+        os.remove(report_path)
+        # The sketch's lowercase role names follow the CLIENT_MAP order
+        role_names = dict(zip(sharkee_emulator.RECEIVER_NAMES, router.ROLE_NAMES))
+        totals = {key: sum(device[key] for device in devices) for key in ('applied', 'foreign', 'unparsed')}
+        latencies = []
+        stops = missed = dropouts = 0
+        for device in devices:
+            timeline = [tuple(event) for event in device['timeline']]
+            result = analyze_device_timeline(timeline, inputs[role_names[device['role']]], sharkee_emulator.GAMMA)
+            latencies += result[0]
+            stops += result[1]
+            missed += result[2]
+            dropouts += result[3]
+        latencies.sort()
+        print(f"  {label:<22} {totals['applied']:>8} {totals['foreign']:>8} {totals['unparsed']:>8} "
+              f"{_percentile(latencies, 50) * 1000.0:>8.1f} {_percentile(latencies, 99) * 1000.0:>7.1f} "
+              f"{stops:>6} {missed:>6} {dropouts:>8}")
+    router.OUTPUT_FORMAT = "message"
+
+
+def bench_session(args):
+    """Session recorder: receive-path overhead, writer throughput, mmap reader and replay fidelity."""
+    packets = build_packet_mix(args.packets)
+    routed = []
+    handler = lambda address, *params: routed.append((address, float(params[0])))
+    path = os.path.join(tempfile.gettempdir(), f"sharkee_bench_session_{os.getpid()}.ses")
+    print(f"Session benchmark: {len(packets)} datagrams of the VRChat mix")
+
+    # Receive path: the engine dispatches from a reused buffer, with and without a recorder
+    engine = router.OscReceiveEngine(("127.0.0.1", 0), handler)  # never started; dispatch only
+    buffer = bytearray(MAX_DATAGRAM)
+    costs = {}
+    for label in ("not recording", "recording"):
+        recorder = sharkee_session.SessionRecorder(path) if label == "recording" else None
+        if recorder:
+            recorder.start()
+        engine.recorder = recorder
+        routed.clear()
+        start = time.perf_counter_ns()
+        for data in packets:
+            size = len(data)
+            buffer[:size] = data
+            engine.dispatch_datagram(buffer, size)
+        costs[label] = (time.perf_counter_ns() - start) / len(packets)
+        if recorder:
+            start = time.perf_counter()
+            recorder.stop()
+            stats = recorder.stats()
+            print(f"  writer: {stats['in']} records, {stats['bytes'] / 1e6:.1f} MB, {stats['dropped']} dropped, "
+                  f"drained {time.perf_counter() - start:.2f} s after the last record")
+        print(f"  dispatch {label:<14} {costs[label]:8.0f} ns/datagram")
+    engine.recorder = None
+    recorded_routes = list(routed)
+    print(f"  recording overhead {costs['recording'] - costs['not recording']:.0f} ns/datagram on the receive thread")
+
+    # Reader: index load + mmap, then every record
+    start = time.perf_counter()
+    reader = sharkee_session.SessionReader(path)
+    opened = time.perf_counter() - start
+    start = time.perf_counter()
+    total = sum(len(datagram) for _, _, datagram in reader.records())
+    scanned = time.perf_counter() - start
+    print(f"  reader: opened in {opened * 1000.0:.1f} ms ({reader.indexed} indexed), "
+          f"{len(reader) / scanned:.0f} records/s ({total / scanned / 1e6:.0f} MB/s)")
+
+    # Replay as fast as possible through the engine core: must route exactly what was routed live
+    routed.clear()
+    result = sharkee_session.replay(reader, lambda datagram: engine.dispatch_datagram(datagram, len(datagram)), 0.0)
+    print(f"  replay max speed: {result['records'] / result['elapsed_s']:.0f} datagrams/s, "
+          f"routed {'identical' if routed == recorded_routes else 'DIFFERENT'} ({len(routed)} updates)")
+    reader.close()
+    engine.sock.close()
+
+    # Replay at 1x: pacing of a recording made at --rate datagrams/s
+    os.remove(path)
+    os.remove(path + ".idx")
+    recorder = sharkee_session.SessionRecorder(path)
+    recorder.start()
+    interval = 1.0 / args.rate
+    began = time.perf_counter()
+    for index, data in enumerate(packets[:int(args.rate * args.seconds)]):
+        while time.perf_counter() < began + index * interval:
+            pass
+        recorder.record(sharkee_session.DIRECTION_IN, data)
+    recorder.stop()
+    reader = sharkee_session.SessionReader(path)
+    for speed in (1.0, 4.0):
+        result = sharkee_session.replay(reader, lambda datagram: None, speed)
+        print(f"  replay {speed:g}x: {result['records']} datagrams, {result['recorded_s']:.2f} s recorded in "
+              f"{result['elapsed_s']:.2f} s; late p50 {result['late_p50_ms']:.3f} ms, p99 {result['late_p99_ms']:.3f} ms, "
+              f"max {result['late_max_ms']:.3f} ms")
+    reader.close()
+    os.remove(path)
+    os.remove(path + ".idx")
+
+
+def write_music_wav(path, seconds, sample_rate=48000, seed=9):
+    """Writes a stereo int16 WAV of synthetic music (kick, bass, chords, lead, hi-hats) in 10 s chunks."""
+    np = sharkee_audio.load_numpy()
+    rng = np.random.default_rng(seed)
+    chunk = 10 * sample_rate
+    with wave.open(path, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        for first in range(0, int(seconds * sample_rate), chunk):
+            t = (first + np.arange(chunk)) / sample_rate
+            beat = t % 0.5
+            kick = np.sin(2 * np.pi * 55.0 * beat) * np.exp(-beat / 0.12)
+            bass = 0.3 * np.sin(2 * np.pi * 82.4 * t) * (np.floor(t * 2) % 4 < 3)
+            chord = 0.15 * sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.25 * t))
+            lead = 0.2 * np.sin(2 * np.pi * (880.0 + 220.0 * np.floor(t % 4)) * t) * (t % 2 < 1)
+            hat_t = t % 0.25
+            hats = 0.3 * np.diff(rng.standard_normal(chunk + 1)) * np.exp(-hat_t / 0.03)
+            mono = 0.5 * (kick + bass + chord + lead + hats)
+            stereo = np.stack((mono, mono), axis=1)
+            out.writeframes((np.clip(stereo, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+
+def bench_audio(args):
+    """Audio source: streaming-state check, band selectivity and real-time cost on a long WAV file."""
+    np = sharkee_audio.load_numpy()
+    if np is None:
+        print("The audio benchmark needs NumPy.")
+        return
+    rate = args.sample_rate
+    bands = [(low_hz, high_hz) for low_hz, high_hz, _ in router.AUDIO_BANDS]
+    hop = router.AUDIO_HOP_SAMPLES
+
+    # Streaming state: odd-sized chunks must give exactly the rows of one big block
+    rng = np.random.default_rng(3)
+    signal = (0.3 * rng.standard_normal(rate * 5)).astype(np.float32)
+    whole = sharkee_audio.BandEnvelope(rate, bands, hop).process(signal)
+    streamed = sharkee_audio.BandEnvelope(rate, bands, hop)
+    rows, position = [], 0
+    while position < len(signal):
+        size = int(rng.integers(1, 3 * hop))
+        rows.append(streamed.process(signal[position:position + size]))
+        position += size
+    streamed_rows = np.concatenate(rows)
+    print(f"Audio benchmark: {rate} Hz, hop {hop} ({rate / hop:.1f} role updates/s), {len(bands)} bands")
+    print(f"  streaming check: {len(streamed_rows)}/{len(whole)} rows, max difference "
+          f"{float(np.abs(streamed_rows - whole).max()):.2e}")
+
+    # Band selectivity: a -12 dBFS tone at each band centre
+    print(f"  {'tone Hz':>8} " + " ".join(f"{f'{low}-{high}':>10}" for low, high in bands))
+    t = np.arange(rate) / rate
+    for low_hz, high_hz in bands:
+        freq = math.sqrt(low_hz * high_hz)
+        levels = sharkee_audio.BandEnvelope(rate, bands, hop).process(0.25 * np.sin(2 * np.pi * freq * t))[-1]
+        print(f"  {freq:>8.0f} " + " ".join(f"{level:>10.2f}" for level in levels))
+
+    path = os.path.join(tempfile.gettempdir(), f"sharkee_bench_{args.minutes:g}min_{rate}.wav")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        write_music_wav(path, args.minutes * 60.0, rate)
+        print(f"  wrote {path} ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f} s")
+
+    # Full source path (read, decode, downmix, envelope, role mapping) without real-time pacing
+    router.AUDIO_PIPE_SAMPLE_RATE = rate
+    source = router.create_audio_source(path)
+    wall, cpu = time.perf_counter(), time.process_time()
+    while source.pump():
+        pass
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    source.reader.close()
+    audio_s = source.reader.frames_read / rate
+    print(f"  {audio_s:.0f} s of audio, {source.hops} hops: {wall:.2f} s wall, {cpu:.2f} s CPU, "
+          f"{audio_s / wall:.0f}x real time, {cpu / audio_s * 100.0:.2f}% of a core at real time, "
+          f"{cpu / source.hops * 1e6:.1f} us/hop")
+
+    # Envelope alone: hop-sized calls (the source's latency) vs 1 s blocks (vectorized over hops)
+    block = signal[:rate]
+    for label, size in (("per hop", hop), ("1 s blocks", rate)):
+        envelope = sharkee_audio.BandEnvelope(rate, bands, hop)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for first in range(0, rate, size):
+                envelope.process(block[first:first + size])
+        elapsed = time.perf_counter() - start
+        print(f"  envelope {label:>10}: {args.repeat / elapsed:.0f}x real time")
+
+
+# Child-process programs for the startup benchmark: import the front end, then start a
+# router engine on an ephemeral port (its daemon threads end with the process). The GUI variant also opens its Tk root when a
+# display is available; without one the figure covers the tkinter import only.
+STARTUP_PROGRAMS = [
+    ("headless (sharkee_router)",
+     "import sharkee_router as r\n"
+     "r.OscReceiveEngine(('127.0.0.1', 0)).start()\n"),
+    ("GUI (sharkee_gui)",
+     "import sharkee_gui, sharkee_router as r, tkinter\n"
+     "r.OscReceiveEngine(('127.0.0.1', 0)).start()\n"
+     "try:\n"
+     "    tkinter.Tk().destroy()\n"
+     "except tkinter.TclError:\n"
+     "    pass\n"),
+]
+
+
+def bench_metrics(args):
+    """Router histograms: percentile error against exact ranks, cost per record and per summary."""
+    rng = random.Random(5)
+    # Long-tailed latencies around 50 us, like handler and send times
+    samples = [int(rng.lognormvariate(math.log(50_000), 1.2)) for _ in range(args.samples)]
+    histogram = sharkee_metrics.Histogram("bench")
+    for value in samples:
+        histogram.record(value)
+    summary = histogram.summary()
+    exact = sorted(samples)
+    print(f"Histogram benchmark: {args.samples} log-normal samples, {len(histogram.counts)} buckets")
+    print(f"  {'quantile':<8} {'exact ns':>12} {'histogram ns':>13} {'error':>8}")
+    for key, pct in (('p50', 50), ('p95', 95), ('p99', 99)):
+        reference = _percentile(exact, pct)
+        print(f"  {key:<8} {reference:>12} {summary[key]:>13} {(summary[key] - reference) / reference * 100:>7.2f}%")
+    if summary['max'] != exact[-1] or summary['count'] != len(samples):
+        raise SystemExit("Histogram max or count differs from the samples")
+
+    record = histogram.record
+    start = time.perf_counter_ns()
+    for value in samples:
+        record(value)
+    record_ns = (time.perf_counter_ns() - start) / len(samples)
+    start = time.perf_counter_ns()
+    for _ in range(100):
+        histogram.summary()
+    summary_us = (time.perf_counter_ns() - start) / 100 / 1000
+    print(f"  record {record_ns:.0f} ns/sample, summary {summary_us:.0f} us")
+
+    # The handler histogram as filled by the real dispatch path
+    packets = build_packet_mix(args.samples // 10)
+    engine = router.OscReceiveEngine(("127.0.0.1", 0))  # never started; dispatch only
+    router.reset_counters()
+    start = time.perf_counter_ns()
+    for data in packets:
+        engine.dispatch_datagram(data, len(data))
+    elapsed_ns = (time.perf_counter_ns() - start) / len(packets)
+    engine.sock.close()
+    handler = router.LATENCY_HANDLER.summary()
+    print(f"  dispatch {elapsed_ns:.0f} ns/datagram instrumented; handler histogram "
+          f"p50 {handler['p50']} / p99 {handler['p99']} / max {handler['max']} ns over {handler['count']} datagrams")
+
+    # Metrics endpoint: one render per refresh interval, scrapes only send the cached body
+    server = sharkee_metrics.MetricsServer(("127.0.0.1", 0), router.collect_router_metrics)
+    server.start()
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(100):
+            server.refresh()
+        render_us = (time.perf_counter_ns() - start) / 100 / 1000
+        renders = server.renders
+        start = time.perf_counter_ns()
+        for _ in range(args.scrapes):
+            with urllib.request.urlopen(server.describe()) as response:
+                body = response.read()
+        scrape_ms = (time.perf_counter_ns() - start) / args.scrapes / 1e6
+    finally:
+        server.stop()
+    print(f"  metrics render {render_us:.0f} us ({len(body)} bytes); scrape {scrape_ms:.2f} ms, "
+          f"{server.renders - renders} renders during {args.scrapes} scrapes")
+
+
+def bench_startup(args):
+    """Startup wall time and peak RSS of the headless router vs the GUI build, one child process per run."""
+    if not hasattr(os, "wait4"):
+        raise SystemExit("The startup benchmark needs os.wait4 (Linux/macOS) to read the child's peak RSS")
+    here = os.path.dirname(os.path.abspath(__file__))
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    print(f"Startup benchmark: {args.runs} runs per variant (import + engine start)")
+    print(f"  {'variant':<26} {'median ms':>10} {'min ms':>8} {'peak RSS MiB':>13}")
+    for label, program in STARTUP_PROGRAMS:
+        times_ms = []
+        peak_rss = 0
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            child = subprocess.Popen([sys.executable, "-c", program], cwd=here)
+            _, status, usage = os.wait4(child.pid, 0)
+            times_ms.append((time.perf_counter() - start) * 1000.0)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code:
+                raise SystemExit(f"{label} exited with status {exit_code}")
+            peak_rss = max(peak_rss, usage.ru_maxrss)
+        times_ms.sort()
+        print(f"  {label:<26} {_percentile(times_ms, 50):>10.1f} {times_ms[0]:>8.1f} {peak_rss / rss_divisor:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SharkeeHaptics router micro-benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p_encode = sub.add_parser("encode", help="OSC packet encoding: pythonosc builder vs template cache")
+    p_encode.add_argument("--iterations", type=int, default=200000)
+    p_encode.set_defaults(func=bench_encode)
+
+    p_receive = sub.add_parser("receive", help="VRChat listener: ThreadingOSCUDPServer vs OscReceiveEngine")
+    p_receive.add_argument("--packets", type=int, default=20000)
+    p_receive.add_argument("--rate", type=int, default=2000, help="paced phase send rate (packets/s)")
+    p_receive.set_defaults(func=bench_receive)
+
+    p_dispatch = sub.add_parser("dispatch", help="Datagram dispatch over a VRChat packet mix")
+    p_dispatch.add_argument("--packets", type=int, default=100000)
+    p_dispatch.set_defaults(func=bench_dispatch)
+
+    p_output = sub.add_parser("output", help="Scheduler output formats: bytes on air and sends per second")
+    p_output.add_argument("--ticks", type=int, default=5000)
+    p_output.add_argument("--active", type=int, default=len(router.ROLE_NAMES), help="roles changing per tick")
+    p_output.add_argument("--tick-hz", type=int, default=router.OUTPUT_TICK_HZ)
+    p_output.set_defaults(func=bench_output)
+
+    p_frame = sub.add_parser("frame", help="Binary frame protocol round trip and throughput")
+    p_frame.add_argument("--frames", type=int, default=100000)
+    p_frame.set_defaults(func=bench_frame)
+
+    p_startup = sub.add_parser("startup", help="Startup time and peak RSS: headless router vs GUI build")
+    p_startup.add_argument("--runs", type=int, default=10)
+    p_startup.set_defaults(func=bench_startup)
+
+    p_unicast = sub.add_parser("unicast", help="Unicast transport and hostname cache against a stub resolver")
+    p_unicast.add_argument("--seconds", type=float, default=3.0)
+    p_unicast.add_argument("--lookup-ms", type=float, default=50.0, help="simulated resolver latency")
+    p_unicast.add_argument("--offline", type=int, default=2, help="roles whose hostname does not resolve")
+    p_unicast.set_defaults(func=bench_unicast)
+
+    p_multicast = sub.add_parser("multicast", help="Multicast transport loopback delivery and latency")
+    p_multicast.add_argument("--packets", type=int, default=5000)
+    p_multicast.add_argument("--rate", type=int, default=2000, help="send rate (packets/s)")
+    p_multicast.add_argument("--group", default=router.MULTICAST_GROUP)
+    p_multicast.add_argument("--interface", default=router.MULTICAST_INTERFACE, help="IPv4 address of the interface to use")
+    p_multicast.set_defaults(func=bench_multicast)
+
+    p_sinks = sub.add_parser("sinks", help="Per-sink queues: broadcast latency with and without a stalled sink")
+    p_sinks.add_argument("--packets", type=int, default=5000)
+    p_sinks.add_argument("--rate", type=int, default=2000, help="send rate (packets/s)")
+    p_sinks.add_argument("--slow-ms", type=float, default=20.0, help="time each send of the slow sink blocks")
+    p_sinks.set_defaults(func=bench_sinks)
+
+    p_limits = sub.add_parser("limits", help="Per-role rate cap and adaptive deadband on a noisy input trace")
+    p_limits.add_argument("--seconds", type=float, default=8.0)
+    p_limits.add_argument("--settle", type=float, default=3.0, help="seconds before the per-window airtime is collected")
+    p_limits.add_argument("--active", type=int, default=6, help="roles fed the noisy trace; the rest idle near zero")
+    p_limits.add_argument("--input-hz", type=int, default=200, help="input updates per second per role")
+    p_limits.add_argument("--noise", type=float, default=0.05, help="random walk step (standard deviation)")
+    p_limits.add_argument("--cap-hz", type=float, default=20.0, help="rate cap for the capped scenario")
+    p_limits.add_argument("--budget", type=float, default=100.0, help="airtime budget (ms/s) for the adaptive scenario")
+    p_limits.set_defaults(func=bench_limits)
+
+    p_quantize = sub.add_parser("quantize", help="Change detection on raw floats vs device motor levels (replay)")
+    p_quantize.add_argument("--samples", type=int, default=20000, help="input updates per role")
+    p_quantize.add_argument("--gamma", type=float, default=router.DEVICE_GAMMA)
+    p_quantize.add_argument("--low-end", type=int, default=20, help="device levels counted as the low end (for the low-end error)")
+    p_quantize.set_defaults(func=bench_quantize)
+
+    p_conditioning = sub.add_parser("conditioning", help="Signal conditioning: CPU per tick and sends")
+    p_conditioning.add_argument("--ticks", type=int, default=20000)
+    p_conditioning.add_argument("--tick-hz", type=int, default=router.OUTPUT_TICK_HZ)
+    p_conditioning.add_argument("--noise", type=float, default=0.02, help="sensor noise added to the trace (std dev)")
+    p_conditioning.add_argument("--smoothing-ms", type=float, default=40.0)
+    p_conditioning.add_argument("--input-hz", type=int, default=500, help="updates per role for the per-packet cost")
+    p_conditioning.add_argument("--wide", type=int, default=64, help="role count for the N-wide comparison")
+    p_conditioning.set_defaults(func=bench_conditioning)
+
+    p_mixing = sub.add_parser("mixing", help="Contact-to-motor mixing matrix: NumPy vs Python per tick")
+    p_mixing.add_argument("--inputs", type=int, default=48, help="contact parameters mixed into the roles")
+    p_mixing.add_argument("--ticks", type=int, default=20000)
+    p_mixing.set_defaults(func=bench_mixing)
+
+    p_patterns = sub.add_parser("patterns", help="Pattern clips: compile, per-tick cost and playback timing")
+    p_patterns.add_argument("--clips", type=int, default=64, help="clips compiled and played at once")
+    p_patterns.add_argument("--clip-s", type=float, default=2.0, help="clip length")
+    p_patterns.add_argument("--ticks", type=int, default=5000)
+    p_patterns.add_argument("--tick-hz", type=int, default=router.OUTPUT_TICK_HZ)
+    p_patterns.set_defaults(func=bench_patterns)
+
+    p_load = sub.add_parser("load", help="Synthetic VRChat load per engine and output format, JSON report")
+    p_load.add_argument("--rate", type=int, default=2000, help="datagrams per second sent to the router")
+    p_load.add_argument("--seconds", type=float, default=3.0, help="length of each run")
+    p_load.add_argument("--burst", type=int, default=1, help="datagrams sent back to back per burst")
+    p_load.add_argument("--noise", type=float, default=0.3, help="share of non-contact avatar parameters")
+    p_load.add_argument("--patterns", nargs="+", choices=LOAD_PATTERNS, default=list(LOAD_PATTERNS))
+    p_load.add_argument("--engines", nargs="+", choices=sorted(router.ROUTER_ENGINES), default=sorted(router.ROUTER_ENGINES))
+    p_load.add_argument("--formats", nargs="+", choices=sorted(router.OUTPUT_FORMATS), default=sorted(router.OUTPUT_FORMATS))
+    p_load.add_argument("--json", metavar="PATH", help="write the report as JSON (diffable between versions)")
+    p_load.set_defaults(func=bench_load)
+
+    p_devices = sub.add_parser("devices", help="Emulated sketch clients: input-to-motor latency, missed stops, dropouts")
+    p_devices.add_argument("--devices", type=int, default=44, help="emulated clients (roles assigned round-robin)")
+    p_devices.add_argument("--seconds", type=float, default=8.0, help="length of the touch script per output format")
+    p_devices.add_argument("--keepalive-ms", type=int, default=router.KEEPALIVE_INTERVAL_MS,
+                           help="router keepalive interval (0 disables keepalives: held touches time out)")
+    p_devices.set_defaults(func=bench_devices)
+
+    p_session = sub.add_parser("session", help="Session recorder and replayer: overhead, throughput, replay pacing")
+    p_session.add_argument("--packets", type=int, default=200000)
+    p_session.add_argument("--rate", type=int, default=1000, help="datagrams/s of the paced recording")
+    p_session.add_argument("--seconds", type=float, default=2.0, help="length of the paced recording")
+    p_session.set_defaults(func=bench_session)
+
+    p_audio = sub.add_parser("audio", help="Audio source: streaming check, band selectivity and real-time cost")
+    p_audio.add_argument("--minutes", type=float, default=10.0, help="length of the generated WAV file")
+    p_audio.add_argument("--sample-rate", type=int, default=48000)
+    p_audio.add_argument("--repeat", type=int, default=20, help="seconds of audio per envelope-only run")
+    p_audio.set_defaults(func=bench_audio)
+
+    p_metrics = sub.add_parser("metrics", help="Latency histograms and metrics endpoint: percentile error, recording and render cost")
+    p_metrics.add_argument("--samples", type=int, default=500000)
+    p_metrics.add_argument("--scrapes", type=int, default=200, help="HTTP scrapes of the metrics endpoint")
+    p_metrics.set_defaults(func=bench_metrics)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
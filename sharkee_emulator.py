@@ -0,0 +1,283 @@
+"""
+Virtual Sharkee_Haptics.ino clients: many emulated ESP8266 devices on one selector loop.
+
+Each VirtualDevice has its own UDP socket on CLIENT_LISTENER_PORT (SO_REUSEADDR, so every
+device receives every broadcast/multicast datagram, like devices sharing a Wi-Fi network)
+and applies the sketch's receive logic:
+
+    bundle      dispatch to the message whose address is exactly the device's role address
+    message     OSCMessage::match(INTERNAL_OSC_ADDRESS): a prefix match, so a single message
+                for any role is applied (exact_address=True emulates a sketch that checks
+                its own role address instead)
+    other       anything else (e.g. a binary frame) fails to parse and is ignored
+    intensity   clamped 0-1; below MIN_INTENSITY_THRESHOLD the motor stops, otherwise
+                realtime value = round(intensity ** GAMMA * 255) and the timeout restarts
+    timeout     the motor stops when no intensity above the threshold arrived for
+                REALTIME_TIMEOUT_MS
+
+The sketch handles one datagram per loop() pass with delay(1) in between; here every
+queued datagram is handled as soon as the selector reports it. Every change of the
+effective motor value goes into the device's timeline as (time, value, cause), cause
+being "packet", "stop" or "timeout"; the time base is time.perf_counter().
+
+    python sharkee_emulator.py [--devices N] [--port P] [--multicast] [--exact-address]
+                               [--gamma G] [--timeline PATH.csv] [--report PATH.json]
+"""
+import argparse
+import json
+import selectors
+import socket
+import struct
+import sys
+import time
+
+# Sketch constants (Sharkee_Haptics.ino)
+CLIENT_LISTENER_PORT = 8000
+INTERNAL_OSC_ADDRESS = "/sharkeehaptics/set_intensity"
+MULTICAST_GROUP = "239.255.72.83"
+MIN_INTENSITY_THRESHOLD = 0.05
+REALTIME_TIMEOUT_MS = 500
+GAMMA = 2.2
+RECEIVER_NAMES = ["head", "chest", "upperarm_l", "upperarm_r", "hips", "upperleg_l",
+                  "upperleg_r", "lowerleg_l", "lowerleg_r", "foot_l", "foot_r"]
+# incomingPacket[] size: longer datagrams are truncated by Udp.read()
+INCOMING_PACKET_BYTES = 1024
+
+_BUNDLE_TAG = b"#bundle\x00"
+_FLOAT_TAG = b",f\x00\x00"
+_UNPACK_FLOAT_BE = struct.Struct(">f").unpack_from
+_UNPACK_INT_BE = struct.Struct(">i").unpack_from
+_ADDRESS_BASE = INTERNAL_OSC_ADDRESS.encode()
+
+
+def _osc_string_end(data, offset):
+    """Offset after the padded OSC string at `offset`, or -1 if it is not terminated."""
+    end = data.find(b"\x00", offset)
+    return -1 if end < 0 else (end | 3) + 1
+
+
+def parse_osc_float(data, offset=0, end=None):
+    """(address bytes, float or None) of the OSC message in data[offset:end]; None if it does not parse."""
+    end = len(data) if end is None else end
+    address_end = _osc_string_end(data, offset)
+    if address_end < 0 or address_end > end or data[offset:offset + 1] != b"/":
+        return None
+    address = data[offset:data.find(b"\x00", offset)]
+    tags_end = _osc_string_end(data, address_end)
+    if tags_end < 0 or tags_end > end or data[address_end:address_end + 1] != b",":
+        return None
+    if data[address_end:address_end + 4] == _FLOAT_TAG and tags_end + 4 <= end:
+        return address, _UNPACK_FLOAT_BE(data, tags_end)[0]
+    return address, None
+
+
+def decode_router_datagram(data):
+    """Every (address bytes, float or None) in a router datagram (message or bundle); None if it does not parse."""
+    if data[:8] == _BUNDLE_TAG:
+        messages = []
+        offset = 16
+        while offset + 4 <= len(data):
+            size = _UNPACK_INT_BE(data, offset)[0]
+            if size <= 0 or offset + 4 + size > len(data):
+                return None
+            message = parse_osc_float(data, offset + 4, offset + 4 + size)
+            if message is None:
+                return None
+            messages.append(message)
+            offset += 4 + size
+        return ("bundle", messages)
+    message = parse_osc_float(data)
+    return None if message is None else ("message", [message])
+
+
+class VirtualDevice:
+    """One emulated client: the sketch's receive, gamma and timeout logic for `role`."""
+
+    def __init__(self, name, role, sock, gamma=GAMMA, exact_address=False):
+        self.name = name
+        self.role = role
+        self.sock = sock
+        self.gamma = gamma
+        self.exact_address = exact_address
+        self.role_address = f"{INTERNAL_OSC_ADDRESS}/{role}".encode()
+        self.motor_running = False
+        self.realtime_value = 0
+        self.last_received_s = 0.0
+        self.timeline = []
+        self.datagrams = 0
+        self.applied = 0
+        self.foreign = 0  # applied although addressed to another role
+        self.unparsed = 0
+        self.timeouts = 0
+
+    def intensity_to_realtime_value(self, intensity):
+        return int(min(1.0, max(0.0, intensity ** self.gamma)) * 255.0 + 0.5)
+
+    def set_motor(self, intensity, now):
+        intensity = min(1.0, max(0.0, intensity))
+        if intensity < MIN_INTENSITY_THRESHOLD:
+            if self.motor_running:
+                self.motor_running = False
+                self.realtime_value = 0
+                self.timeline.append((now, 0, "stop"))
+            return
+        value = self.intensity_to_realtime_value(intensity)
+        if not self.motor_running or value != self.realtime_value:
+            self.timeline.append((now, value, "packet"))
+        self.motor_running = True
+        self.realtime_value = value
+        self.last_received_s = now
+
+    def handle(self, decoded, now):
+        """Applies a decode_router_datagram() result (None = did not parse)."""
+        self.datagrams += 1
+        if decoded is None:
+            self.unparsed += 1
+            return
+        kind, messages = decoded
+        for address, value in messages:
+            if kind == "bundle" or self.exact_address:
+                if address != self.role_address:
+                    continue
+            elif not (address == _ADDRESS_BASE or address.startswith(_ADDRESS_BASE + b"/")):
+                continue
+            if value is None:
+                continue
+            self.applied += 1
+            if address != self.role_address:
+                self.foreign += 1
+            self.set_motor(value, now)
+
+    def check_timeout(self, now):
+        if self.motor_running and now - self.last_received_s > REALTIME_TIMEOUT_MS / 1000.0:
+            self.motor_running = False
+            self.realtime_value = 0
+            self.timeouts += 1
+            self.timeline.append((now, 0, "timeout"))
+
+    def stats(self):
+        return {'device': self.name, 'role': self.role, 'datagrams': self.datagrams, 'applied': self.applied,
+                'foreign': self.foreign, 'unparsed': self.unparsed, 'timeouts': self.timeouts,
+                'changes': len(self.timeline)}
+
+
+class DeviceEmulator:
+    """
+    `count` VirtualDevices (roles assigned round-robin from `roles`) on one selector loop.
+
+    run() serves until stop() (from another thread) or `duration_s`; datagrams identical
+    to the previous one are decoded once for all devices.
+    """
+
+    def __init__(self, count, port=CLIENT_LISTENER_PORT, listen_ip="0.0.0.0", roles=None,
+                 gamma=GAMMA, exact_address=False, multicast_group=None):
+        roles = roles or RECEIVER_NAMES
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.devices = []
+        self._stop = False
+        try:
+            for index in range(count):
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((listen_ip, port))
+                sock.setblocking(False)
+                if multicast_group:
+                    membership = socket.inet_aton(multicast_group) + socket.inet_aton("0.0.0.0")
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+                role = roles[index % len(roles)]
+                device = VirtualDevice(f"{role}-{index // len(roles)}", role, sock, gamma, exact_address)
+                self.devices.append(device)
+                self.selector.register(sock, selectors.EVENT_READ, device)
+        except OSError:
+            self.close()
+            raise
+
+    def run(self, duration_s=None):
+        deadline = time.perf_counter() + duration_s if duration_s else None
+        timeout_s = REALTIME_TIMEOUT_MS / 1000.0
+        last_data = None
+        last_decoded = None
+        while not self._stop:
+            now = time.perf_counter()
+            if deadline and now >= deadline:
+                break
+            running = [device.last_received_s + timeout_s for device in self.devices if device.motor_running]
+            wait_s = max(0.0, min(running) - now) + 0.0005 if running else 0.1
+            if deadline:
+                wait_s = min(wait_s, deadline - now)
+            for key, _ in self.selector.select(wait_s):
+                device = key.data
+                while True:
+                    try:
+                        data = device.sock.recv(INCOMING_PACKET_BYTES)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    if data != last_data:
+                        last_data, last_decoded = data, decode_router_datagram(data)
+                    device.handle(last_decoded, time.perf_counter())
+            now = time.perf_counter()
+            for device in self.devices:
+                device.check_timeout(now)
+
+    def stop(self):
+        self._stop = True
+
+    def close(self):
+        for device in self.devices:
+            self.selector.unregister(device.sock)
+            device.sock.close()
+        self.devices = []
+        self.selector.close()
+
+    def write_timeline(self, path):
+        """Writes every device's motor timeline as CSV: device,role,time_s,value,cause."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("device,role,time_s,value,cause\n")
+            for device in self.devices:
+                for t, value, cause in device.timeline:
+                    f.write(f"{device.name},{device.role},{t:.6f},{value},{cause}\n")
+
+    def write_report(self, path):
+        """Writes every device's stats() plus its timeline as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'devices': [dict(device.stats(), timeline=device.timeline) for device in self.devices]}, f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulated Sharkee_Haptics.ino clients on one selector loop")
+    parser.add_argument("--devices", type=int, default=len(RECEIVER_NAMES), help="number of emulated devices")
+    parser.add_argument("--port", type=int, default=CLIENT_LISTENER_PORT)
+    parser.add_argument("--listen", default="0.0.0.0", help="address the device sockets bind to")
+    parser.add_argument("--multicast", action="store_true", help="join MULTICAST_GROUP like the sketch")
+    parser.add_argument("--exact-address", action="store_true",
+                        help="apply single messages only for the device's own role address")
+    parser.add_argument("--gamma", type=float, default=GAMMA)
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to run (0 = until Ctrl+C)")
+    parser.add_argument("--timeline", metavar="PATH", help="write the motor value timelines as CSV on exit")
+    parser.add_argument("--report", metavar="PATH", help="write per-device counters and timelines as JSON on exit")
+    args = parser.parse_args(argv)
+
+    emulator = DeviceEmulator(args.devices, args.port, args.listen, gamma=args.gamma, exact_address=args.exact_address,
+                              multicast_group=MULTICAST_GROUP if args.multicast else None)
+    print(f"Emulating {len(emulator.devices)} devices on UDP port {args.port}. Ctrl+C stops.", flush=True)
+    try:
+        emulator.run(args.duration or None)
+    except KeyboardInterrupt:
+        pass
+    print(f"  {'device':<14} {'datagrams':>9} {'applied':>8} {'foreign':>8} {'unparsed':>8} {'timeouts':>8} {'changes':>8}")
+    for device in emulator.devices:
+        s = device.stats()
+        print(f"  {s['device']:<14} {s['datagrams']:>9} {s['applied']:>8} {s['foreign']:>8} {s['unparsed']:>8} "
+              f"{s['timeouts']:>8} {s['changes']:>8}")
+    if args.timeline:
+        emulator.write_timeline(args.timeline)
+        print(f"Timelines written to {args.timeline}.")
+    if args.report:
+        emulator.write_report(args.report)
+    emulator.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
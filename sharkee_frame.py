@@ -0,0 +1,97 @@
+"""
+Compact binary haptic frame: an alternative to the per-role OSC strings.
+
+One frame carries any subset of the roles in a single fixed-layout datagram
+(all big-endian, like OSC):
+
+    offset  size  field
+    0       2     magic     b"SH"
+    2       2     sequence  uint16, incremented per frame, wraps at 65536
+    4       2     role mask bit i set = role i present (role order = CLIENT_MAP /
+                            firmware receiverNames order, up to 16 roles)
+    6       n     levels    one uint8 per set bit, in ascending bit order;
+                            intensity = level / 255 (before device gamma)
+
+All 11 roles fit in 17 bytes. This module is the Python reference encoder and
+decoder; firmware can adopt the layout without needing an OSC parser.
+"""
+import struct
+
+FRAME_MAGIC = b"SH"
+FRAME_HEADER = struct.Struct(">2sHH")
+FRAME_MAX_ROLES = 16
+FRAME_MAX_SIZE = FRAME_HEADER.size + FRAME_MAX_ROLES
+
+
+class FrameError(ValueError):
+    """Raised when a datagram is not a valid binary haptic frame."""
+
+
+def intensity_to_level(intensity):
+    """Quantizes an intensity (0.0-1.0, clamped) to the frame's uint8 level."""
+    if intensity <= 0.0:
+        return 0
+    if intensity >= 1.0:
+        return 255
+    return int(intensity * 255.0 + 0.5)
+
+
+def pack_frame_into(buffer, sequence, mask, levels):
+    """
+    Writes a frame into `buffer` (a preallocated bytearray of at least FRAME_MAX_SIZE bytes).
+
+    `levels` is indexable by role index; only the roles set in `mask` are written.
+    Returns the frame size in bytes.
+    """
+    FRAME_HEADER.pack_into(buffer, 0, FRAME_MAGIC, sequence & 0xFFFF, mask)
+    offset = FRAME_HEADER.size
+    index = 0
+    bits = mask
+    while bits:
+        if bits & 1:
+            buffer[offset] = levels[index]
+            offset += 1
+        bits >>= 1
+        index += 1
+    return offset
+
+
+def encode_frame(sequence, levels_by_role):
+    """Encodes {role_index: level} as a standalone frame (bytes). Reference encoder."""
+    mask = 0
+    levels = bytearray(FRAME_MAX_ROLES)
+    for index, level in levels_by_role.items():
+        if not 0 <= index < FRAME_MAX_ROLES:
+            raise FrameError(f"Role index {index} does not fit the {FRAME_MAX_ROLES}-bit role mask")
+        mask |= 1 << index
+        levels[index] = level
+    buffer = bytearray(FRAME_MAX_SIZE)
+    size = pack_frame_into(buffer, sequence, mask, levels)
+    return bytes(buffer[:size])
+
+
+def decode_frame(data):
+    """
+    Decodes a frame into (sequence, {role_index: level}). Reference decoder.
+
+    Raises FrameError for a wrong magic or a length that does not match the role mask.
+    """
+    if len(data) < FRAME_HEADER.size:
+        raise FrameError(f"Frame too short ({len(data)} bytes)")
+    magic, sequence, mask = FRAME_HEADER.unpack_from(data, 0)
+    if magic != FRAME_MAGIC:
+        raise FrameError(f"Bad frame magic {magic!r}")
+    expected = FRAME_HEADER.size + bin(mask).count("1")
+    if len(data) != expected:
+        raise FrameError(f"Frame length {len(data)} does not match role mask {mask:#06x} ({expected} bytes)")
+
+    levels = {}
+    offset = FRAME_HEADER.size
+    index = 0
+    while mask:
+        if mask & 1:
+            levels[index] = data[offset]
+            offset += 1
+        mask >>= 1
+        index += 1
+    return sequence, levels
@@ -1,164 +1,26 @@
-import socket
-import logging
+import argparse
 import time
-import threading
 import queue
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-from pythonosc import dispatcher
-from pythonosc import osc_server
-# CRITICAL FIX: Need osc_message_builder to manually create the packet
-from pythonosc import osc_message_builder 
-from pythonosc import udp_client # Keep for server only
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 
-# --- Configuration for Maximum Lag Reduction and Stability ---
+# Router core (no tkinter); run sharkee_router.py directly for the headless router.
+# Mutable router state (packet counters, dropped events, configuration set from the
+# command line) is accessed through the module so this file sees the live values.
+import sharkee_router as router
+from sharkee_router import (
+    BROADCAST_IP, CLIENT_MAP, GUI_QUEUE, INTERNAL_OSC_PORT, OUTPUT_TICK_HZ,
+    ROLE_NAMES, ROUTER_SNAPSHOT, VRC_OSC_LISTEN_IP, VRC_OSC_LISTEN_PORT,
+    FileTransport, OutputSink, broadcast_test_pulse, format_scheduler_stats,
+    format_latency_stats, format_layer_stats, format_sink_stats, start_router_engine,
+)
 
-# VRChat sends OSC signals to this address/port (usually localhost:9001)
-VRC_OSC_LISTEN_IP = "0.0.0.0" 
-VRC_OSC_LISTEN_PORT = 9001 
-
-# The router broadcasts to this IP on the subnet. 255.255.255.255 is the standard local broadcast address.
-BROADCAST_IP = "255.255.255.255" 
-
-# The base OSC message the router broadcasts. The receiver role will be appended.
-INTERNAL_OSC_ADDRESS_BASE = "/sharkeehaptics/set_intensity"
-INTERNAL_OSC_PORT = 8000 
-
-# Aggressive threshold for rate-limiting. (0.03 = 3%)
-INTENSITY_THRESHOLD = 0.03
+# --- GUI Configuration ---
 
 # GUI update interval (ms) tuned for ~60 Hz refresh
 GUI_UPDATE_INTERVAL_MS = 17 
-MAX_GUI_ITEMS_PER_LOOP = 1000
-
-# --- CLIENT MAPPING (Maps VRChat Receiver Name to mDNS Hostname) ---
-# The keys here will be used in the broadcast address (converted to lowercase).
-CLIENT_MAP = {
-    "Head":       "head.local",
-    "Chest":      "chest.local", 
-    "UpperArm_L": "upperarm_l.local",
-    "UpperArm_R": "upperarm_r.local",
-    "Hips":       "hips.local",
-    "UpperLeg_L": "upperleg_l.local",
-    "UpperLeg_R": "upperleg_r.local",
-    "LowerLeg_L": "lowerleg_l.local",
-    "LowerLeg_R": "lowerleg_r.local",
-    "Foot_L":     "foot_l.local",
-    "Foot_R":     "foot_r.local",
-}
-
-# VRChat OSC Addresses (MUST match your avatar's receiver parameters)
-VRC_OSC_MAP = {
-    "/avatar/parameters/Receiver_Head": "Head",
-    "/avatar/parameters/Receiver_Chest": "Chest",
-    "/avatar/parameters/Receiver_UpperArm_L": "UpperArm_L",
-    "/avatar/parameters/Receiver_UpperArm_R": "UpperArm_R",
-    "/avatar/parameters/Receiver_Hips": "Hips",
-    "/avatar/parameters/Receiver_UpperLeg_L": "UpperLeg_L",
-    "/avatar/parameters/Receiver_UpperLeg_R": "UpperLeg_R",
-    "/avatar/parameters/Receiver_LowerLeg_L": "LowerLeg_L",
-    "/avatar/parameters/Receiver_LowerLeg_R": "LowerLeg_R",
-    "/avatar/parameters/Receiver_Foot_L": "Foot_L",
-    "/avatar/parameters/Receiver_Foot_R": "Foot_R",
-}
-# -------------------------------------
-
-# --- GLOBAL STATE ---
-# Use a custom socket to ensure broadcast is enabled
-BROADCAST_SENDER_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-BROADCAST_SENDER_SOCKET.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-
-# Global state trackers (shared between threads)
-LAST_INTENSITY = {name: 0.0 for name in CLIENT_MAP.keys()} 
-CLIENT_ONLINE_STATUS = {name: False for name in CLIENT_MAP.keys()} 
-
-# Performance Counters
-PACKETS_RECEIVED = 0
-PACKETS_ROUTED = 0
-
-# Thread-safe queues
-GUI_QUEUE = queue.Queue()       # For updating the GUI from background threads
-
-# Track last received OSC message
-LAST_RECEIVED_OSC = {"address": "None", "value": 0.0}
-
-def send_osc_via_broadcast(address, value):
-    """
-    Encodes and sends a single float OSC message via the custom broadcast socket.
-    
-    This replaces SimpleUDPClient's send_message functionality for broadcast.
-    """
-    builder = osc_message_builder.OscMessageBuilder(address=address)
-    # The 'f' type tag is added implicitly by adding a float
-    builder.add_arg(value, "f") 
-    msg = builder.build()
-    # Send the raw datagram bytes (msg.dgram) to the broadcast address and port
-    BROADCAST_SENDER_SOCKET.sendto(msg.dgram, (BROADCAST_IP, INTERNAL_OSC_PORT))
-
-
-def sharkeehaptics_router_handler(address, *args):
-    """
-    NON-BLOCKING OSC Handler. Reads VRChat packets, applies rate-limit, 
-    and broadcasts the message to all clients.
-    """
-    
-    global PACKETS_RECEIVED, PACKETS_ROUTED, LAST_RECEIVED_OSC
-    PACKETS_RECEIVED += 1
-    
-    # receiver_name is in Title-Case (e.g., "Head")
-    receiver_name = VRC_OSC_MAP.get(address)
-    if not receiver_name:
-        return
-    
-    current_intensity = float(args[0])
-    LAST_RECEIVED_OSC = {"address": address, "value": current_intensity}
-    
-    GUI_QUEUE.put({
-        'type': 'LAST_MESSAGE_UPDATE',
-        'address': address,
-        'value': current_intensity
-    })
-    
-    # CRITICAL CHANGE: Build the broadcast address using the lowercase receiver name
-    client_receiver_name = receiver_name.lower()
-    full_osc_address = f"{INTERNAL_OSC_ADDRESS_BASE}/{client_receiver_name}"
-    
-    # 1. Check for Rate Limiting / Debouncing (LAG REDUCTION)
-    last_val = LAST_INTENSITY.get(receiver_name, 0.0)
-
-    # Send if: Intensity changed significantly OR It's a stop command
-    should_send = (abs(current_intensity - last_val) > INTENSITY_THRESHOLD) or (current_intensity < INTENSITY_THRESHOLD/2)
-    
-    # 2. Handle Routing (Broadcast)
-    if should_send:
-        try:
-            # Use the new broadcast function to send the message
-            send_osc_via_broadcast(full_osc_address, current_intensity) 
-            
-            LAST_INTENSITY[receiver_name] = current_intensity
-            
-            PACKETS_ROUTED += 1
-
-            if current_intensity > 0.05:
-                log_msg = f"[BROADCAST] {receiver_name}: {current_intensity:.2f} -> {BROADCAST_IP}:{INTERNAL_OSC_PORT} ({full_osc_address})"
-                GUI_QUEUE.put({'type': 'LOG', 'message': log_msg, 'level': 'INFO'})
-                
-            # Update GUI status (assuming it is broadcasting)
-            GUI_QUEUE.put({
-                'type': 'STATUS_UPDATE', 
-                'receiver': receiver_name, 
-                'ip': BROADCAST_IP, 
-                'intensity': current_intensity,
-                'status': 'BROADCASTING'
-            })
-            
-        except Exception as e:
-            # Log only if sending fails entirely (e.g., firewall blocked)
-            log_msg = f"Broadcast send failed to {BROADCAST_IP}:{INTERNAL_OSC_PORT}: {e}"
-            GUI_QUEUE.put({'type': 'LOG', 'message': log_msg, 'level': 'ERROR'})
-
-    # 3. Queue performance counter update
-    GUI_QUEUE.put({'type': 'COUNTER_UPDATE', 'received': PACKETS_RECEIVED, 'routed': PACKETS_ROUTED})
+# Maximum queued events (log lines) handled per GUI update
+MAX_GUI_ITEMS_PER_LOOP = 200
 
 
 class SharkeeHapticsRouterApp(tk.Tk):
@@ -174,6 +36,7 @@ class SharkeeHapticsRouterApp(tk.Tk):
         self.geometry("800x600")
         self.server_thread = None
         self.resolver_thread = None # No resolver thread in broadcast mode
+        self.recording_sink = None # Name of the attached file sink while recording
         self.server = None
         self.is_running = False
         
@@ -204,10 +67,15 @@ class SharkeeHapticsRouterApp(tk.Tk):
         
         # Client status is simplified, always showing the broadcast IP
         self.client_status = {
-            name: {"ip": BROADCAST_IP, "intensity": 0.0, "status": "STOPPED"}
+            name: {"ip": BROADCAST_IP, "intensity": 0.0, "status": "STOPPED", "sent": 0, "suppressed": 0}
             for name in CLIENT_MAP.keys()
         }
         
+        # Last values drawn from ROUTER_SNAPSHOT / the counters (skip redundant widget updates)
+        self._rendered_counters = None
+        self._rendered_scheduler_stats = None
+        self._rendered_events_dropped = 0
+
         self._create_widgets()
         # self._setup_context_menu() # REMOVED: No manual IP setting in broadcast mode
         self._start_gui_update_loop()
@@ -215,11 +83,11 @@ class SharkeeHapticsRouterApp(tk.Tk):
         self.toggle_server() 
 
     def _reset_counters(self):
-        global PACKETS_RECEIVED, PACKETS_ROUTED
-        PACKETS_RECEIVED = 0
-        PACKETS_ROUTED = 0
+        router.reset_counters()
         self.received_label.config(text="Received: 0")
         self.routed_label.config(text="Routed: 0")
+        self.keepalive_label.config(text="Keepalive: 0")
+        self.latency_label.config(text="Latency: idle")
 
     def _create_widgets(self):
         # Row 0: Header and Controls
@@ -239,6 +107,8 @@ class SharkeeHapticsRouterApp(tk.Tk):
         self.received_label.pack(side=tk.LEFT, padx=5)
         self.routed_label = ttk.Label(metrics_frame, text="Routed: 0", foreground='#4CAF50', font=('Inter', 10, 'bold'))
         self.routed_label.pack(side=tk.LEFT, padx=5)
+        self.keepalive_label = ttk.Label(metrics_frame, text="Keepalive: 0", foreground=self.ACCENT_CYAN, font=('Inter', 10, 'bold'))
+        self.keepalive_label.pack(side=tk.LEFT, padx=5)
         
         # Status and Toggle
         self.status_label = ttk.Label(header_frame, text="STATUS: STOPPED", font=('Inter', 12, 'bold'), foreground='#FF5722')
@@ -254,6 +124,14 @@ class SharkeeHapticsRouterApp(tk.Tk):
         
         self.last_msg_label = ttk.Label(last_msg_frame, text="Address: None | Value: 0.00", foreground='#FBBF24', font=('Inter', 10, 'bold'))
         self.last_msg_label.pack(anchor='w', padx=5)
+        self.scheduler_label = ttk.Label(last_msg_frame, text=f"Scheduler: {OUTPUT_TICK_HZ} Hz | idle", foreground=self.ACCENT_CYAN, font=('Inter', 9))
+        self.scheduler_label.pack(anchor='w', padx=5)
+        self.sinks_label = ttk.Label(last_msg_frame, text="Sinks: idle", foreground=self.ACCENT_CYAN, font=('Inter', 9))
+        self.sinks_label.pack(anchor='w', padx=5)
+        self.layers_label = ttk.Label(last_msg_frame, text="Layers: idle", foreground=self.ACCENT_CYAN, font=('Inter', 9))
+        self.layers_label.pack(anchor='w', padx=5)
+        self.latency_label = ttk.Label(last_msg_frame, text="Latency: idle", foreground=self.ACCENT_CYAN, font=('Inter', 9))
+        self.latency_label.pack(anchor='w', padx=5)
         
         # Row 0.75: Action Buttons
         buttons_frame = tk.LabelFrame(self, text=" Actions ", bg=self.BG_DARK, fg=self.ACCENT_GREEN,
@@ -262,6 +140,14 @@ class SharkeeHapticsRouterApp(tk.Tk):
         buttons_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
         
         ttk.Button(buttons_frame, text="Test All Clients", command=self._test_all_clients, style='TButton').pack(side=tk.LEFT, padx=5)
+        self.record_button = ttk.Button(buttons_frame, text="Record to File...", command=self._toggle_recording, style='TButton')
+        self.record_button.pack(side=tk.LEFT, padx=5)
+        self.pattern_var = tk.StringVar(value="heartbeat")
+        self.pattern_combo = ttk.Combobox(buttons_frame, textvariable=self.pattern_var, width=14, state='readonly',
+                                          values=sorted(router.PATTERN_PLAYER.clips))
+        self.pattern_combo.pack(side=tk.LEFT, padx=(15, 2))
+        ttk.Button(buttons_frame, text="Play Pattern", command=self._play_pattern, style='TButton').pack(side=tk.LEFT, padx=2)
+        ttk.Button(buttons_frame, text="Load Patterns...", command=self._load_patterns, style='TButton').pack(side=tk.LEFT, padx=(2, 15))
         ttk.Button(buttons_frame, text="Clear Log", command=self._clear_log, style='TButton').pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Help/About", command=self._show_help_about, style='TButton').pack(side=tk.LEFT, padx=5)
         
@@ -275,24 +161,28 @@ class SharkeeHapticsRouterApp(tk.Tk):
         status_frame.grid_rowconfigure(0, weight=1)
 
         # Removed 'resolved_ip' column
-        columns = ("vrc_receiver", "mdns_hostname", "intensity", "status")
+        columns = ("vrc_receiver", "mdns_hostname", "intensity", "status", "sent", "suppressed")
         self.tree = ttk.Treeview(status_frame, columns=columns, show="headings", height=12)
         
         self.tree.heading("vrc_receiver", text="VRC Receiver", anchor=tk.W)
         self.tree.heading("mdns_hostname", text="Role (mDNS Hostname)", anchor=tk.W)
         self.tree.heading("intensity", text="Intensity", anchor=tk.CENTER)
         self.tree.heading("status", text="Status", anchor=tk.CENTER)
+        self.tree.heading("sent", text="Sent", anchor=tk.CENTER)
+        self.tree.heading("suppressed", text="Suppressed", anchor=tk.CENTER)
 
         self.tree.column("vrc_receiver", width=250, anchor=tk.W)
         self.tree.column("mdns_hostname", width=250, anchor=tk.W)
         self.tree.column("intensity", width=100, anchor=tk.CENTER)
         self.tree.column("status", width=100, anchor=tk.CENTER)
+        self.tree.column("sent", width=80, anchor=tk.CENTER)
+        self.tree.column("suppressed", width=90, anchor=tk.CENTER)
         
         self.tree.grid(row=0, column=0, sticky="nsew")
 
         # Initialize table data
         for name, hostname in CLIENT_MAP.items():
-            self.tree.insert('', 'end', iid=name, values=(name, hostname, '0.00%', 'STOPPED'))
+            self.tree.insert('', 'end', iid=name, values=(name, hostname, '0.00%', 'STOPPED', 0, 0))
 
         # Row 4: Activity Log
         log_frame = tk.LabelFrame(self, text=" Activity Log ", bg=self.BG_DARK, fg=self.ACCENT_GREEN, 
@@ -313,14 +203,19 @@ class SharkeeHapticsRouterApp(tk.Tk):
 
     # Removed _setup_context_menu and IP management functions
 
-    def _send_osc_via_broadcast(self, address, value):
-        """Helper to send OSC via the global broadcast function."""
-        try:
-            send_osc_via_broadcast(address, value)
-            return True
-        except Exception as e:
-            self.log_to_gui(f"Error sending broadcast OSC message to {address}: {e}", level='ERROR')
-            return False
+    def _submit_to_router(self, callback):
+        """Runs callback on the router engine thread (or right here if the router is stopped)."""
+        if self.server:
+            self.server.submit(callback)
+        else:
+            callback()
+
+    def _schedule_on_router(self, delay_s, callback):
+        """Engine timer when the router runs; falls back to a Tk timer when it is stopped."""
+        if self.server:
+            self.server.schedule(delay_s, callback)
+        else:
+            self.after(int(delay_s * 1000), callback)
 
     def _test_single_client(self):
         """Sends a strong test pulse for the selected client role via broadcast."""
@@ -328,42 +223,37 @@ class SharkeeHapticsRouterApp(tk.Tk):
         if not selected_iid:
             return
             
-        client_receiver_name = selected_iid.lower()
-        full_osc_address = f"{INTERNAL_OSC_ADDRESS_BASE}/{client_receiver_name}"
-        
         self.log_to_gui(f"Sending test pulse for role {selected_iid} via broadcast.", level='WARN')
-        if self._send_osc_via_broadcast(full_osc_address, 1.0): # Send max intensity pulse
-            # Schedule a stop pulse after a short delay
-            self.after(200, lambda: self._send_osc_via_broadcast(full_osc_address, 0.0))
+        self._submit_to_router(lambda: broadcast_test_pulse([selected_iid], self._schedule_on_router))
             
     def _test_all_clients(self):
         """Sends a strong test pulse to all client roles via broadcast."""
         self.log_to_gui("Sending test pulse to ALL client roles via broadcast.", level='WARN')
-        
-        sent_count = 0
-        for receiver in CLIENT_MAP.keys():
-            client_receiver_name = receiver.lower()
-            full_osc_address = f"{INTERNAL_OSC_ADDRESS_BASE}/{client_receiver_name}"
-            if self._send_osc_via_broadcast(full_osc_address, 1.0):
-                sent_count += 1
-        
-        if sent_count > 0:
-            # Schedule a stop pulse after a short delay
-            self.after(200, self._stop_all_clients)
-            self.log_to_gui(f"Broadcast a pulse message for {sent_count} client roles.", level='SUCCESS')
-        else:
-            self.log_to_gui("Error: Could not broadcast test pulse.", level='ERROR')
-
-    def _stop_all_clients(self):
-        """Sends a stop command to all client roles."""
-        for receiver in CLIENT_MAP.keys():
-            client_receiver_name = receiver.lower()
-            full_osc_address = f"{INTERNAL_OSC_ADDRESS_BASE}/{client_receiver_name}"
-            # Use the helper but suppress GUI logging for quiet stop
-            try:
-                send_osc_via_broadcast(full_osc_address, 0.0) 
-            except:
-                pass # Ignore errors on stop, best effort
+        self._submit_to_router(lambda: broadcast_test_pulse(list(CLIENT_MAP.keys()), self._schedule_on_router))
+
+    def _play_pattern(self):
+        """Plays the chosen pattern clip on the selected role, or on every role the clip drives."""
+        if not self.server:
+            self.log_to_gui("Start the router before playing patterns.", level='WARN')
+            return
+        name = self.pattern_var.get()
+        receivers = list(self.tree.selection()) or None
+        self.log_to_gui(f"Playing pattern '{name}' on {', '.join(receivers) if receivers else 'its roles'}.", level='INFO')
+        self._submit_to_router(lambda: router.PATTERN_PLAYER.play(name, receivers))
+
+    def _load_patterns(self):
+        """Loads pattern clips from a JSON file and adds them to the pattern list."""
+        path = filedialog.askopenfilename(title="Load pattern clips",
+                                          filetypes=[("Pattern clips", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            names = router.load_pattern_files([path])
+        except (OSError, ValueError) as e:
+            self.log_to_gui(f"Could not load patterns from {path}: {e}", level='ERROR')
+            return
+        self.pattern_combo.config(values=sorted(router.PATTERN_PLAYER.clips))
+        self.log_to_gui(f"Loaded pattern clips: {', '.join(names)}.", level='SUCCESS')
 
     def _refresh_all_clients(self):
         """Resets status to reflect that broadcasting is active."""
@@ -394,23 +284,23 @@ class SharkeeHapticsRouterApp(tk.Tk):
     def _start_server(self):
         """Initializes and starts the OSC server thread."""
         try:
-            d = dispatcher.Dispatcher()
-            # Map all VRChat receiver addresses to the single handler
-            for address in VRC_OSC_MAP.keys():
-                d.map(address, sharkeehaptics_router_handler)
-                
-            self.server = osc_server.ThreadingOSCUDPServer(
-                (VRC_OSC_LISTEN_IP, VRC_OSC_LISTEN_PORT), d)
-            
-            self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
-            self.server_thread.start()
-
-            # No resolver thread to start
+            # Single router thread; every VRC_OSC_MAP address is routed inline to the handler
+            self.server = start_router_engine()
+            self.server_thread = self.server.thread
+            # Unicast sinks resolve CLIENT_MAP hostnames on their own thread; broadcast has none
+            resolvers = [sink.transport.resolver for sink in self.server.sinks.sinks if hasattr(sink.transport, 'resolver')]
+            self.resolver_thread = resolvers[0].thread if resolvers else None
             
             self.is_running = True
             self.status_label.config(text=f"STATUS: RUNNING (VRC Port: {VRC_OSC_LISTEN_PORT})", foreground='#4CAF50')
             self.toggle_button.config(text="Stop Router")
-            self.log_to_gui(f"OSC Broadcast Router started. Listening for VRChat on {VRC_OSC_LISTEN_IP}:{VRC_OSC_LISTEN_PORT}. Broadcasting to {BROADCAST_IP}:{INTERNAL_OSC_PORT}.", level='SUCCESS')
+            self.log_to_gui(f"OSC Broadcast Router started ({router.ROUTER_ENGINE} engine). Listening for VRChat on {VRC_OSC_LISTEN_IP}:{VRC_OSC_LISTEN_PORT}. Sending to {self.server.sinks.describe()}.", level='SUCCESS')
+            for source in self.server.sources:
+                self.log_to_gui(f"Merging input source {source.describe()}.", level='INFO')
+            if self.server.recorder:
+                self.log_to_gui(f"Recording session to {self.server.recorder.path}.", level='INFO')
+            if self.server.metrics:
+                self.log_to_gui(f"Serving metrics at {self.server.metrics.describe()}.", level='INFO')
             self._refresh_all_clients() # Kick off initial status display
         except Exception as e:
             self.log_to_gui(f"Failed to start server: {e}", level='ERROR')
@@ -420,9 +310,12 @@ class SharkeeHapticsRouterApp(tk.Tk):
     def _stop_server(self):
         """Stops the OSC server gracefully."""
         if self.server:
-            self.server.shutdown()
-            self.server.server_close()
-            self.server_thread.join(timeout=1)
+            self.server.stop()
+            self.server = None
+        self.resolver_thread = None
+        # The engine's sinks, including a recording, stop with it
+        self.recording_sink = None
+        self.record_button.config(text="Record to File...")
         
         self.is_running = False
         self.status_label.config(text="STATUS: STOPPED", foreground='#FF5722')
@@ -430,17 +323,23 @@ class SharkeeHapticsRouterApp(tk.Tk):
         self.log_to_gui("OSC Router stopped.", level='INFO')
         self._reset_counters()
         
-        # Clear all connection statuses in the table
-        for name in CLIENT_MAP.keys():
-            self._update_client_status({'receiver': name, 'ip': BROADCAST_IP, 'intensity': 0.0, 'status': 'STOPPED'})
+        # Clear all connection statuses in the table (through the snapshot, so a row
+        # still marked dirty by the last scheduler tick cannot overwrite it)
+        for index in range(len(ROLE_NAMES)):
+            ROUTER_SNAPSHOT.set_role(index, 0.0, 'STOPPED')
+        self._render_snapshot()
 
     def _start_gui_update_loop(self):
         """Sets up the periodic GUI update loop."""
         self.after(GUI_UPDATE_INTERVAL_MS, self._process_queue)
         
     def _process_queue(self):
-        """Processes messages from the background threads to update the GUI."""
-        
+        """Renders the latest router snapshot, then processes queued events (log lines)."""
+        try:
+            self._render_snapshot()
+        except Exception as e:
+            self.log_to_gui(f"Error rendering router state: {e}", level='ERROR')
+
         items_processed = 0
         while not GUI_QUEUE.empty() and items_processed < MAX_GUI_ITEMS_PER_LOOP:
             try:
@@ -449,18 +348,9 @@ class SharkeeHapticsRouterApp(tk.Tk):
                 
                 if msg_type == 'LOG':
                     self.log_to_gui(message['message'], message['level'])
-                    
-                elif msg_type == 'STATUS_UPDATE':
-                    self._update_client_status(message)
-
-                # Removed RESOLVE_UPDATE case
-                        
-                elif msg_type == 'LAST_MESSAGE_UPDATE':
-                    self.last_msg_label.config(text=f"Address: {message['address']} | Value: {message['value']:.2f}")
 
-                elif msg_type == 'COUNTER_UPDATE':
-                    self.received_label.config(text=f"Received: {message['received']}")
-                    self.routed_label.config(text=f"Routed: {message['routed']}")
+                # Removed RESOLVE_UPDATE, STATUS_UPDATE, LAST_MESSAGE_UPDATE and COUNTER_UPDATE
+                # cases: that state is rendered from ROUTER_SNAPSHOT
                     
                 GUI_QUEUE.task_done()
                 items_processed += 1
@@ -472,6 +362,50 @@ class SharkeeHapticsRouterApp(tk.Tk):
                 
         self.after(GUI_UPDATE_INTERVAL_MS, self._process_queue)
 
+    def _render_snapshot(self):
+        """Draws the latest router state: dirty table rows, last message, counters, scheduler stats."""
+        snapshot = ROUTER_SNAPSHOT
+        for index, receiver in enumerate(ROLE_NAMES):
+            if not snapshot.role_dirty[index]:
+                continue
+            # Clear before reading so a concurrent write is picked up next frame
+            snapshot.role_dirty[index] = False
+            self._update_client_status({
+                'receiver': receiver, 'ip': BROADCAST_IP,
+                'intensity': snapshot.role_intensity[index], 'status': snapshot.role_status[index]
+            })
+
+        if snapshot.last_message_dirty:
+            snapshot.last_message_dirty = False
+            self.last_msg_label.config(text=f"Address: {snapshot.last_address} | Value: {snapshot.last_value:.2f}")
+
+        counters = (router.PACKETS_RECEIVED, router.PACKETS_ROUTED, router.PACKETS_KEEPALIVE)
+        if counters != self._rendered_counters:
+            self._rendered_counters = counters
+            self.received_label.config(text=f"Received: {counters[0]}")
+            self.routed_label.config(text=f"Routed: {counters[1]}")
+            self.keepalive_label.config(text=f"Keepalive: {counters[2]}")
+
+        stats = snapshot.scheduler_stats
+        if stats is not self._rendered_scheduler_stats:
+            self._rendered_scheduler_stats = stats
+            if stats:
+                self.scheduler_label.config(text=format_scheduler_stats(stats))
+                self.sinks_label.config(text=format_sink_stats(stats['transport']))
+                self.layers_label.config(text=format_layer_stats(stats['layers']))
+                self.latency_label.config(text=format_latency_stats(stats['latency']))
+                # Per-role send counters only move with scheduler stats, so refresh just those cells
+                for receiver, sent, suppressed in zip(ROLE_NAMES, stats['role_sent'], stats['role_suppressed']):
+                    self.client_status[receiver]['sent'] = sent
+                    self.client_status[receiver]['suppressed'] = suppressed
+                    self.tree.set(receiver, "sent", sent)
+                    self.tree.set(receiver, "suppressed", suppressed)
+
+        events_dropped = router.GUI_EVENTS_DROPPED
+        if events_dropped != self._rendered_events_dropped:
+            self.log_to_gui(f"Activity log fell behind: {events_dropped - self._rendered_events_dropped} events dropped.", level='WARN')
+            self._rendered_events_dropped = events_dropped
+
     def _update_client_status(self, data):
         """Updates a single client row in the Treeview table."""
         receiver = data['receiver']
@@ -495,7 +429,9 @@ class SharkeeHapticsRouterApp(tk.Tk):
                 receiver, 
                 CLIENT_MAP.get(receiver), 
                 intensity_str, 
-                self.client_status[receiver]['status']
+                self.client_status[receiver]['status'],
+                self.client_status[receiver]['sent'],
+                self.client_status[receiver]['suppressed']
             ))
             
             # Update row appearance based on status/activity
@@ -526,6 +462,32 @@ class SharkeeHapticsRouterApp(tk.Tk):
         self._stop_server() # Ensure threads are stopped
         self.destroy()
 
+    def _toggle_recording(self):
+        """Attaches a file sink recording every sent datagram, or detaches the running one."""
+        if not self.server:
+            self.log_to_gui("Start the router before recording.", level='WARN')
+            return
+        if self.recording_sink:
+            try:
+                self.server.sinks.detach(self.recording_sink)
+            except KeyError:
+                pass
+            self.recording_sink = None
+            self.record_button.config(text="Record to File...")
+            return
+        path = filedialog.asksaveasfilename(title="Record output to", defaultextension=".shrec",
+                                            filetypes=[("SharkeeHaptics recording", "*.shrec"), ("All files", "*.*")])
+        if not path:
+            return
+        name = f"file:{path}"
+        try:
+            self.server.sinks.attach(OutputSink(name, FileTransport(path)))
+        except Exception as e:
+            self.log_to_gui(f"Could not start recording: {e}", level='ERROR')
+            return
+        self.recording_sink = name
+        self.record_button.config(text="Stop Recording")
+
     def _clear_log(self):
         """Clears the activity log window."""
         self.log_text.config(state=tk.NORMAL)
@@ -545,6 +507,13 @@ class SharkeeHapticsRouterApp(tk.Tk):
         )
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SharkeeHaptics Broadcast Router")
+    router.add_router_arguments(parser)
+    try:
+        router.apply_router_arguments(parser.parse_args())
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
     app = SharkeeHapticsRouterApp()
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
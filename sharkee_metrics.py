@@ -0,0 +1,241 @@
+"""
+Router instrumentation: fixed-bucket log-linear (HDR-style) histograms and a Prometheus
+text-format endpoint.
+
+A Histogram covers 0 .. 2**max_bits - 1 with a fixed bucket list allocated once:
+
+    linear      values below 2**sub_bucket_bits have a bucket each (exact)
+    octaves     every further power of two is split into 2**(sub_bucket_bits - 1)
+                equal buckets, so a bucket is never wider than 1 / 2**(sub_bucket_bits - 1)
+                of its values (about 3% with the default 6 bits)
+
+record() is two table lookups by bit_length, a shift and a list increment: nothing is
+allocated per sample, there is no branch on the value's range and the count is only
+summed when read. Values above the range land in the last bucket (max is still exact).
+Percentiles report the upper edge of the bucket holding the requested rank, capped at
+the recorded maximum.
+
+There is no lock: each histogram is meant to have one writer thread. With several
+writers a concurrent increment can occasionally be lost, which does not move a
+percentile in any visible way.
+
+MetricsServer serves GET /metrics from a body rendered once per interval on its own
+thread; a scrape only writes the cached bytes, so any number of scrapers costs the
+router nothing beyond that one render.
+"""
+import http.server
+import threading
+
+
+class Histogram:
+    """Fixed-bucket histogram of non-negative integers (nanoseconds, queue depths, ...)."""
+
+    def __init__(self, name, sub_bucket_bits=6, max_bits=40):
+        self.name = name
+        self._linear = 1 << sub_bucket_bits
+        self._half = self._linear >> 1
+        self._size = self._linear + (max_bits - sub_bucket_bits) * self._half
+        # Bucket of a value with b significant bits: _offsets[b] + (value >> _shifts[b])
+        self._offsets = [0] * (sub_bucket_bits + 1)
+        self._shifts = [0] * (sub_bucket_bits + 1)
+        for shift in range(1, max_bits - sub_bucket_bits + 1):
+            self._offsets.append(self._linear + (shift - 1) * self._half - self._half)
+            self._shifts.append(shift)
+        # Anything wider than max_bits (up to 64-bit values) shifts to 0 in the last bucket
+        self._offsets += [self._size - 1] * (65 - len(self._offsets))
+        self._shifts += [64] * (65 - len(self._shifts))
+        self.counts = [0] * self._size
+        self.max = 0
+
+    def record(self, value):
+        """Adds one sample; `value` must be a non-negative int."""
+        bits = value.bit_length()
+        self.counts[self._offsets[bits] + (value >> self._shifts[bits])] += 1
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        # In place, so a writer holding self.counts keeps a list of the right size
+        self.counts[:] = [0] * self._size
+        self.max = 0
+
+    def bucket_upper(self, index):
+        """Largest value that falls into bucket `index`."""
+        if index < self._linear:
+            return index
+        octave, sub = divmod(index - self._linear, self._half)
+        shift = octave + 1
+        return ((sub + self._half + 1) << shift) - 1
+
+    def percentiles(self, quantiles, total=None):
+        """Values at the given quantiles (0.0-1.0, ascending); all 0 while empty."""
+        total = sum(self.counts) if total is None else total
+        if not total:
+            return [0] * len(quantiles)
+        results = []
+        targets = iter(quantiles)
+        quantile = next(targets)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while seen >= quantile * total:
+                results.append(min(self.bucket_upper(index), self.max))
+                quantile = next(targets, None)
+                if quantile is None:
+                    return results
+        # Counts moved under a concurrent writer: pad with the maximum
+        return results + [self.max] * (len(quantiles) - len(results))
+
+    def summary(self):
+        """{'count', 'p50', 'p95', 'p99', 'max'} in the recorded unit."""
+        count = sum(self.counts)
+        p50, p95, p99 = self.percentiles((0.50, 0.95, 0.99), count)
+        return {'count': count, 'p50': p50, 'p95': p95, 'p99': p99, 'max': self.max}
+
+    def cumulative(self, bounds):
+        """
+        (counts at or below each bound, total count, estimated sum) for a Prometheus histogram.
+
+        A bucket counts towards a bound when its upper edge is within it, so a bound
+        between two edges is conservative by at most one bucket width. The sum is estimated
+        from bucket midpoints (the exact sum is not kept, to keep record() minimal).
+        """
+        counts = list(self.counts)
+        cumulative = []
+        seen = 0
+        estimated_sum = 0
+        position = 0
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            upper = self.bucket_upper(index)
+            while position < len(bounds) and upper > bounds[position]:
+                cumulative.append(seen)
+                position += 1
+            seen += count
+            lower = self.bucket_upper(index - 1) + 1 if index else 0
+            estimated_sum += count * (lower + upper) / 2
+        cumulative += [seen] * (len(bounds) - position)
+        return cumulative, seen, estimated_sum
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(int(value))
+
+
+def render_prometheus(families):
+    """
+    Prometheus text exposition (format 0.0.4) of `families`.
+
+    Each family is (name, type, help, samples) with samples a list of (suffix, labels dict,
+    value); suffix is "" for counters/gauges and "_bucket"/"_sum"/"_count" for histograms.
+    """
+    lines = []
+    for name, metric_type, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def histogram_samples(histogram, bounds, scale=1.0, labels=None):
+    """Prometheus histogram samples of a Histogram; `scale` converts its unit (e.g. 1e-9 for ns to seconds)."""
+    labels = labels or {}
+    cumulative, count, estimated_sum = histogram.cumulative([bound / scale for bound in bounds])
+    samples = [("_bucket", dict(labels, le=_format_value(float(bound))), seen) for bound, seen in zip(bounds, cumulative)]
+    samples.append(("_bucket", dict(labels, le="+Inf"), count))
+    samples.append(("_sum", labels, estimated_sum * scale))
+    samples.append(("_count", labels, count))
+    return samples
+
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape would flood the router log
+
+
+class MetricsServer:
+    """
+    HTTP endpoint for `collect()` (a list of families, see render_prometheus).
+
+    A refresh thread calls collect() and renders it every `interval_s`; request threads
+    only send the last rendered body. A failing collect() keeps the previous body.
+    """
+
+    def __init__(self, address, collect, interval_s=1.0):
+        self.address = address
+        self.collect = collect
+        self.interval_s = interval_s
+        self.httpd = None
+        self.renders = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Binds the listener (errors propagate), renders once and starts the serve and refresh threads."""
+        self.httpd = http.server.ThreadingHTTPServer(self.address, _MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.body = b""
+        self.address = self.httpd.server_address
+        self._stop_event.clear()
+        self.refresh()
+        self._threads = [threading.Thread(target=self.httpd.serve_forever, name="MetricsServer", daemon=True),
+                         threading.Thread(target=self._refresh_loop, name="MetricsRefresh", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def refresh(self):
+        try:
+            body = render_prometheus(self.collect())
+        except Exception as e:
+            self.last_error = str(e)
+            return
+        self.httpd.body = body
+        self.renders += 1
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.refresh()
+
+    def stop(self):
+        """Stops both threads and closes the listener. Safe to call twice or before start()."""
+        self._stop_event.set()
+        if self.httpd:
+            if self._threads:
+                self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+
+    def describe(self):
+        return f"http://{self.address[0]}:{self.address[1]}/metrics"
@@ -0,0 +1,128 @@
+"""
+Spatial mixing from N contact inputs to M motor roles.
+
+A mixing matrix entry (input j, role i, weight w) contributes w * input[j] to role i;
+each role combines its contributions with one policy:
+
+    max      strongest contribution wins (a contact never adds up with its neighbours)
+    sum      contributions add up, clamped to 1.0
+    softmax  exp(sharpness * c)-weighted mean of the contributions: close to max when
+             one input dominates, approaching the mean when several are equally strong
+
+With NumPy installed the matrix is held dense (roles x inputs) and every tick is one
+vectorized product; without it the same math runs over the sparse entries per role.
+
+load_matrix_file reads a router MIXING_MATRIX from JSON: an object mapping each contact
+address to an object of {role: weight}.
+"""
+import json
+import math
+
+# NumPy is imported on first use (load_numpy), so importing this module stays light
+np = None
+_numpy_missing = False
+
+
+def load_numpy():
+    """Imports NumPy on first call and returns it, or None when it is not installed."""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except ImportError:  # mixing falls back to the per-role Python loop
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np
+
+MIX_COMBINES = ("max", "sum", "softmax")
+
+
+class SparseMixer:
+    """
+    Mixes `input_count` inputs into `output_count` outputs.
+
+    `entries` is an iterable of (output_index, input_index, weight). Weights must be
+    positive; an output without entries always mixes to 0.0.
+    """
+
+    def __init__(self, entries, input_count, output_count, combine="max", sharpness=8.0, use_numpy=None):
+        if combine not in MIX_COMBINES:
+            raise ValueError(f"Unknown mixing combine policy {combine!r} (expected one of {', '.join(MIX_COMBINES)})")
+        self.input_count = input_count
+        self.output_count = output_count
+        self.combine = combine
+        self.sharpness = sharpness
+        self.use_numpy = (use_numpy is None or bool(use_numpy)) and load_numpy() is not None
+        # Per output: ([input_index, ...], [weight, ...])
+        self.rows = [([], []) for _ in range(output_count)]
+        for output_index, input_index, weight in entries:
+            if weight <= 0.0:
+                raise ValueError(f"Mixing weight {weight} for input {input_index} -> output {output_index} must be positive")
+            if not (0 <= output_index < output_count and 0 <= input_index < input_count):
+                raise ValueError(f"Mixing entry {input_index} -> {output_index} is out of range")
+            self.rows[output_index][0].append(input_index)
+            self.rows[output_index][1].append(float(weight))
+        if self.use_numpy:
+            self._weights = np.zeros((output_count, input_count))
+            for output_index, (inputs, weights) in enumerate(self.rows):
+                self._weights[output_index, inputs] = weights
+            self._support = self._weights > 0.0
+            self._contributions = np.empty((output_count, input_count))
+
+    def mix(self, inputs):
+        """Returns the `output_count` mixed values (a list) for the `input_count` input values."""
+        if self.use_numpy:
+            return self._mix_numpy(inputs)
+        return self._mix_python(inputs)
+
+    def _mix_numpy(self, inputs):
+        x = np.array(inputs, dtype=float)
+        np.clip(x, 0.0, 1.0, out=x)
+        if self.combine == "sum":
+            y = self._weights @ x
+        else:
+            c = np.multiply(self._weights, x, out=self._contributions)
+            if self.combine == "max":
+                y = c.max(axis=1)
+            else:
+                # Only the row's support takes part; exp(k * (c - 1)) keeps the exponent <= 0
+                e = np.exp(self.sharpness * (c - 1.0)) * self._support
+                total = e.sum(axis=1)
+                y = np.divide((c * e).sum(axis=1), total, out=np.zeros(self.output_count), where=total > 0.0)
+        np.clip(y, 0.0, 1.0, out=y)
+        return y.tolist()
+
+    def _mix_python(self, inputs):
+        out = [0.0] * self.output_count
+        combine = self.combine
+        for output_index, (indices, weights) in enumerate(self.rows):
+            if not indices:
+                continue
+            contributions = [w * min(1.0, max(0.0, inputs[j])) for j, w in zip(indices, weights)]
+            if combine == "max":
+                value = max(contributions)
+            elif combine == "sum":
+                value = sum(contributions)
+            else:
+                exps = [math.exp(self.sharpness * (c - 1.0)) for c in contributions]
+                value = sum(c * e for c, e in zip(contributions, exps)) / sum(exps)
+            out[output_index] = min(1.0, max(0.0, value))
+        return out
+
+
+def load_matrix_file(path):
+    """Reads a {address: {role: weight}} mixing matrix from a JSON file; raises ValueError on a bad shape."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"Mixing matrix {path} must be a JSON object of address -> {{role: weight}}")
+    matrix = {}
+    for address, weights in data.items():
+        if not isinstance(weights, dict) or not weights:
+            raise ValueError(f"Mixing matrix {path}: {address} needs a non-empty {{role: weight}} object")
+        for role, weight in weights.items():
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0.0:
+                raise ValueError(f"Mixing matrix {path}: weight {weight!r} of {address} -> {role} must be a positive number")
+        matrix[address] = {role: float(weight) for role, weight in weights.items()}
+    return matrix
@@ -0,0 +1,122 @@
+"""
+Haptic patterns: named clips compiled into per-tick frames.
+
+A clip is a JSON-style dict:
+
+    {"name": "heartbeat", "loop": false,
+     "tracks": {"Chest": [[0.0, 0.0], [0.05, 1.0], [0.15, 0.0]],
+                "*": {"wave": "sine", "freq_hz": 2.0, "amplitude": 0.5, "offset": 0.5,
+                      "duration_s": 1.0, "delay_s": 0.25}}}
+
+Each track drives one role ("*" = every role without a track of its own) and is either
+a keyframe list [[time_s, intensity], ...] (linear in between, held at the first/last
+value outside the keys) or a waveform dict: wave is "sine", "square", "triangle" or
+"saw", oscillating between offset - amplitude and offset + amplitude for duration_s.
+Either form takes an optional "delay_s" (dict form) before it starts; keyframe times
+are absolute. The clip lasts until its longest track ends.
+
+compile_clip samples every track once, at load, into one row per output tick, so
+playback only indexes a precomputed frame.
+"""
+import json
+import math
+
+WAVEFORMS = {
+    'sine': lambda phase: math.sin(2.0 * math.pi * phase),
+    'square': lambda phase: 1.0 if phase % 1.0 < 0.5 else -1.0,
+    'triangle': lambda phase: 1.0 - 4.0 * abs((phase + 0.25) % 1.0 - 0.5),
+    'saw': lambda phase: 2.0 * (phase % 1.0) - 1.0,
+}
+
+
+class PatternError(ValueError):
+    """Raised when a clip definition cannot be compiled."""
+
+
+class CompiledClip:
+    """A clip sampled at `tick_hz`: frames[tick][role_index] is an intensity, or None where the clip is silent."""
+
+    def __init__(self, name, frames, tick_hz, loop):
+        self.name = name
+        self.frames = frames
+        self.tick_hz = tick_hz
+        self.loop = loop
+
+    @property
+    def duration_s(self):
+        return len(self.frames) / self.tick_hz
+
+
+def _keyframe_track(keys, name):
+    try:
+        keys = sorted((float(t), float(v)) for t, v in keys)
+    except (TypeError, ValueError):
+        raise PatternError(f"Clip {name!r}: keyframes must be [time_s, intensity] pairs") from None
+    if not keys:
+        raise PatternError(f"Clip {name!r}: empty keyframe track")
+
+    def sample(t):
+        if t <= keys[0][0]:
+            return keys[0][1]
+        for (t0, v0), (t1, v1) in zip(keys, keys[1:]):
+            if t <= t1:
+                return v0 if t1 == t0 else v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+        return keys[-1][1]
+    return sample, 0.0, keys[-1][0]
+
+
+def _wave_track(spec, name):
+    wave = WAVEFORMS.get(spec.get('wave'))
+    if wave is None:
+        raise PatternError(f"Clip {name!r}: unknown wave {spec.get('wave')!r} (expected one of {', '.join(WAVEFORMS)})")
+    freq_hz = float(spec.get('freq_hz', 1.0))
+    amplitude = float(spec.get('amplitude', 0.5))
+    offset = float(spec.get('offset', 0.5))
+    phase = float(spec.get('phase', 0.0))
+    duration_s = float(spec.get('duration_s', 1.0))
+    return (lambda t: offset + amplitude * wave(freq_hz * t + phase)), 0.0, duration_s
+
+
+def compile_clip(clip, tick_hz, role_names):
+    """Samples the clip dict at `tick_hz` for `role_names` (index order) into a CompiledClip."""
+    name = clip.get('name')
+    if not name:
+        raise PatternError("Clip without a name")
+    tracks = clip.get('tracks') or {}
+    samplers = {}
+    for role, spec in tracks.items():
+        if role != "*" and role not in role_names:
+            raise PatternError(f"Clip {name!r}: unknown role {role!r}")
+        delay_s = 0.0
+        if isinstance(spec, dict) and 'keyframes' in spec:
+            sample, start, end = _keyframe_track(spec['keyframes'], name)
+            delay_s = float(spec.get('delay_s', 0.0))
+        elif isinstance(spec, dict):
+            sample, start, end = _wave_track(spec, name)
+            delay_s = float(spec.get('delay_s', 0.0))
+        else:
+            sample, start, end = _keyframe_track(spec, name)
+        samplers[role] = (sample, start + delay_s, end + delay_s, delay_s)
+    if not samplers:
+        raise PatternError(f"Clip {name!r} has no tracks")
+
+    ticks = max(1, int(math.ceil(max(end for _, _, end, _ in samplers.values()) * tick_hz)) + 1)
+    per_role = [samplers.get(role, samplers.get("*")) for role in role_names]
+    frames = []
+    for tick in range(ticks):
+        t = tick / tick_hz
+        row = []
+        for sampler in per_role:
+            if sampler is None or t < sampler[1] or t > sampler[2] + 0.5 / tick_hz:
+                row.append(None)
+            else:
+                row.append(min(1.0, max(0.0, sampler[0](t - sampler[3]))))
+        frames.append(row)
+    return CompiledClip(name, frames, tick_hz, bool(clip.get('loop', False)))
+
+
+def load_clip_file(path):
+    """Reads a JSON file holding one clip dict or a list of them."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
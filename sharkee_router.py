@@ -0,0 +1,2666 @@
+"""
+SharkeeHaptics router core: VRChat OSC listener, output scheduler and broadcast sender.
+
+Nothing here imports tkinter. sharkee_gui.py is the desktop front end on top of this
+module; running it directly starts the router headless (Raspberry Pi, mini-PC, service):
+
+    python sharkee_router.py [--engine thread|asyncio] [--output-format message|bundle|binary]
+                             [--transport broadcast|unicast|multicast] [--multicast-group ADDR]
+                             [--multicast-ttl N] [--multicast-interface IP] [--multicast-loopback]
+                             [--sink broadcast|unicast|multicast|file:PATH|serial:PORT[@BAUD] ...]
+                             [--airtime-budget MS_PER_S] [--device-gamma G] [--no-quantize]
+                             [--smoothing-ms MS] [--mixing-combine max|sum|softmax]
+                             [--source NAME:PORT[:MODE[:PRIORITY]] ...] [--clips PATH ...] [--play NAME ...]
+                             [--audio WAV|PIPE|-] [--record PATH] [--metrics-port PORT]
+                             [--stats-interval SECONDS]
+
+Log events and periodic statistics are printed to stdout; SIGTERM or Ctrl+C stops the
+router, sends a stop command to every role and exits.
+"""
+import argparse
+import asyncio
+import bisect
+import errno
+import functools
+import ipaddress
+import signal
+import socket
+import struct
+import time
+import threading
+import queue
+from pythonosc import osc_packet
+try:
+    import serial  # pyserial; only needed for the serial sink
+except ImportError:
+    serial = None
+# CRITICAL FIX: Need osc_message_builder to manually create the packet
+from pythonosc import osc_message_builder 
+
+import sharkee_audio
+import sharkee_conditioning
+import sharkee_frame
+import sharkee_metrics
+import sharkee_mixing
+import sharkee_patterns
+import sharkee_session
+
+# --- Configuration for Maximum Lag Reduction and Stability ---
+
+# VRChat sends OSC signals to this address/port (usually localhost:9001)
+VRC_OSC_LISTEN_IP = "0.0.0.0" 
+VRC_OSC_LISTEN_PORT = 9001 
+
+# The router broadcasts to this IP on the subnet. 255.255.255.255 is the standard local broadcast address.
+BROADCAST_IP = "255.255.255.255" 
+
+# The base OSC message the router broadcasts. The receiver role will be appended.
+INTERNAL_OSC_ADDRESS_BASE = "/sharkeehaptics/set_intensity"
+INTERNAL_OSC_PORT = 8000 
+
+# Aggressive threshold for rate-limiting. (0.03 = 3%)
+INTENSITY_THRESHOLD = 0.03
+
+# Device quantization: the firmware drives the motor with round(intensity ** gamma * 255)
+# (intensityToRealtimeValue) and stops it below MIN_INTENSITY_THRESHOLD. With QUANTIZE_TO_DEVICE
+# the router maps every value to that same uint8 level and detects changes on the level:
+# the role's deadband is moved into level space through the level table, and a send is due
+# when the level leaves the levels that (last sent value -/+ deadband) map to. Two values on
+# one motor step are never both sent, and there are never more sends than the raw detector.
+# DEVICE_GAMMA must match the gamma saved in the devices' EEPROM (ROLE_GAMMA per role,
+# 1.0 for a device with USE_GAMMA_MAPPING off). Overridable with --device-gamma / --no-quantize.
+QUANTIZE_TO_DEVICE = True
+DEVICE_GAMMA = 2.2
+ROLE_GAMMA = {}
+DEVICE_MIN_INTENSITY = 0.05
+
+# Signal conditioning per role, applied once per scheduler tick before change detection
+# (see sharkee_conditioning): smoothing_ms, attack_per_s, release_per_s, gain and curve.
+# ROLE_CONDITIONING maps a role to the keys it overrides; other roles and keys use
+# DEFAULT_CONDITIONING. When every role is left at the identity the stage is skipped.
+# Uses NumPy when installed. --smoothing-ms overrides DEFAULT_CONDITIONING['smoothing_ms'].
+DEFAULT_CONDITIONING = dict(sharkee_conditioning.DEFAULT_CONDITIONING)
+ROLE_CONDITIONING = {}
+
+# Per-role output limits (keys are CLIENT_MAP roles; roles not listed use the defaults).
+# ROLE_DEADBAND: minimum change worth sending (default INTENSITY_THRESHOLD); with
+# QUANTIZE_TO_DEVICE it is converted to device levels.
+# ROLE_MAX_SEND_HZ: cap on change sends per second; a newer value waits until the role may
+# send again, it is not dropped. 0 = limited by OUTPUT_TICK_HZ only.
+ROLE_DEADBAND = {}
+ROLE_MAX_SEND_HZ = {}
+DEFAULT_ROLE_MAX_SEND_HZ = 0
+
+# Adaptive deadband: every deadband is scaled by DEADBAND_SCALE (1.0 up to
+# ADAPTIVE_DEADBAND_MAX_SCALE) to hold the estimated airtime of everything sent at
+# AIRTIME_BUDGET_MS_PER_S (milliseconds of air per second, at the broadcast basic rate).
+# Once per window the scale is multiplied by (airtime / budget) ** ADAPTIVE_DEADBAND_GAIN,
+# using the airtime smoothed over windows, and the change is limited to ADAPTIVE_DEADBAND_STEP
+# either way; the damping keeps it from swinging between the two ends of its range.
+# 0 disables it. Overridable with --airtime-budget.
+AIRTIME_BUDGET_MS_PER_S = 0
+ADAPTIVE_DEADBAND_WINDOW_S = 0.25
+ADAPTIVE_DEADBAND_GAIN = 0.5
+ADAPTIVE_DEADBAND_SMOOTHING = 0.5  # weight of the newest window in the smoothed airtime
+ADAPTIVE_DEADBAND_STEP = 1.5
+ADAPTIVE_DEADBAND_MAX_SCALE = 8.0
+
+# Airtime model for the budget (and the bench): per-datagram overhead on Wi-Fi is IPv4 (20) +
+# UDP (8) + 802.11 MAC header (24) + LLC/SNAP (8) + FCS (4); broadcast frames go out at the
+# lowest basic rate, 1 Mbps DSSS with long preamble (192 us) after DIFS (50 us)
+WIFI_DATAGRAM_OVERHEAD_BYTES = 64
+WIFI_BASIC_RATE_BPS = 1_000_000
+WIFI_FRAME_FIXED_US = 192 + 50
+
+# Router core: "thread" (OscReceiveEngine, blocking socket thread) or "asyncio" (AsyncioRouterEngine,
+# DatagramProtocol endpoints and timers in a dedicated event-loop thread). Overridable with --engine.
+ROUTER_ENGINE = "thread"
+
+# Output transport: "broadcast" (every datagram goes once to BROADCAST_IP and each device
+# filters by role), "unicast" (each datagram goes only to the devices of the roles it
+# carries, at their CLIENT_MAP hostnames resolved in the background) or "multicast" (see
+# below). Overridable with --transport.
+OUTPUT_TRANSPORT = "broadcast"
+# Multicast transport ("multicast"): every datagram goes once to MULTICAST_GROUP, and only
+# devices that joined the group receive it (with IGMP snooping, switches and APs forward it only
+# to them). MULTICAST_GROUP must match the firmware's MULTICAST_GROUP. TTL 1 keeps the stream
+# on the local subnet; MULTICAST_INTERFACE is the IPv4 address of the outgoing interface ("" =
+# OS default route); MULTICAST_LOOPBACK also delivers to listeners on this machine.
+MULTICAST_GROUP = "239.255.72.83"
+MULTICAST_TTL = 1
+MULTICAST_INTERFACE = ""
+MULTICAST_LOOPBACK = False
+# Additional output sinks (--sink, repeatable) next to the OUTPUT_TRANSPORT sink, as specs
+# understood by create_transport(): "broadcast", "unicast", "multicast", "file:PATH" or
+# "serial:PORT[@BAUD]". Every sink has its own bounded queue and thread, so a slow sink
+# (file, serial) drops its own datagrams instead of delaying the Wi-Fi path.
+OUTPUT_SINKS = []
+SINK_QUEUE_MAX_DATAGRAMS = 256
+SERIAL_BAUDRATE = 115200
+SERIAL_WRITE_TIMEOUT_S = 0.1
+# Unicast hostname cache: addresses are reused for RESOLVE_TTL_S; failed lookups are cached
+# for RESOLVE_NEGATIVE_TTL_S so an offline device is not queried over and over
+RESOLVE_TTL_S = 60.0
+RESOLVE_NEGATIVE_TTL_S = 5.0
+
+# Test pulse sent by the "Test All Clients" action; the stop command follows after the duration.
+# While an engine runs, the pulse is the built-in "pulse" clip played by the pattern layer.
+TEST_PULSE_INTENSITY = 1.0
+TEST_PULSE_DURATION_S = 0.2
+
+# Haptic patterns (see sharkee_patterns): clips compiled to OUTPUT_TICK_HZ frames at load and
+# played on the scheduler thread by the "patterns" input layer (max-merged with live input,
+# above every source). PATTERN_CLIPS are built in; --clips PATH loads more from JSON and
+# --play NAME starts a clip when the router starts.
+PATTERN_LAYER_PRIORITY = 100
+PATTERN_CLIP_FILES = []
+PATTERN_AUTOPLAY = []
+
+# Additional input sources, each merged over the VRChat input as an InputLayer. A spec is
+# "NAME:PORT[:MODE[:PRIORITY]]" (e.g. "mod:9101:max:10"): an OSC listener on PORT that accepts
+# the same parameter addresses as VRChat. MODE is "override", "max" or "add" (clamped);
+# layers merge in ascending PRIORITY, so the highest override wins. A source role that is
+# not refreshed for SOURCE_LAYER_TIMEOUT_S stops contributing. Repeatable with --source.
+INPUT_SOURCES = []
+SOURCE_LAYER_TIMEOUT_S = 2.0
+
+# Audio input (see sharkee_audio, needs NumPy): --audio PATH turns a WAV file (played once,
+# in real time) or a raw PCM stream (a FIFO, or "-" for stdin: interleaved int16 at
+# AUDIO_PIPE_SAMPLE_RATE with AUDIO_PIPE_CHANNELS) into per-role intensities on the "audio"
+# input layer, one update per AUDIO_HOP_SAMPLES. Each AUDIO_BANDS entry is
+# (low_hz, high_hz, [roles]); a role follows the strongest of its bands. Band levels map
+# AUDIO_FLOOR_DB..AUDIO_CEILING_DB (dBFS) to 0.0-1.0 with the attack/release envelope.
+AUDIO_INPUT = None
+AUDIO_LAYER_MODE = "max"
+AUDIO_LAYER_PRIORITY = 50
+AUDIO_PIPE_SAMPLE_RATE = 48000
+AUDIO_PIPE_CHANNELS = 2
+AUDIO_HOP_SAMPLES = 512
+AUDIO_ATTACK_MS = 10.0
+AUDIO_RELEASE_MS = 150.0
+AUDIO_FLOOR_DB = -50.0
+AUDIO_CEILING_DB = -10.0
+AUDIO_BANDS = [
+    (20, 120, ["Hips", "UpperLeg_L", "UpperLeg_R", "LowerLeg_L", "LowerLeg_R", "Foot_L", "Foot_R"]),
+    (120, 500, ["Chest"]),
+    (500, 2000, ["UpperArm_L", "UpperArm_R"]),
+    (2000, 8000, ["Head"]),
+]
+
+# Session recording (see sharkee_session): --record PATH appends every datagram received on the
+# VRChat listener and every datagram sent to the sinks, timestamped, to PATH (index in
+# PATH.idx). A background thread writes the files; `python sharkee_session.py replay PATH`
+# feeds a recording back through the router at 1x, Nx or maximum speed.
+SESSION_RECORD_PATH = None
+
+# Metrics endpoint (see sharkee_metrics): --metrics-port PORT serves the router counters,
+# gauges and latency histograms in Prometheus text format at http://METRICS_BIND_IP:PORT/metrics
+# while the router runs (0 = off). The body is rendered once per METRICS_REFRESH_INTERVAL_S on
+# its own thread from the published scheduler stats, so scrapes never touch the hot path.
+METRICS_PORT = 0
+METRICS_BIND_IP = "127.0.0.1"
+METRICS_REFRESH_INTERVAL_S = 1.0
+# Bucket bounds exposed to Prometheus; the in-process histograms are much finer
+METRICS_LATENCY_BUCKETS_S = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                             0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+METRICS_QUEUE_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Output scheduler: the receive path only stores the latest value per role; a fixed-rate
+# tick (60-200 Hz is sensible) emits each role that changed since the previous tick.
+OUTPUT_TICK_HZ = 100
+# The firmware (checkRealtimeTimeout) stops the motor when no packet arrives for
+# REALTIME_TIMEOUT_MS, but a steady contact produces no changes to send. Active roles are
+# re-sent once they have been quiet for KEEPALIVE_INTERVAL_MS; keep it below the timeout.
+DEVICE_REALTIME_TIMEOUT_MS = 500
+KEEPALIVE_INTERVAL_MS = 400
+
+# How often the scheduler publishes its statistics (coalescing, overruns, jitter)
+SCHEDULER_STATS_INTERVAL_S = 1.0
+
+# Output format per scheduler tick:
+#   "message" - one OSC message datagram per role update (what the firmware has always parsed)
+#   "bundle"  - every update of the tick packed into one OSC bundle, sent as one broadcast
+#   "binary"  - every update of the tick in one compact binary frame (see sharkee_frame.py);
+#               the firmware does not decode it yet
+OUTPUT_FORMAT = "message"
+
+# Receive engine: one preallocated buffer (max UDP payload) and a short poll timeout so stop() is prompt
+MAX_OSC_DATAGRAM_SIZE = 65535
+RECEIVE_POLL_TIMEOUT_S = 0.25
+# Kernel receive buffer for the listener; large enough to absorb a full-body contact burst
+RECEIVE_SOCKET_BUFFER_BYTES = 1 << 20
+# How long the asyncio engine's start() waits for its loop thread to open the endpoints and sinks
+ENGINE_STARTUP_TIMEOUT_S = 2.0
+
+# GUI_QUEUE only carries discrete events (log lines) for the front end (GUI window or the
+# headless stdout logger). It is bounded so a front end that falls behind drops events
+# instead of growing a backlog; state is read from ROUTER_SNAPSHOT.
+GUI_QUEUE_MAX_EVENTS = 1000
+
+# Headless mode: how often the event queue is drained to stdout, and the default
+# interval between statistics lines (--stats-interval, 0 disables them)
+HEADLESS_EVENT_POLL_S = 0.1
+HEADLESS_STATS_INTERVAL_S = 10.0
+
+# --- CLIENT MAPPING (Maps VRChat Receiver Name to mDNS Hostname) ---
+# The keys here will be used in the broadcast address (converted to lowercase).
+CLIENT_MAP = {
+    "Head":       "head.local",
+    "Chest":      "chest.local", 
+    "UpperArm_L": "upperarm_l.local",
+    "UpperArm_R": "upperarm_r.local",
+    "Hips":       "hips.local",
+    "UpperLeg_L": "upperleg_l.local",
+    "UpperLeg_R": "upperleg_r.local",
+    "LowerLeg_L": "lowerleg_l.local",
+    "LowerLeg_R": "lowerleg_r.local",
+    "Foot_L":     "foot_l.local",
+    "Foot_R":     "foot_r.local",
+}
+
+# VRChat OSC Addresses (MUST match your avatar's receiver parameters)
+VRC_OSC_MAP = {
+    "/avatar/parameters/Receiver_Head": "Head",
+    "/avatar/parameters/Receiver_Chest": "Chest",
+    "/avatar/parameters/Receiver_UpperArm_L": "UpperArm_L",
+    "/avatar/parameters/Receiver_UpperArm_R": "UpperArm_R",
+    "/avatar/parameters/Receiver_Hips": "Hips",
+    "/avatar/parameters/Receiver_UpperLeg_L": "UpperLeg_L",
+    "/avatar/parameters/Receiver_UpperLeg_R": "UpperLeg_R",
+    "/avatar/parameters/Receiver_LowerLeg_L": "LowerLeg_L",
+    "/avatar/parameters/Receiver_LowerLeg_R": "LowerLeg_R",
+    "/avatar/parameters/Receiver_Foot_L": "Foot_L",
+    "/avatar/parameters/Receiver_Foot_R": "Foot_R",
+}
+
+# Spatial mixing (see sharkee_mixing): contact parameters that drive several roles, e.g.
+# "/avatar/parameters/Receiver_UpperChest": {"Chest": 1.0, "Head": 0.3}. An address listed
+# here replaces its VRC_OSC_MAP one-to-one mapping. When set, every routed address becomes a
+# mixer input and the roles are mixed once per scheduler tick, combining contributions with
+# MIXING_COMBINE ("max", "sum" or "softmax"; overridable with --mixing-combine). --mixing PATH
+# replaces MIXING_MATRIX with a JSON object of the same shape; the routing tables below
+# follow it whenever a scheduler is created (rebuild_mixing_tables).
+MIXING_MATRIX = {}
+MIXING_FILE = None
+MIXING_COMBINE = "max"
+MIXING_SOFTMAX_SHARPNESS = 8.0
+# -------------------------------------
+
+# --- GLOBAL STATE ---
+# Use a custom socket to ensure broadcast is enabled
+BROADCAST_SENDER_SOCKET = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+BROADCAST_SENDER_SOCKET.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+BROADCAST_TARGET = (BROADCAST_IP, INTERNAL_OSC_PORT)
+# Socket of DEFAULT_TRANSPORT. While an engine runs, its sinks send on sockets of their own.
+
+# Global state trackers (shared between threads)
+LAST_INTENSITY = {name: 0.0 for name in CLIENT_MAP.keys()} 
+CLIENT_ONLINE_STATUS = {name: False for name in CLIENT_MAP.keys()} 
+
+# Role order used by the per-role state slots (index = position in CLIENT_MAP)
+ROLE_NAMES = list(CLIENT_MAP.keys())
+ROLE_INDEX = {name: index for index, name in enumerate(ROLE_NAMES)}
+# Role -> bit in the role mask passed to transports (bit i = ROLE_NAMES[i])
+ROLE_MASKS = {name: 1 << index for index, name in enumerate(ROLE_NAMES)}
+
+# Latest-value-wins input slots. The receive thread is the only writer: it stores the
+# value, then bumps the sequence. The output scheduler emits a role only when its
+# sequence moved since the previous tick; intermediate values are coalesced away.
+ROLE_INPUT_VALUES = [0.0] * len(ROLE_NAMES)
+ROLE_INPUT_SEQ = [0] * len(ROLE_NAMES)
+# perf_counter_ns() of the latest input per role, for the receive-to-send latency histogram
+ROLE_INPUT_NS = [0] * len(ROLE_NAMES)
+# perf_counter() of the last packet sent per role (written by the scheduler only)
+ROLE_LAST_SEND_S = [0.0] * len(ROLE_NAMES)
+# perf_counter() of the last change (non-keepalive) send per role, for ROLE_MAX_SEND_HZ
+ROLE_LAST_CHANGE_S = [0.0] * len(ROLE_NAMES)
+# True once a stop command went out for the role; further stops are suppressed until it moves
+ROLE_STOP_SENT = [False] * len(ROLE_NAMES)
+# Per-role change sends, and input updates that did not lead to a send (coalesced, deferred
+# by the rate cap, inside the deadband or a repeated stop)
+ROLE_SENT = [0] * len(ROLE_NAMES)
+ROLE_RECEIVED = [0] * len(ROLE_NAMES)
+ROLE_SUPPRESSED = [0] * len(ROLE_NAMES)
+# Multiplier on every deadband, raised by the adaptive deadband when over the airtime budget
+DEADBAND_SCALE = 1.0
+# Mixer inputs: every routed address (VRC_OSC_MAP plus MIXING_MATRIX), written by the receive
+# thread when MIXING_MATRIX is set; MIX_INPUT_SEQ moves on every update. Filled in place by
+# rebuild_mixing_tables, like ROUTED_ADDRESSES and FAST_PATH_ADDRESSES.
+MIX_INPUT_ADDRESSES = []
+MIX_INPUT_INDEX = {}
+MIX_INPUT_VALUES = []
+MIX_INPUT_SEQ = 0
+MIX_INPUT_NS = 0
+# Routed address -> role reported to handlers and the last-message display (a mixed
+# address reports its most strongly weighted role)
+ROUTED_ADDRESSES = {}
+# Built-in clips: the test pulse, a heartbeat on the chest and a head-to-feet sweep
+PATTERN_CLIPS = [
+    {'name': "pulse",
+     'tracks': {"*": [[0.0, TEST_PULSE_INTENSITY], [TEST_PULSE_DURATION_S, TEST_PULSE_INTENSITY]]}},
+    {'name': "heartbeat",
+     'tracks': {"Chest": [[0.0, 0.0], [0.04, 0.9], [0.12, 0.0], [0.22, 0.0], [0.26, 0.6], [0.36, 0.0], [0.8, 0.0]]}},
+    {'name': "sweep",
+     'tracks': {name: {'keyframes': [[0.0, 0.0], [0.06, 0.8], [0.2, 0.0]], 'delay_s': 0.07 * index}
+                for index, name in enumerate(ROLE_NAMES)}},
+]
+# Per-role level thresholds (see build_level_thresholds) and the device level of the last send
+ROLE_LEVEL_THRESHOLDS = [None] * len(ROLE_NAMES)
+ROLE_LAST_LEVEL = [0] * len(ROLE_NAMES)
+
+# Performance Counters. Other modules must read them as attributes of this module
+# (router.PACKETS_RECEIVED) and reset them with reset_counters(); a from-import copies the value.
+PACKETS_RECEIVED = 0
+PACKETS_ROUTED = 0
+PACKETS_KEEPALIVE = 0
+
+# Thread-safe queues
+GUI_QUEUE = queue.Queue(maxsize=GUI_QUEUE_MAX_EVENTS)  # Discrete events (logs) for the GUI
+GUI_EVENTS_DROPPED = 0
+
+# Hot-path histograms (see sharkee_metrics.py), cumulative until reset_counters():
+#   receive_to_send  input received -> the update handed to the transport (ns), per sent role update
+#   handler          dispatch_datagram: parse + route of one datagram (ns)
+#   send             one transport send in a sink thread, i.e. the sendto/write call (ns)
+#   gui_queue        GUI_QUEUE depth seen by each posted event (events)
+LATENCY_RECEIVE_TO_SEND = sharkee_metrics.Histogram("receive_to_send")
+LATENCY_HANDLER = sharkee_metrics.Histogram("handler")
+LATENCY_SEND = sharkee_metrics.Histogram("send")
+GUI_QUEUE_DEPTH = sharkee_metrics.Histogram("gui_queue")
+ROUTER_HISTOGRAMS = (LATENCY_RECEIVE_TO_SEND, LATENCY_HANDLER, LATENCY_SEND, GUI_QUEUE_DEPTH)
+
+
+class RouterSnapshot:
+    """
+    Fixed-size router state shared with the GUI, replacing per-packet GUI_QUEUE messages.
+
+    Router threads overwrite the slots (value first, then the dirty flag); the GUI renders
+    the latest values once per frame and clears the flags before reading. Memory stays
+    constant and the GUI is never more than one frame behind, whatever the input rate.
+    Counters are read straight from the PACKETS_* globals.
+    """
+
+    def __init__(self):
+        self.role_intensity = [0.0] * len(ROLE_NAMES)
+        self.role_status = ['STOPPED'] * len(ROLE_NAMES)
+        self.role_dirty = [False] * len(ROLE_NAMES)
+        # Track last received OSC message
+        self.last_address = "None"
+        self.last_value = 0.0
+        self.last_message_dirty = False
+        # Replaced as a whole by the scheduler, so readers always see a consistent dict
+        self.scheduler_stats = None
+
+    def set_role(self, index, intensity, status):
+        self.role_intensity[index] = intensity
+        self.role_status[index] = status
+        self.role_dirty[index] = True
+
+    def set_last_message(self, address, value):
+        self.last_address = address
+        self.last_value = value
+        self.last_message_dirty = True
+
+
+ROUTER_SNAPSHOT = RouterSnapshot()
+
+
+def post_gui_event(event):
+    """Queues a discrete GUI event (log line); drops it if the GUI has fallen behind."""
+    global GUI_EVENTS_DROPPED
+    GUI_QUEUE_DEPTH.record(GUI_QUEUE.qsize())
+    try:
+        GUI_QUEUE.put_nowait(event)
+    except queue.Full:
+        GUI_EVENTS_DROPPED += 1
+
+
+def reset_counters():
+    """Zeroes the packet counters (received, routed, keepalive), the per-role received/sent/suppressed counters and the histograms."""
+    global PACKETS_RECEIVED, PACKETS_ROUTED, PACKETS_KEEPALIVE
+    PACKETS_RECEIVED = 0
+    PACKETS_ROUTED = 0
+    PACKETS_KEEPALIVE = 0
+    ROLE_RECEIVED[:] = [0] * len(ROLE_NAMES)
+    ROLE_SENT[:] = [0] * len(ROLE_NAMES)
+    ROLE_SUPPRESSED[:] = [0] * len(ROLE_NAMES)
+    for histogram in ROUTER_HISTOGRAMS:
+        histogram.reset()
+
+
+def reset_role_state():
+    """
+    Forgets the inputs and what was sent per role, so a new scheduler starts from stopped motors.
+
+    Without this a restarted engine would keep re-sending the intensity of the previous run
+    as keepalives (and conditioning would smooth from stale inputs).
+    """
+    for receiver_name in ROLE_NAMES:
+        LAST_INTENSITY[receiver_name] = 0.0
+    count = len(ROLE_NAMES)
+    ROLE_INPUT_VALUES[:] = [0.0] * count
+    MIX_INPUT_VALUES[:] = [0.0] * len(MIX_INPUT_VALUES)
+    ROLE_LAST_SEND_S[:] = [0.0] * count
+    ROLE_LAST_CHANGE_S[:] = [0.0] * count
+    ROLE_STOP_SENT[:] = [False] * count
+    ROLE_LAST_LEVEL[:] = [0] * count
+
+
+def build_level_thresholds(gamma):
+    """
+    Lookup table for the firmware's intensityToRealtimeValue at `gamma`.
+
+    Entry i is the smallest intensity the device drives at level i + 1 or above, so
+    bisect_right(table, intensity) is the level without a pow() per update.
+    """
+    return [((level + 0.5) / 255.0) ** (1.0 / gamma) for level in range(255)]
+
+
+def rebuild_level_thresholds():
+    """Recomputes ROLE_LEVEL_THRESHOLDS after DEVICE_GAMMA or ROLE_GAMMA changed."""
+    tables = {}
+    for index, name in enumerate(ROLE_NAMES):
+        gamma = ROLE_GAMMA.get(name, DEVICE_GAMMA)
+        if gamma not in tables:
+            tables[gamma] = build_level_thresholds(gamma)
+        ROLE_LEVEL_THRESHOLDS[index] = tables[gamma]
+
+
+def intensity_to_device_level(index, intensity):
+    """The uint8 motor level role `index` ends up at for `intensity` (0 = stopped)."""
+    if intensity < DEVICE_MIN_INTENSITY:
+        return 0
+    return bisect.bisect_right(ROLE_LEVEL_THRESHOLDS[index], intensity)
+
+
+rebuild_level_thresholds()
+
+
+def estimate_airtime_us(datagrams, payload_bytes):
+    """Estimated airtime (us) of sending `datagrams` datagrams totalling `payload_bytes` at the basic rate."""
+    on_air_bytes = payload_bytes + datagrams * WIFI_DATAGRAM_OVERHEAD_BYTES
+    return datagrams * WIFI_FRAME_FIXED_US + on_air_bytes * 8 * 1e6 / WIFI_BASIC_RATE_BPS
+
+
+def format_scheduler_stats(stats):
+    """One-line summary of OutputScheduler.stats(), shared by the GUI label and headless output."""
+    line = (f"Scheduler: {stats['tick_hz']} Hz ({stats['output_format']}) | Coalescing: {stats['coalescing_ratio']:.1f}:1 | "
+            f"Overruns: {stats['overruns']} | Jitter: {stats['jitter_mean_ms']:.2f} ms avg, "
+            f"{stats['jitter_max_ms']:.2f} ms max | Airtime: {stats['airtime_ms_per_s']:.0f} ms/s")
+    if stats['airtime_budget_ms_per_s']:
+        line += f" of {stats['airtime_budget_ms_per_s']:.0f} (deadband x{stats['deadband_scale']:.2f})"
+    if stats['mixing']:
+        line += f" | Mixing: {stats['mixing']}"
+    if stats['conditioning']:
+        line += f" | Conditioning: {stats['conditioning']}"
+    return line
+
+
+def format_role_stats(stats):
+    """Per-role "sent/suppressed" summary of OutputScheduler.stats(), skipping idle roles."""
+    parts = [f"{name} {sent}/{suppressed}"
+             for name, sent, suppressed in zip(ROLE_NAMES, stats['role_sent'], stats['role_suppressed'])
+             if sent or suppressed]
+    return "Sent/suppressed: " + (", ".join(parts) or "none")
+
+
+def format_sink_stats(transport_stats):
+    """One-line summary of the active transport's stats (per-sink rate, queue depth and drops)."""
+    parts = []
+    for sink in transport_stats.get('sinks', [transport_stats]):
+        if 'sink' not in sink:
+            parts.append(sink['name'])
+            continue
+        part = f"{sink['sink']}: {sink['rate']:.0f}/s, queue {sink['queue_depth']}, dropped {sink['dropped']}"
+        if sink['errors']:
+            part += f", errors {sink['errors']}"
+        if 'resolved' in sink:
+            part += f", resolved {sink['resolved']}/{sink['roles']} ({sink['unresolved']} unresolved skips)"
+        parts.append(part)
+    return "Sinks: " + (" | ".join(parts) or "none")
+
+
+def format_latency_stats(latency):
+    """"Latency: p50/p95/p99/max" summary of the histogram summaries in OutputScheduler.stats()."""
+    parts = []
+    for name, label, scale, unit in (('receive_to_send', "receive-to-send", 1e6, "ms"), ('handler', "handler", 1e3, "us"),
+                                     ('send', "send", 1e3, "us"), ('gui_queue', "GUI queue", 1, "events")):
+        summary = latency[name]
+        if not summary['count']:
+            parts.append(f"{label} -")
+            continue
+        digits = 2 if scale > 1 else 0
+        values = "/".join(f"{summary[key] / scale:.{digits}f}" for key in ('p50', 'p95', 'p99', 'max'))
+        parts.append(f"{label} {values} {unit}")
+    return "Latency p50/p95/p99/max: " + ", ".join(parts)
+
+
+def collect_router_metrics(engine=None):
+    """
+    Metric families (see sharkee_metrics.render_prometheus) of the router state.
+
+    Sink, jitter and overrun figures come from the last published scheduler stats, so this
+    never calls into the sinks; everything else is a copy of a counter list or a histogram.
+    """
+    def per_role(values):
+        return [("", {'role': name}, value) for name, value in zip(ROLE_NAMES, values)]
+
+    families = [
+        ("sharkee_packets_received_total", "counter", "OSC messages routed to a role or mixer input.",
+         [("", {}, PACKETS_RECEIVED)]),
+        ("sharkee_packets_routed_total", "counter", "Role updates sent (including test pulses and stops).",
+         [("", {}, PACKETS_ROUTED)]),
+        ("sharkee_keepalives_total", "counter", "Keepalive re-sends of active roles.", [("", {}, PACKETS_KEEPALIVE)]),
+        ("sharkee_role_received_total", "counter", "Input updates per role.", per_role(list(ROLE_RECEIVED))),
+        ("sharkee_role_routed_total", "counter", "Updates per role handed to the transport.", per_role(list(ROLE_SENT))),
+        ("sharkee_role_suppressed_total", "counter", "Input updates per role coalesced or below the deadband.",
+         per_role(list(ROLE_SUPPRESSED))),
+        ("sharkee_role_intensity", "gauge", "Intensity last sent per role (0-1).", per_role(list(ROUTER_SNAPSHOT.role_intensity))),
+        ("sharkee_gui_queue_depth", "gauge", "Events waiting in the GUI/stdout event queue.", [("", {}, GUI_QUEUE.qsize())]),
+        ("sharkee_gui_events_dropped_total", "counter", "Events dropped because the event queue was full.",
+         [("", {}, GUI_EVENTS_DROPPED)]),
+    ]
+    if engine is not None:
+        families.append(("sharkee_datagrams_dispatched_total", "counter", "Received datagrams by parse path.",
+                         [("", {'path': "fast"}, engine.fast_path_hits), ("", {'path': "fallback"}, engine.fallbacks)]))
+        families.append(("sharkee_parse_errors_total", "counter", "Received datagrams that did not parse as OSC.",
+                         [("", {}, engine.parse_errors)]))
+
+    stats = ROUTER_SNAPSHOT.scheduler_stats
+    if stats:
+        sinks = [sink for sink in stats['transport'].get('sinks', []) if 'sink' in sink]
+        families += [
+            ("sharkee_scheduler_ticks_total", "counter", "Output scheduler ticks.", [("", {}, stats['ticks'])]),
+            ("sharkee_scheduler_overruns_total", "counter", "Ticks that overran the tick period.", [("", {}, stats['overruns'])]),
+            ("sharkee_scheduler_jitter_seconds", "gauge", "Tick start lateness over the last stats window.",
+             [("", {'stat': "mean"}, stats['jitter_mean_ms'] / 1000.0), ("", {'stat': "max"}, stats['jitter_max_ms'] / 1000.0)]),
+            ("sharkee_airtime_ms_per_second", "gauge", "Estimated output airtime.", [("", {}, stats['airtime_ms_per_s'])]),
+            ("sharkee_sink_sent_total", "counter", "Datagrams sent per sink.",
+             [("", {'sink': sink['sink']}, sink['sent']) for sink in sinks]),
+            ("sharkee_sink_dropped_total", "counter", "Datagrams dropped per sink because its queue was full.",
+             [("", {'sink': sink['sink']}, sink['dropped']) for sink in sinks]),
+            ("sharkee_sink_send_errors_total", "counter", "Failed sends per sink.",
+             [("", {'sink': sink['sink']}, sink['errors']) for sink in sinks]),
+            ("sharkee_sink_queue_depth", "gauge", "Datagrams waiting per sink queue.",
+             [("", {'sink': sink['sink']}, sink['queue_depth']) for sink in sinks]),
+            ("sharkee_role_dropped_total", "counter", "Dropped datagrams carrying each role, per sink.",
+             [("", {'role': name, 'sink': sink['sink']}, dropped)
+              for sink in sinks for name, dropped in zip(ROLE_NAMES, sink['dropped_roles'])]),
+        ]
+
+    for histogram, name, help_text in ((LATENCY_RECEIVE_TO_SEND, "sharkee_receive_to_send_seconds",
+                                        "Input received to the role update handed to the transport."),
+                                       (LATENCY_HANDLER, "sharkee_handler_seconds", "Parse and route time per received datagram."),
+                                       (LATENCY_SEND, "sharkee_send_seconds", "Transport send call time in the sink threads.")):
+        families.append((name, "histogram", help_text,
+                         sharkee_metrics.histogram_samples(histogram, METRICS_LATENCY_BUCKETS_S, 1e-9)))
+    families.append(("sharkee_gui_queue_depth_events", "histogram", "Event queue depth seen by each posted event.",
+                     sharkee_metrics.histogram_samples(GUI_QUEUE_DEPTH, METRICS_QUEUE_BUCKETS)))
+    return families
+
+# --- PRE-ENCODED OSC PACKET TEMPLATES ---
+# A routed packet is always "<padded address><',f' type tag><float32 big-endian>".
+# Only the last 4 bytes change between sends, so the address and type tag are
+# encoded once per role and the float is packed onto the cached prefix.
+OSC_FLOAT_TYPE_TAG = b",f\x00\x00"
+_PACK_FLOAT_BE = struct.Struct(">f").pack
+
+def _osc_pad_string(text):
+    """Encodes an OSC string: UTF-8, NUL-terminated and padded to a 4-byte boundary."""
+    data = text.encode("utf-8")
+    return data + b"\x00" * (4 - len(data) % 4)
+
+def build_osc_float_template(address):
+    """Returns the constant prefix (padded address + ',f' type tag) of a single-float OSC message."""
+    return _osc_pad_string(address) + OSC_FLOAT_TYPE_TAG
+
+def role_osc_address(receiver_name):
+    """Builds the broadcast address for a role using its lowercase name (e.g. ".../head")."""
+    return f"{INTERNAL_OSC_ADDRESS_BASE}/{receiver_name.lower()}"
+
+# Role (CLIENT_MAP key, e.g. "Head") -> broadcast address / pre-encoded packet prefix
+ROLE_OSC_ADDRESSES = {name: role_osc_address(name) for name in CLIENT_MAP.keys()}
+OSC_ROLE_TEMPLATES = {name: build_osc_float_template(address) for name, address in ROLE_OSC_ADDRESSES.items()}
+# Address -> prefix, so callers passing a full role address hit the same templates
+_OSC_ADDRESS_TEMPLATES = {ROLE_OSC_ADDRESSES[name]: template for name, template in OSC_ROLE_TEMPLATES.items()}
+# Other addresses (e.g. VRChat parameters replayed by tools) share a bounded LRU of prefixes
+OSC_TEMPLATE_CACHE_SIZE = 256
+_cached_osc_float_template = functools.lru_cache(maxsize=OSC_TEMPLATE_CACHE_SIZE)(build_osc_float_template)
+
+def encode_osc_float(address, value):
+    """Encodes a single float OSC message from the role templates or the bounded template cache."""
+    template = _OSC_ADDRESS_TEMPLATES.get(address) or _cached_osc_float_template(address)
+    return template + _PACK_FLOAT_BE(value)
+
+def encode_osc_float_with_builder(address, value):
+    """Reference encoder using pythonosc's builder. Kept for benchmarks and verification."""
+    builder = osc_message_builder.OscMessageBuilder(address=address)
+    # The 'f' type tag is added implicitly by adding a float
+    builder.add_arg(value, "f")
+    return builder.build().dgram
+
+def send_role_intensity(receiver_name, value):
+    """Sends the intensity for a role as a single OSC message through the active transport."""
+    ACTIVE_TRANSPORT.send(OSC_ROLE_TEMPLATES[receiver_name] + _PACK_FLOAT_BE(value), ROLE_MASKS[receiver_name])
+
+# --- OUTPUT TRANSPORTS ---
+# A transport delivers a finished datagram. send(datagram, role_mask) gets the mask of the
+# roles the datagram carries so unicast can address only their devices. Transports open
+# their socket/file/port in start() and are driven by one OutputSink thread each.
+
+class BroadcastTransport:
+    """Sends every datagram once to BROADCAST_TARGET; each device picks out its own role."""
+
+    name = "broadcast"
+
+    def __init__(self, sock=None):
+        # A socket passed in is shared (DEFAULT_TRANSPORT) and never closed here
+        self.sock = sock
+        self._owns_sock = sock is None
+
+    def start(self):
+        if self._owns_sock:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def stop(self):
+        if self._owns_sock and self.sock:
+            self.sock.close()
+
+    def send(self, datagram, role_mask):
+        self.sock.sendto(datagram, BROADCAST_TARGET)
+
+    def describe(self):
+        return f"{BROADCAST_IP}:{INTERNAL_OSC_PORT} (broadcast)"
+
+    def stats(self):
+        return {'name': self.name}
+
+
+def resolve_ipv4(hostname):
+    """Default resolver: the first IPv4 address of hostname. Raises OSError if it does not resolve."""
+    return socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_DGRAM)[0][4][0]
+
+
+class HostnameResolver:
+    """
+    Background TTL cache turning each role's hostname into a (ip, port) send target.
+
+    A daemon thread re-resolves hostnames as their entries expire; the send path only
+    reads `targets` (one slot per role, None while unresolved) and never waits on a
+    lookup. Successful lookups are cached for ttl_s, failures for negative_ttl_s.
+    `resolve` (hostname -> IPv4 string, raising OSError on failure) can be replaced by
+    a stub. Lookups run one after another, so a slow mDNS timeout delays the rest.
+    """
+
+    def __init__(self, hostnames=None, port=None, resolve=None, ttl_s=None, negative_ttl_s=None):
+        # Role -> hostname, CLIENT_MAP layout
+        self.hostnames = dict(hostnames or CLIENT_MAP)
+        self.port = port or INTERNAL_OSC_PORT
+        self.resolve = resolve or resolve_ipv4
+        self.ttl_s = RESOLVE_TTL_S if ttl_s is None else ttl_s
+        self.negative_ttl_s = RESOLVE_NEGATIVE_TTL_S if negative_ttl_s is None else negative_ttl_s
+        self.targets = [None] * len(ROLE_NAMES)
+        # hostname -> (ip or None, monotonic expiry)
+        self.cache = {}
+        self.lookups = 0
+        self.failures = 0
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        """Resolves every expired hostname and updates the role targets. Returns seconds until the next expiry."""
+        for hostname in sorted(set(self.hostnames.values())):
+            entry = self.cache.get(hostname)
+            if entry and entry[1] > time.monotonic():
+                continue
+            self.lookups += 1
+            try:
+                ip = self.resolve(hostname)
+                expires = time.monotonic() + self.ttl_s
+            except (OSError, UnicodeError) as e:
+                ip = None
+                expires = time.monotonic() + self.negative_ttl_s
+                self.failures += 1
+                if entry is None or entry[0] is not None:
+                    post_gui_event({'type': 'LOG', 'message': f"Could not resolve {hostname}: {e}", 'level': 'WARN'})
+            self.cache[hostname] = (ip, expires)
+            if ip and (entry is None or entry[0] != ip):
+                post_gui_event({'type': 'LOG', 'message': f"Resolved {hostname} -> {ip}", 'level': 'INFO'})
+            target = (ip, self.port) if ip else None
+            for receiver_name, role_hostname in self.hostnames.items():
+                if role_hostname == hostname and receiver_name in ROLE_INDEX:
+                    self.targets[ROLE_INDEX[receiver_name]] = target
+        if not self.cache:
+            return self.ttl_s
+        return max(0.0, min(expires for _, expires in self.cache.values()) - time.monotonic())
+
+    def start(self):
+        """Starts the resolver thread; the first lookups begin immediately."""
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="HostnameResolver", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            # Floor keeps a zero TTL from spinning
+            self._stop_event.wait(max(self.refresh(), 0.1))
+
+    def stop(self):
+        """Stops the resolver thread (a lookup in progress is abandoned). Safe to call twice."""
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+
+    def resolved_count(self):
+        return sum(1 for target in self.targets if target)
+
+
+class UnicastTransport:
+    """
+    Sends each datagram only to the devices of the roles in its role mask.
+
+    Targets come from a HostnameResolver; a role that is not resolved (yet, or its
+    device is offline) is skipped and counted in `unresolved`. A multi-role datagram
+    (bundle, binary frame) goes once to every distinct target it carries a role for.
+    """
+
+    name = "unicast"
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or HostnameResolver()
+        self.unresolved = 0
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.resolver.start()
+
+    def stop(self):
+        self.resolver.stop()
+        if self.sock:
+            self.sock.close()
+
+    def send(self, datagram, role_mask):
+        targets = self.resolver.targets
+        sendto = self.sock.sendto
+        if not role_mask & (role_mask - 1):
+            # Single role (message output, keepalives, test pulses)
+            target = targets[role_mask.bit_length() - 1]
+            if target is None:
+                self.unresolved += 1
+                return
+            sendto(datagram, target)
+            return
+        sent = []
+        index = 0
+        while role_mask:
+            if role_mask & 1:
+                target = targets[index]
+                if target is None:
+                    self.unresolved += 1
+                elif target not in sent:
+                    sendto(datagram, target)
+                    sent.append(target)
+            role_mask >>= 1
+            index += 1
+
+    def describe(self):
+        return f"CLIENT_MAP hostnames port {self.resolver.port} (unicast)"
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'resolved': self.resolver.resolved_count(),
+            'roles': len(self.resolver.targets),
+            'unresolved': self.unresolved,
+            'lookups': self.resolver.lookups,
+            'lookup_failures': self.resolver.failures,
+        }
+
+
+def open_multicast_sender(ttl, interface="", loopback=False):
+    """Returns a UDP socket configured for sending to IPv4 multicast groups."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if loopback else 0)
+        if interface:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class MulticastTransport:
+    """
+    Sends every datagram once to an IPv4 multicast group; subscribed devices pick out their role.
+
+    TTL, outgoing interface and loopback are per-socket options, so the transport opens its
+    own sender socket in start() (option errors surface there) and sends on it directly.
+    """
+
+    name = "multicast"
+
+    def __init__(self, group=None, port=None, ttl=None, interface=None, loopback=None):
+        self.group = group or MULTICAST_GROUP
+        if not ipaddress.IPv4Address(self.group).is_multicast:
+            raise ValueError(f"{self.group} is not an IPv4 multicast address (224.0.0.0/4)")
+        self.port = port or INTERNAL_OSC_PORT
+        self.ttl = MULTICAST_TTL if ttl is None else ttl
+        self.interface = MULTICAST_INTERFACE if interface is None else interface
+        self.loopback = MULTICAST_LOOPBACK if loopback is None else loopback
+        self.target = (self.group, self.port)
+        self.sock = None
+
+    def start(self):
+        self.sock = open_multicast_sender(self.ttl, self.interface, self.loopback)
+
+    def stop(self):
+        if self.sock:
+            self.sock.close()
+
+    def send(self, datagram, role_mask):
+        self.sock.sendto(datagram, self.target)
+
+    def describe(self):
+        via = f" via {self.interface}" if self.interface else ""
+        return f"{self.group}:{self.port} (multicast, TTL {self.ttl}{via})"
+
+    def stats(self):
+        return {'name': self.name}
+
+
+# Record layout of the file sink: wall-clock time (ns), role mask, datagram length, then the datagram
+RECORDING_MAGIC = b"SHKREC01"
+RECORD_HEADER = struct.Struct(">QII")
+
+
+class FileTransport:
+    """Recording sink: appends every datagram to a file with a timestamp and its role mask."""
+
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def start(self):
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(RECORDING_MAGIC)
+
+    def stop(self):
+        if self.file:
+            self.file.close()
+
+    def send(self, datagram, role_mask):
+        self.file.write(RECORD_HEADER.pack(time.time_ns(), role_mask, len(datagram)))
+        self.file.write(datagram)
+
+    def describe(self):
+        return f"{self.path} (file)"
+
+    def stats(self):
+        return {'name': self.name}
+
+
+def slip_encode(datagram):
+    """Frames a datagram with SLIP (RFC 1055), the OSC 1.1 framing for serial links."""
+    return b"\xc0" + bytes(datagram).replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc") + b"\xc0"
+
+
+class SerialTransport:
+    """Writes every datagram SLIP-framed to a serial port (wired node or USB bridge). Needs pyserial."""
+
+    name = "serial"
+
+    def __init__(self, port, baudrate=None):
+        self.port = port
+        self.baudrate = baudrate or SERIAL_BAUDRATE
+        self.serial = None
+
+    def start(self):
+        if serial is None:
+            raise RuntimeError("The serial sink needs pyserial (pip install pyserial)")
+        self.serial = serial.Serial(self.port, self.baudrate, write_timeout=SERIAL_WRITE_TIMEOUT_S)
+
+    def stop(self):
+        if self.serial:
+            self.serial.close()
+
+    def send(self, datagram, role_mask):
+        self.serial.write(slip_encode(datagram))
+
+    def describe(self):
+        return f"{self.port} @ {self.baudrate} baud (serial)"
+
+    def stats(self):
+        return {'name': self.name}
+
+
+# OUTPUT_TRANSPORT / --transport name -> transport class (the network transports)
+OUTPUT_TRANSPORTS = {
+    BroadcastTransport.name: BroadcastTransport,
+    UnicastTransport.name: UnicastTransport,
+    MulticastTransport.name: MulticastTransport,
+}
+
+
+def create_transport(spec):
+    """Builds a transport from a sink spec: a OUTPUT_TRANSPORTS name, "file:PATH" or "serial:PORT[@BAUD]"."""
+    kind, _, argument = spec.partition(":")
+    if kind in OUTPUT_TRANSPORTS and not argument:
+        return OUTPUT_TRANSPORTS[kind]()
+    if kind == FileTransport.name and argument:
+        return FileTransport(argument)
+    if kind == SerialTransport.name and argument:
+        port, _, baudrate = argument.partition("@")
+        return SerialTransport(port, int(baudrate) if baudrate else None)
+    raise ValueError(f"Unknown sink {spec!r} (expected {', '.join(sorted(OUTPUT_TRANSPORTS))}, file:PATH or serial:PORT[@BAUD])")
+
+
+class OutputSink:
+    """
+    One transport behind a bounded queue, sent from its own thread.
+
+    offer() never blocks: when the queue is full the datagram is dropped and counted, so a
+    stalled sink only loses its own traffic. stats() reports the send rate since the
+    previous call, drops, errors and the current queue depth.
+    """
+
+    def __init__(self, name, transport, max_queue=None):
+        self.name = name
+        self.transport = transport
+        self.queue = queue.Queue(maxsize=max_queue or SINK_QUEUE_MAX_DATAGRAMS)
+        self.sent = 0
+        self.dropped = 0
+        # Dropped datagrams per role they carried
+        self.dropped_roles = [0] * len(ROLE_NAMES)
+        self.errors = 0
+        self.thread = None
+        self._last_error = None
+        self._rate_sent = 0
+        self._rate_since = time.perf_counter()
+
+    def start(self):
+        """Opens the transport and starts the sender thread."""
+        self.transport.start()
+        self.thread = threading.Thread(target=self._run, name=f"OutputSink[{self.name}]", daemon=True)
+        self.thread.start()
+
+    def offer(self, datagram, role_mask):
+        try:
+            self.queue.put_nowait((datagram, role_mask))
+        except queue.Full:
+            self.dropped += 1
+            for index in range(len(ROLE_NAMES)):
+                if role_mask >> index & 1:
+                    self.dropped_roles[index] += 1
+
+    def _run(self):
+        get = self.queue.get
+        send = self.transport.send
+        clock = time.perf_counter_ns
+        record = LATENCY_SEND.record
+        while True:
+            item = get()
+            if item is None:
+                break
+            try:
+                started = clock()
+                send(*item)
+                record(clock() - started)
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                # Log each distinct failure once instead of once per datagram
+                if str(e) != self._last_error:
+                    self._last_error = str(e)
+                    post_gui_event({'type': 'LOG', 'message': f"Send failed to {self.transport.describe()}: {e}", 'level': 'ERROR'})
+
+    def stop(self):
+        """Sends what is already queued, stops the thread and closes the transport. Safe to call twice."""
+        if self.thread and self.thread.is_alive():
+            # The sentinel may wait for room; a stalled sink is abandoned after the join timeout
+            try:
+                self.queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self.thread.join(timeout=1)
+        self.transport.stop()
+
+    def stats(self):
+        now = time.perf_counter()
+        elapsed = now - self._rate_since
+        sent = self.sent
+        rate = (sent - self._rate_sent) / elapsed if elapsed > 0 else 0.0
+        self._rate_sent = sent
+        self._rate_since = now
+        stats = dict(self.transport.stats())
+        stats.update({'sink': self.name, 'sent': sent, 'rate': rate, 'dropped': self.dropped,
+                      'dropped_roles': list(self.dropped_roles), 'errors': self.errors, 'queue_depth': self.queue.qsize()})
+        return stats
+
+
+class OutputFanout:
+    """
+    The set of sinks an engine sends to; installed as ACTIVE_TRANSPORT while the engine runs.
+
+    send() copies the datagram once (outputs reuse their buffers) and offers it to every
+    sink. Sinks can be attached and detached while running: the sink tuple is replaced
+    as a whole, so send() never sees a half-updated set.
+    """
+
+    name = "fanout"
+
+    def __init__(self, sinks=()):
+        self.sinks = tuple(sinks)
+        self.running = False
+        # SessionRecorder of the engine, if recording: sees every datagram before the sinks
+        self.recorder = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        started = []
+        try:
+            for sink in self.sinks:
+                sink.start()
+                started.append(sink)
+        except Exception:
+            for sink in started:
+                sink.stop()
+            raise
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        for sink in self.sinks:
+            sink.stop()
+
+    def send(self, datagram, role_mask):
+        datagram = bytes(datagram)
+        if self.recorder:
+            self.recorder.record(sharkee_session.DIRECTION_OUT, datagram)
+        for sink in self.sinks:
+            sink.offer(datagram, role_mask)
+
+    def attach(self, sink):
+        """Adds a sink (started first if the fanout is running). Sink names must be unique."""
+        with self._lock:
+            if any(existing.name == sink.name for existing in self.sinks):
+                raise ValueError(f"A sink named {sink.name!r} is already attached")
+            if self.running:
+                sink.start()
+            self.sinks = self.sinks + (sink,)
+        post_gui_event({'type': 'LOG', 'message': f"Output sink attached: {sink.transport.describe()}", 'level': 'INFO'})
+        return sink
+
+    def detach(self, name):
+        """Removes the sink called `name`, flushes and stops it. Returns the sink."""
+        with self._lock:
+            sink = next((existing for existing in self.sinks if existing.name == name), None)
+            if sink is None:
+                raise KeyError(name)
+            self.sinks = tuple(existing for existing in self.sinks if existing is not sink)
+        sink.stop()
+        post_gui_event({'type': 'LOG', 'message': f"Output sink detached: {sink.transport.describe()}", 'level': 'INFO'})
+        return sink
+
+    def describe(self):
+        return ", ".join(sink.transport.describe() for sink in self.sinks) or "no sinks"
+
+    def stats(self):
+        return {'name': self.name, 'sinks': [sink.stats() for sink in self.sinks]}
+
+
+def create_output_fanout():
+    """Builds the engine fan-out: the OUTPUT_TRANSPORT sink plus every OUTPUT_SINKS spec."""
+    specs = [OUTPUT_TRANSPORT] + [spec for spec in OUTPUT_SINKS if spec != OUTPUT_TRANSPORT]
+    return OutputFanout(OutputSink(spec, create_transport(spec)) for spec in specs)
+
+
+# Transport used by the outputs and send_role_intensity. Engines install their OutputFanout
+# while running and put this default (inline broadcast on the shared socket) back when they stop.
+DEFAULT_TRANSPORT = BroadcastTransport(BROADCAST_SENDER_SOCKET)
+ACTIVE_TRANSPORT = DEFAULT_TRANSPORT
+
+# OSC bundle header: "#bundle" + timetag 1 ("immediately")
+OSC_BUNDLE_HEADER = b"#bundle\x00" + struct.pack(">Q", 1)
+_PACK_INTO_INT_BE = struct.Struct(">i").pack_into
+_PACK_INTO_FLOAT_BE = struct.Struct(">f").pack_into
+
+class MessageOutput:
+    """Scheduler output that sends one OSC message datagram per role update."""
+
+    name = "message"
+
+    def __init__(self):
+        self.datagrams = 0
+        self.bytes = 0
+
+    def add(self, receiver_name, value):
+        datagram = OSC_ROLE_TEMPLATES[receiver_name] + _PACK_FLOAT_BE(value)
+        ACTIVE_TRANSPORT.send(datagram, ROLE_MASKS[receiver_name])
+        self.datagrams += 1
+        self.bytes += len(datagram)
+
+    def flush(self):
+        pass
+
+
+class BundleOutput:
+    """
+    Scheduler output that packs every role update of a tick into one OSC bundle.
+
+    The bundle is assembled in a preallocated buffer sized for all roles: the header is
+    written once, and each element is its size prefix, the role's pre-encoded template
+    and the patched float. flush() sends the bundle as a single datagram.
+    """
+
+    name = "bundle"
+
+    def __init__(self):
+        capacity = len(OSC_BUNDLE_HEADER) + sum(4 + len(template) + 4 for template in OSC_ROLE_TEMPLATES.values())
+        self._buffer = bytearray(capacity)
+        self._buffer[:len(OSC_BUNDLE_HEADER)] = OSC_BUNDLE_HEADER
+        self._view = memoryview(self._buffer)
+        self._offset = len(OSC_BUNDLE_HEADER)
+        self.count = 0
+        self._mask = 0
+        self.datagrams = 0
+        self.bytes = 0
+
+    def add(self, receiver_name, value):
+        template = OSC_ROLE_TEMPLATES[receiver_name]
+        size = len(template) + 4
+        if self._offset + 4 + size > len(self._buffer):
+            self.flush()  # only reachable if a role is added twice in one tick
+        offset = self._offset
+        _PACK_INTO_INT_BE(self._buffer, offset, size)
+        self._buffer[offset + 4:offset + 4 + len(template)] = template
+        _PACK_INTO_FLOAT_BE(self._buffer, offset + 4 + len(template), value)
+        self._offset = offset + 4 + size
+        self.count += 1
+        self._mask |= ROLE_MASKS[receiver_name]
+
+    def datagram(self):
+        """The bundle packed so far (a view into the preallocated buffer)."""
+        return self._view[:self._offset]
+
+    def flush(self):
+        if not self.count:
+            return
+        size = self._offset
+        mask = self._mask
+        self._offset = len(OSC_BUNDLE_HEADER)
+        self.count = 0
+        self._mask = 0
+        ACTIVE_TRANSPORT.send(self._view[:size], mask)
+        self.datagrams += 1
+        self.bytes += size
+
+
+class BinaryFrameOutput:
+    """
+    Scheduler output that sends every role update of a tick as one binary frame.
+
+    Levels and the role mask accumulate per tick; flush() packs them into a preallocated
+    buffer with the next sequence number and sends the frame.
+    """
+
+    name = "binary"
+
+    def __init__(self):
+        self._levels = bytearray(len(ROLE_NAMES))
+        self._mask = 0
+        self._buffer = bytearray(sharkee_frame.FRAME_MAX_SIZE)
+        self._view = memoryview(self._buffer)
+        self.sequence = 0
+        self.datagrams = 0
+        self.bytes = 0
+
+    def add(self, receiver_name, value):
+        index = ROLE_INDEX[receiver_name]
+        self._levels[index] = sharkee_frame.intensity_to_level(value)
+        self._mask |= 1 << index
+
+    def flush(self):
+        if not self._mask:
+            return
+        mask = self._mask
+        size = sharkee_frame.pack_frame_into(self._buffer, self.sequence, mask, self._levels)
+        self._mask = 0
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        ACTIVE_TRANSPORT.send(self._view[:size], mask)
+        self.datagrams += 1
+        self.bytes += size
+
+
+# OUTPUT_FORMAT / --output-format name -> scheduler output class
+OUTPUT_FORMATS = {
+    MessageOutput.name: MessageOutput,
+    BundleOutput.name: BundleOutput,
+    BinaryFrameOutput.name: BinaryFrameOutput,
+}
+
+def sharkeehaptics_router_handler(address, *args):
+    """
+    NON-BLOCKING OSC Handler. Reads VRChat packets, applies rate-limit, 
+    and broadcasts the message to all clients.
+    """
+    
+    # receiver_name is in Title-Case (e.g., "Head")
+    receiver_name = ROUTED_ADDRESSES.get(address)
+    if not receiver_name:
+        return
+    
+    route_intensity(receiver_name, address, float(args[0]))
+
+
+def route_intensity(receiver_name, address, current_intensity):
+    """
+    Receive side of routing, shared by the pythonosc handler and the byte-level fast path.
+
+    Only records the value in the role's state slot (or, with MIXING_MATRIX, the address's
+    mixer input); the OutputScheduler decides on its next tick whether (and what) to broadcast.
+    """
+    global PACKETS_RECEIVED, MIX_INPUT_SEQ, MIX_INPUT_NS
+    PACKETS_RECEIVED += 1
+    index = ROLE_INDEX[receiver_name]
+    ROLE_RECEIVED[index] += 1
+
+    ROUTER_SNAPSHOT.set_last_message(address, current_intensity)
+
+    if MIXING_MATRIX:
+        MIX_INPUT_VALUES[MIX_INPUT_INDEX[address]] = current_intensity
+        MIX_INPUT_NS = time.perf_counter_ns()
+        MIX_INPUT_SEQ += 1
+        return
+    ROLE_INPUT_VALUES[index] = current_intensity
+    ROLE_INPUT_NS[index] = time.perf_counter_ns()
+    ROLE_INPUT_SEQ[index] += 1
+
+
+def emit_role_intensity(receiver_name, current_intensity, send=send_role_intensity):
+    """
+    Send side of routing, called by the OutputScheduler with a role's latest value.
+
+    Applies the role's deadband (ROLE_DEADBAND scaled by DEADBAND_SCALE, compared in device
+    levels with QUANTIZE_TO_DEVICE) and stop dedup, and hands the value to `send` (the scheduler's output).
+    The per-role rate cap is applied by the scheduler before this is called. Returns True if the value was sent.
+    """
+    global PACKETS_ROUTED
+
+    # CRITICAL CHANGE: The broadcast address uses the lowercase receiver name (precomputed)
+    full_osc_address = ROLE_OSC_ADDRESSES[receiver_name]
+    index = ROLE_INDEX[receiver_name]
+    
+    # 1. Check for Rate Limiting / Debouncing (LAG REDUCTION)
+    last_val = LAST_INTENSITY.get(receiver_name, 0.0)
+
+    # Send if: It's the first stop command since the role moved OR Intensity changed significantly.
+    # A stop is sent once: repeats near zero only cost airtime, and the firmware's realtime
+    # timeout stops the motor anyway if that one packet is lost.
+    if QUANTIZE_TO_DEVICE:
+        level = intensity_to_device_level(index, current_intensity)
+        is_stop = level == 0
+    else:
+        level = 0
+        is_stop = current_intensity < INTENSITY_THRESHOLD/2
+    if is_stop:
+        should_send = not ROLE_STOP_SENT[index]
+    else:
+        deadband = ROLE_DEADBAND.get(receiver_name, INTENSITY_THRESHOLD) * DEADBAND_SCALE
+        if not QUANTIZE_TO_DEVICE:
+            should_send = abs(current_intensity - last_val) > deadband
+        elif level > ROLE_LAST_LEVEL[index]:
+            # Past the level of the deadband's edge: implies the raw change exceeds it too
+            should_send = level > intensity_to_device_level(index, last_val + deadband)
+        else:
+            should_send = level < intensity_to_device_level(index, last_val - deadband)
+    if not should_send:
+        return False
+    
+    # 2. Handle Routing (Broadcast)
+    try:
+        # Only the float is packed per send; the address/type tag come from the template cache
+        send(receiver_name, current_intensity)
+    except Exception as e:
+        # Log only if sending fails entirely (e.g., firewall blocked)
+        log_msg = f"Send failed to {ACTIVE_TRANSPORT.describe()}: {e}"
+        post_gui_event({'type': 'LOG', 'message': log_msg, 'level': 'ERROR'})
+        return False
+
+    LAST_INTENSITY[receiver_name] = current_intensity
+    ROLE_LAST_SEND_S[index] = ROLE_LAST_CHANGE_S[index] = time.perf_counter()
+    ROLE_STOP_SENT[index] = is_stop
+    ROLE_LAST_LEVEL[index] = level
+    PACKETS_ROUTED += 1
+
+    # Log discrete events only: a role becoming active, not every routed packet
+    if current_intensity > 0.05 and last_val <= 0.05:
+        log_msg = f"[{ACTIVE_TRANSPORT.name.upper()}] {receiver_name}: {current_intensity:.2f} -> {ACTIVE_TRANSPORT.describe()} ({full_osc_address})"
+        post_gui_event({'type': 'LOG', 'message': log_msg, 'level': 'INFO'})
+        
+    # Update GUI status (assuming it is broadcasting)
+    ROUTER_SNAPSHOT.set_role(index, current_intensity, 'BROADCASTING')
+    return True
+
+
+def send_keepalives(now, interval_s, send=send_role_intensity):
+    """
+    Re-sends the current intensity of every active role that has not been sent for interval_s.
+
+    Roles that already had a recent send (change or earlier keepalive) are skipped, so a
+    steadily held contact costs one packet per interval; stopped roles are never refreshed.
+    Returns the number of keepalives sent.
+    """
+    global PACKETS_KEEPALIVE
+    sent = 0
+    for index, receiver_name in enumerate(ROLE_NAMES):
+        intensity = LAST_INTENSITY[receiver_name]
+        if ROLE_STOP_SENT[index] or intensity <= 0.0 or now - ROLE_LAST_SEND_S[index] < interval_s:
+            continue
+        try:
+            send(receiver_name, intensity)
+        except Exception as e:
+            post_gui_event({'type': 'LOG', 'message': f"Keepalive send failed for {receiver_name}: {e}", 'level': 'ERROR'})
+            continue
+        ROLE_LAST_SEND_S[index] = now
+        PACKETS_KEEPALIVE += 1
+        sent += 1
+    return sent
+
+
+class InputLayer:
+    """
+    Per-role intensities from one input source, merged over the VRChat input every scheduler tick.
+
+    `mode` decides how an active role combines with the layers below it: "override"
+    replaces the value, "max" keeps the stronger one, "add" adds and clamps to 1.0.
+    Layers merge in ascending `priority`. A role contributes from set() until release();
+    with `timeout_s` it also stops contributing when not set for that long. set/release
+    may be called from any thread; the scheduler only reads.
+    """
+
+    MODES = ("override", "max", "add")
+
+    def __init__(self, name, mode="max", priority=0, timeout_s=0.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown layer mode {mode!r} (expected one of {', '.join(self.MODES)})")
+        self.name = name
+        self.mode = mode
+        self.priority = priority
+        self.timeout_s = timeout_s
+        self.values = [0.0] * len(ROLE_NAMES)
+        self.active = [False] * len(ROLE_NAMES)
+        self.updated_s = [0.0] * len(ROLE_NAMES)
+        self.updates = 0
+        # Roles whose merged value this layer changed at the last merge
+        self.driving = 0
+
+    def set(self, receiver_name, value):
+        index = ROLE_INDEX[receiver_name]
+        self.values[index] = value
+        self.updated_s[index] = time.perf_counter()
+        self.active[index] = True
+        self.updates += 1
+
+    def release(self, receiver_name):
+        self.active[ROLE_INDEX[receiver_name]] = False
+        self.updates += 1
+
+    def release_all(self):
+        self.active[:] = [False] * len(ROLE_NAMES)
+        self.updates += 1
+
+    def advance(self, now):
+        """Called by the scheduler every tick before merging; layers driven by the tick override it."""
+
+    def stats(self):
+        return {'name': self.name, 'mode': self.mode, 'priority': self.priority, 'updates': self.updates,
+                'active': sum(self.active), 'driving': self.driving}
+
+
+class PatternPlayer(InputLayer):
+    """
+    Input layer playing compiled clips (sharkee_patterns) frame by frame on the scheduler thread.
+
+    Any number of clips play at once; per role the strongest playing frame wins. A clip
+    starts on the first tick after play() and then shows the frame for the ticks elapsed
+    since, so timing follows the tick grid and an overrun skips frames instead of stretching
+    the clip. play()/stop()/load() may be called from any thread.
+    """
+
+    def __init__(self, name="patterns", mode="max", priority=PATTERN_LAYER_PRIORITY, tick_hz=None):
+        super().__init__(name, mode, priority)
+        self.tick_hz = tick_hz or OUTPUT_TICK_HZ
+        self.clips = {}
+        # (clip, receiver index list or None, start time filled in by the first tick)
+        self.playing = ()
+        self.played = 0
+        self._lock = threading.Lock()
+
+    def load(self, clips):
+        """Compiles clip dicts (replacing clips of the same name). Returns their names."""
+        compiled = [sharkee_patterns.compile_clip(clip, self.tick_hz, ROLE_NAMES) for clip in clips]
+        for clip in compiled:
+            self.clips[clip.name] = clip
+        return [clip.name for clip in compiled]
+
+    def play(self, name, receivers=None):
+        """Starts clip `name` on `receivers` (default: every role the clip drives)."""
+        clip = self.clips.get(name)
+        if clip is None:
+            raise KeyError(f"Unknown pattern {name!r}")
+        indices = [ROLE_INDEX[receiver] for receiver in receivers] if receivers else None
+        with self._lock:
+            self.playing += ([clip, indices, None],)
+        self.played += 1
+
+    def stop(self, name=None):
+        """Stops every playing instance of clip `name` (default: all clips)."""
+        with self._lock:
+            self.playing = tuple(entry for entry in self.playing if name is not None and entry[0].name != name)
+
+    def advance(self, now):
+        playing = self.playing
+        if not playing:
+            if any(self.active):
+                self.release_all()
+            return
+        size = len(ROLE_NAMES)
+        row = [None] * size
+        finished = []
+        for entry in playing:
+            clip, indices, start = entry
+            if start is None:
+                entry[2] = start = now
+            frames = clip.frames
+            tick = int((now - start) * clip.tick_hz + 0.5)
+            if tick >= len(frames):
+                if not clip.loop:
+                    finished.append(entry)
+                    continue
+                tick %= len(frames)
+            frame = frames[tick]
+            for index in (indices or range(size)):
+                value = frame[index]
+                if value is not None and (row[index] is None or value > row[index]):
+                    row[index] = value
+        for index, value in enumerate(row):
+            if value is None:
+                self.active[index] = False
+            else:
+                self.values[index] = value
+                self.active[index] = True
+        self.updates += 1
+        if finished:
+            with self._lock:
+                self.playing = tuple(entry for entry in self.playing if entry not in finished)
+
+    def stats(self):
+        stats = super().stats()
+        stats['playing'] = len(self.playing)
+        return stats
+
+
+# Input layers of the running engine, in merge order. Replaced (never mutated) under the
+# lock, so the scheduler iterates a consistent tuple without locking.
+INPUT_LAYERS = ()
+_INPUT_LAYERS_LOCK = threading.Lock()
+PATTERN_PLAYER = PatternPlayer()
+PATTERN_PLAYER.load(PATTERN_CLIPS)
+
+
+def load_pattern_files(paths):
+    """Loads every clip in the JSON files at `paths` into PATTERN_PLAYER. Returns the clip names."""
+    names = []
+    for path in paths:
+        names += PATTERN_PLAYER.load(sharkee_patterns.load_clip_file(path))
+    return names
+
+
+def add_input_layer(layer):
+    global INPUT_LAYERS
+    with _INPUT_LAYERS_LOCK:
+        INPUT_LAYERS = tuple(sorted(INPUT_LAYERS + (layer,), key=lambda l: l.priority))
+
+
+def remove_input_layer(layer):
+    global INPUT_LAYERS
+    with _INPUT_LAYERS_LOCK:
+        INPUT_LAYERS = tuple(l for l in INPUT_LAYERS if l is not layer)
+
+
+def merge_input_layers(base, layers, now):
+    """Merges `layers` (in order) over the per-role `base` values. Returns the merged list."""
+    merged = list(base)
+    for layer in layers:
+        mode = layer.mode
+        timeout_s = layer.timeout_s
+        values = layer.values
+        updated_s = layer.updated_s
+        driving = 0
+        for index, active in enumerate(layer.active):
+            if not active or (timeout_s and now - updated_s[index] > timeout_s):
+                continue
+            before = merged[index]
+            if mode == "override":
+                after = values[index]
+            elif mode == "max":
+                after = max(before, values[index])
+            else:
+                after = min(1.0, before + values[index])
+            if after != before:
+                driving += 1
+            merged[index] = after
+        layer.driving = driving
+    return merged
+
+
+def format_layer_stats(layers):
+    """"Layers: name (mode) active/driving roles" summary of InputLayer.stats() dicts."""
+    if not layers:
+        return "Layers: none"
+    return "Layers: " + ", ".join(f"{layer['name']} ({layer['mode']}) {layer['active']}/{layer['driving']}"
+                                  + (f", {layer['playing']} playing" if layer.get('playing') else "")
+                                  for layer in layers)
+
+
+def mixing_weights(address):
+    """{role: weight} that a routed address drives: its MIXING_MATRIX entry, else its VRC_OSC_MAP role."""
+    return MIXING_MATRIX.get(address) or {VRC_OSC_MAP[address]: 1.0}
+
+
+def rebuild_mixing_tables():
+    """
+    Rebuilds the mixer inputs, ROUTED_ADDRESSES and FAST_PATH_ADDRESSES from VRC_OSC_MAP and MIXING_MATRIX.
+
+    Called when a scheduler is created, before any receive thread reads them. The tables
+    are updated in place so modules holding a reference see the new contents.
+    """
+    for address, weights in MIXING_MATRIX.items():
+        if not weights:
+            raise ValueError(f"MIXING_MATRIX entry {address} drives no roles")
+        unknown = [receiver_name for receiver_name in weights if receiver_name not in ROLE_INDEX]
+        if unknown:
+            raise ValueError(f"MIXING_MATRIX entry {address} names unknown role(s): {', '.join(map(repr, unknown))}")
+    MIX_INPUT_ADDRESSES[:] = dict.fromkeys(list(VRC_OSC_MAP) + list(MIXING_MATRIX))
+    MIX_INPUT_INDEX.clear()
+    MIX_INPUT_INDEX.update((address, index) for index, address in enumerate(MIX_INPUT_ADDRESSES))
+    MIX_INPUT_VALUES[:] = [0.0] * len(MIX_INPUT_ADDRESSES)
+    ROUTED_ADDRESSES.clear()
+    ROUTED_ADDRESSES.update(VRC_OSC_MAP)
+    ROUTED_ADDRESSES.update((address, max(weights, key=weights.get)) for address, weights in MIXING_MATRIX.items())
+    FAST_PATH_ADDRESSES.clear()
+    FAST_PATH_ADDRESSES.update((_osc_pad_string(address), (receiver_name, address))
+                               for address, receiver_name in ROUTED_ADDRESSES.items())
+
+
+def create_mixer():
+    """SparseMixer from MIX_INPUT_ADDRESSES to ROLE_NAMES for MIXING_MATRIX, or None when mixing is off."""
+    if not MIXING_MATRIX:
+        return None
+    entries = []
+    for input_index, address in enumerate(MIX_INPUT_ADDRESSES):
+        for receiver_name, weight in mixing_weights(address).items():
+            entries.append((ROLE_INDEX[receiver_name], input_index, weight))
+    return sharkee_mixing.SparseMixer(entries, len(MIX_INPUT_ADDRESSES), len(ROLE_NAMES),
+                                      MIXING_COMBINE, MIXING_SOFTMAX_SHARPNESS)
+
+
+def create_conditioner():
+    """SignalConditioner for DEFAULT_CONDITIONING/ROLE_CONDITIONING, or None when all roles are identity."""
+    params = [dict(DEFAULT_CONDITIONING, **ROLE_CONDITIONING.get(name, {})) for name in ROLE_NAMES]
+    if all(sharkee_conditioning.is_identity(p) for p in params):
+        return None
+    return sharkee_conditioning.SignalConditioner(params)
+
+
+class OutputScheduler:
+    """
+    Fixed-rate output stage with latest-value-wins coalescing.
+
+    Every 1/tick_hz seconds it emits, for each role whose input slot changed since the
+    last tick, only the most recent value, then refreshes held roles with keepalives so
+    the firmware's realtime timeout does not cut sustained contacts. Updates go to the
+    OUTPUT_FORMAT output, which is flushed once at the end of every tick. It is driven either by its own thread
+    (start_thread) or by an asyncio loop timer (start_in_loop), and tracks how many
+    input updates were coalesced, ticks that overran their period, and how late each
+    tick started relative to its deadline (send-time jitter). A role under its
+    ROLE_MAX_SEND_HZ cap keeps its update pending until it may send again, and the
+    adaptive deadband (AIRTIME_BUDGET_MS_PER_S) is adjusted here once per window. With
+    a mixer (create_mixer), a tick first mixes the contact inputs into the role slots; the
+    INPUT_LAYERS are then merged over them. With
+    a conditioner (create_conditioner), every tick conditions all roles first and also
+    emits roles whose conditioned value is still moving without new input.
+    """
+
+    def __init__(self, tick_hz=None, emit=None, keepalive_interval_ms=None, output_format=None,
+                 airtime_budget_ms_per_s=None, conditioner=False, mixer=False):
+        global DEADBAND_SCALE
+        # Route and mix by the MIXING_MATRIX configured now (e.g. --mixing), not the one at import
+        rebuild_mixing_tables()
+        # Each scheduler starts from stopped motors, not from what a previous engine sent
+        reset_role_state()
+        self.tick_hz = tick_hz or OUTPUT_TICK_HZ
+        self.period_s = 1.0 / self.tick_hz
+        self.emit = emit or emit_role_intensity
+        self.output = OUTPUT_FORMATS[output_format or OUTPUT_FORMAT]()
+        if keepalive_interval_ms is None:
+            keepalive_interval_ms = KEEPALIVE_INTERVAL_MS
+        # 0 disables keepalives
+        self.keepalive_interval_s = keepalive_interval_ms / 1000.0
+        max_send_hz = [ROLE_MAX_SEND_HZ.get(name, DEFAULT_ROLE_MAX_SEND_HZ) for name in ROLE_NAMES]
+        self.min_send_interval_s = [1.0 / hz if hz else 0.0 for hz in max_send_hz]
+        # 0 disables the adaptive deadband
+        self.airtime_budget_ms_per_s = AIRTIME_BUDGET_MS_PER_S if airtime_budget_ms_per_s is None else airtime_budget_ms_per_s
+        DEADBAND_SCALE = 1.0
+        self.airtime_ms_per_s = 0.0
+        self._airtime_smoothed = None
+        self._adapt_at = time.perf_counter() + ADAPTIVE_DEADBAND_WINDOW_S
+        self._adapt_datagrams = 0
+        self._adapt_bytes = 0
+        # False = build from the configuration; None = no mixing / conditioning
+        self.mixer = create_mixer() if mixer is False else mixer
+        self._mix_seen = MIX_INPUT_SEQ
+        self.conditioner = create_conditioner() if conditioner is False else conditioner
+        # Last value handed to emit per role (compared when layers or conditioning are active)
+        self._emitted = list(ROLE_INPUT_VALUES)
+        self._last_tick_s = None
+        self._seen_seq = list(ROLE_INPUT_SEQ)
+        # Input timestamps of the role updates emitted this tick (receive-to-send latency)
+        self._sent_input_ns = [0] * len(ROLE_NAMES)
+        self._stop_event = threading.Event()
+        self._loop = None
+        self._timer_handle = None
+        self.thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Clears all scheduler statistics (cumulative and per-window)."""
+        self.ticks = 0
+        self.inputs = 0
+        self.sends = 0
+        self.keepalives = 0
+        self.overruns = 0
+        self.jitter_max_s = 0.0
+        self._window_jitter_sum = 0.0
+        self._window_jitter_max = 0.0
+        self._window_ticks = 0
+        self._next_stats_at = time.perf_counter() + SCHEDULER_STATS_INTERVAL_S
+
+    def tick(self):
+        """Emits the latest value of every role whose input sequence moved since the last tick."""
+        seen = self._seen_seq
+        send = self.output.add
+        min_interval = self.min_send_interval_s
+        now = time.perf_counter()
+        if self.mixer and MIX_INPUT_SEQ != self._mix_seen:
+            # The receive thread only writes mixer inputs, so the scheduler owns the role slots
+            self._mix_seen = MIX_INPUT_SEQ
+            for index, value in enumerate(self.mixer.mix(MIX_INPUT_VALUES)):
+                if value != ROLE_INPUT_VALUES[index]:
+                    ROLE_INPUT_VALUES[index] = value
+                    ROLE_INPUT_NS[index] = MIX_INPUT_NS
+                    ROLE_INPUT_SEQ[index] += 1
+        conditioner = self.conditioner
+        layers = INPUT_LAYERS
+        values = ROLE_INPUT_VALUES
+        if layers:
+            for layer in layers:
+                layer.advance(now)
+            values = merge_input_layers(values, layers, now)
+        if conditioner:
+            dt = now - self._last_tick_s if self._last_tick_s is not None else self.period_s
+            values = conditioner.process(values, max(dt, 1e-6))
+        self._last_tick_s = now
+        # Layers and conditioning can move a role's value without a new input
+        derived = values is not ROLE_INPUT_VALUES
+        emitted = self._emitted
+        sent_input_ns = self._sent_input_ns
+        sent_inputs = 0
+        for index, receiver_name in enumerate(ROLE_NAMES):
+            seq = ROLE_INPUT_SEQ[index]
+            if seq == seen[index] and (not derived or values[index] == emitted[index]):
+                continue
+            # Rate cap: leave the update pending; a later tick sends the newest value
+            if now - ROLE_LAST_CHANGE_S[index] < min_interval[index]:
+                continue
+            updates = seq - seen[index]
+            self.inputs += updates
+            seen[index] = seq
+            emitted[index] = values[index]
+            if self.emit(receiver_name, values[index], send):
+                self.sends += 1
+                ROLE_SENT[index] += 1
+                if updates:
+                    updates -= 1
+                    sent_input_ns[sent_inputs] = ROLE_INPUT_NS[index]
+                    sent_inputs += 1
+            ROLE_SUPPRESSED[index] += updates
+        if self.keepalive_interval_s:
+            self.keepalives += send_keepalives(time.perf_counter(), self.keepalive_interval_s, send)
+        try:
+            self.output.flush()
+        except Exception as e:
+            post_gui_event({'type': 'LOG', 'message': f"Send failed to {ACTIVE_TRANSPORT.describe()}: {e}", 'level': 'ERROR'})
+        if sent_inputs:
+            # Updates emitted without a new input (keepalives, layers, conditioning) are not counted
+            flushed_ns = time.perf_counter_ns()
+            for position in range(sent_inputs):
+                LATENCY_RECEIVE_TO_SEND.record(flushed_ns - sent_input_ns[position])
+
+    def _step(self, deadline, clock):
+        """Runs one tick due at `deadline` and returns the deadline of the next one."""
+        started = clock()
+        late = max(0.0, started - deadline)
+        self.tick()
+        self.ticks += 1
+        self._window_ticks += 1
+        self._window_jitter_sum += late
+        if late > self._window_jitter_max:
+            self._window_jitter_max = late
+        if late > self.jitter_max_s:
+            self.jitter_max_s = late
+
+        next_deadline = deadline + self.period_s
+        finished = clock()
+        if finished > next_deadline:
+            # Overran the period: skip the missed ticks instead of bursting to catch up
+            self.overruns += 1
+            next_deadline += self.period_s * (int((finished - next_deadline) / self.period_s) + 1)
+
+        now = time.perf_counter()
+        if now >= self._adapt_at:
+            self._adapt_deadband(now)
+        if now >= self._next_stats_at:
+            self._publish_stats()
+        return next_deadline
+
+    def _adapt_deadband(self, now):
+        """Estimates the airtime of the last window and widens or narrows DEADBAND_SCALE against the budget."""
+        global DEADBAND_SCALE
+        elapsed = now - self._adapt_at + ADAPTIVE_DEADBAND_WINDOW_S
+        datagrams = self.output.datagrams - self._adapt_datagrams
+        payload = self.output.bytes - self._adapt_bytes
+        self._adapt_datagrams = self.output.datagrams
+        self._adapt_bytes = self.output.bytes
+        self._adapt_at = now + ADAPTIVE_DEADBAND_WINDOW_S
+        self.airtime_ms_per_s = estimate_airtime_us(datagrams, payload) / 1000.0 / elapsed
+        budget = self.airtime_budget_ms_per_s
+        if not budget:
+            return
+        if self._airtime_smoothed is None:
+            self._airtime_smoothed = self.airtime_ms_per_s
+        else:
+            self._airtime_smoothed += ADAPTIVE_DEADBAND_SMOOTHING * (self.airtime_ms_per_s - self._airtime_smoothed)
+        # Proportional in log space, at most one step per window either way
+        factor = (max(self._airtime_smoothed, 1e-3) / budget) ** ADAPTIVE_DEADBAND_GAIN
+        factor = min(max(factor, 1.0 / ADAPTIVE_DEADBAND_STEP), ADAPTIVE_DEADBAND_STEP)
+        DEADBAND_SCALE = min(max(DEADBAND_SCALE * factor, 1.0), ADAPTIVE_DEADBAND_MAX_SCALE)
+
+    def stats(self):
+        """Returns a dict of the scheduler statistics for the current window."""
+        window = self._window_ticks or 1
+        return {
+            'tick_hz': self.tick_hz,
+            'ticks': self.ticks,
+            'inputs': self.inputs,
+            'sends': self.sends,
+            # Input updates per packet actually sent (1.0 = nothing coalesced)
+            'coalescing_ratio': self.inputs / self.sends if self.sends else 0.0,
+            'keepalives': self.keepalives,
+            'output_format': self.output.name,
+            'transport': ACTIVE_TRANSPORT.stats(),
+            'datagrams': self.output.datagrams,
+            'bytes': self.output.bytes,
+            'overruns': self.overruns,
+            'jitter_mean_ms': self._window_jitter_sum / window * 1000.0,
+            'jitter_max_ms': self._window_jitter_max * 1000.0,
+            'airtime_ms_per_s': self.airtime_ms_per_s,
+            'airtime_budget_ms_per_s': self.airtime_budget_ms_per_s,
+            'deadband_scale': DEADBAND_SCALE,
+            'conditioning': (("numpy" if self.conditioner.use_numpy else "python") if self.conditioner else None),
+            'mixing': (f"{self.mixer.combine}, {self.mixer.input_count} inputs" if self.mixer else None),
+            'layers': [layer.stats() for layer in INPUT_LAYERS],
+            'role_sent': list(ROLE_SENT),
+            'role_suppressed': list(ROLE_SUPPRESSED),
+            'latency': {histogram.name: histogram.summary() for histogram in ROUTER_HISTOGRAMS},
+        }
+
+    def _publish_stats(self):
+        ROUTER_SNAPSHOT.scheduler_stats = self.stats()
+        self._window_jitter_sum = 0.0
+        self._window_jitter_max = 0.0
+        self._window_ticks = 0
+        self._next_stats_at = time.perf_counter() + SCHEDULER_STATS_INTERVAL_S
+
+    def start_thread(self):
+        """Drives the scheduler from a dedicated thread."""
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run_thread, name="OutputScheduler", daemon=True)
+        self.thread.start()
+
+    def _run_thread(self):
+        clock = time.perf_counter
+        deadline = clock()
+        while not self._stop_event.is_set():
+            remaining = deadline - clock()
+            if remaining > 0:
+                time.sleep(remaining)
+            deadline = self._step(deadline, clock)
+
+    def start_in_loop(self, loop):
+        """Drives the scheduler from loop timers. Must be called on the loop's thread."""
+        self._loop = loop
+        self._timer_handle = loop.call_at(loop.time(), self._loop_tick, loop.time())
+
+    def _loop_tick(self, deadline):
+        next_deadline = self._step(deadline, self._loop.time)
+        self._timer_handle = self._loop.call_at(next_deadline, self._loop_tick, next_deadline)
+
+    def stop(self):
+        """Stops whichever driver is active (loop variant must be called on the loop's thread)."""
+        self._stop_event.set()
+        if self._timer_handle:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+
+
+# --- FAST-PATH OSC PARSER ---
+# VRChat sends one argument per parameter message, so a mapped message is
+# "<padded address><4-byte type tag>[4-byte big-endian argument]". Matching the raw
+# padded address bytes avoids pythonosc's full decode and the Dispatcher's pattern match.
+# Padded VRChat address bytes -> (receiver_name, address)
+FAST_PATH_ADDRESSES = {}
+# Tables for the built-in configuration, so the parsers work before any scheduler exists
+rebuild_mixing_tables()
+_OSC_TAG_FLOAT = b",f\x00\x00"
+_OSC_TAG_INT = b",i\x00\x00"
+_OSC_TAG_TRUE = b",T\x00\x00"
+_OSC_TAG_FALSE = b",F\x00\x00"
+_UNPACK_FLOAT_BE = struct.Struct(">f").unpack_from
+_UNPACK_INT_BE = struct.Struct(">i").unpack_from
+# Returned by parse_osc_fast when pythonosc has to decode the datagram
+FAST_PATH_FALLBACK = object()
+
+def parse_osc_fast(data, size):
+    """
+    Byte-level decode of a single-argument VRChat message held in data[:size].
+
+    Returns (receiver_name, address, value) for a ROUTED_ADDRESSES address carrying one
+    float, int or bool argument; None for any other address (ignored, exactly as the
+    Dispatcher ignored unmapped addresses); FAST_PATH_FALLBACK for bundles, other
+    argument layouts and anything malformed.
+    """
+    if size < 8 or data[0] != 0x2F:  # '/' - bundles start with '#'
+        return FAST_PATH_FALLBACK
+    end = data.find(0, 0, size)
+    if end < 0:
+        return FAST_PATH_FALLBACK
+    padded = (end | 3) + 1
+    route = FAST_PATH_ADDRESSES.get(bytes(data[:padded]))
+    if route is None:
+        return None
+
+    tag = data[padded:padded + 4]
+    if size == padded + 8:
+        if tag == _OSC_TAG_FLOAT:
+            return route[0], route[1], _UNPACK_FLOAT_BE(data, padded + 4)[0]
+        if tag == _OSC_TAG_INT:
+            return route[0], route[1], float(_UNPACK_INT_BE(data, padded + 4)[0])
+    elif size == padded + 4:
+        if tag == _OSC_TAG_TRUE:
+            return route[0], route[1], 1.0
+        if tag == _OSC_TAG_FALSE:
+            return route[0], route[1], 0.0
+    return FAST_PATH_FALLBACK
+
+
+def broadcast_test_pulse(receivers, schedule):
+    """
+    Pulses each role at full intensity for TEST_PULSE_DURATION_S.
+
+    While an engine runs this plays the "pulse" clip on PATTERN_PLAYER, so the pulse goes
+    through the scheduler like any other input and the roles fall back to their merged
+    input afterwards. Without a running engine the pulse and stop are sent directly.
+    Runs on the router engine's thread; `schedule(delay_s, callback)` is the engine's timer.
+    """
+    if PATTERN_PLAYER in INPUT_LAYERS:
+        PATTERN_PLAYER.play("pulse", receivers)
+        post_gui_event({'type': 'LOG', 'message': f"Pulsing {len(receivers)} client roles through the pattern layer.", 'level': 'SUCCESS'})
+        return
+
+    sent = []
+    for receiver in receivers:
+        try:
+            send_role_intensity(receiver, TEST_PULSE_INTENSITY)
+            sent.append(receiver)
+        except Exception as e:
+            post_gui_event({'type': 'LOG', 'message': f"Error sending broadcast test pulse for {receiver}: {e}", 'level': 'ERROR'})
+
+    if sent:
+        schedule(TEST_PULSE_DURATION_S, lambda: broadcast_stop(sent))
+        post_gui_event({'type': 'LOG', 'message': f"Broadcast a pulse message for {len(sent)} client roles.", 'level': 'SUCCESS'})
+    else:
+        post_gui_event({'type': 'LOG', 'message': "Error: Could not broadcast test pulse.", 'level': 'ERROR'})
+
+def broadcast_stop(receivers):
+    """Sends a stop command (0.0) to each role. Best effort, errors are ignored."""
+    for receiver in receivers:
+        try:
+            send_role_intensity(receiver, 0.0)
+        except Exception:
+            pass
+
+def dispatch_osc_datagram(data, handler):
+    """
+    Decodes one datagram (message or bundle) and calls handler for every ROUTED_ADDRESSES address.
+
+    Returns False if the datagram could not be parsed. Bundle timetags are not honoured;
+    every contained message is routed immediately.
+    """
+    try:
+        packet = osc_packet.OscPacket(data)
+    except osc_packet.ParseError:
+        return False
+    for timed_msg in packet.messages:
+        message = timed_msg.message
+        if message.address in ROUTED_ADDRESSES:
+            try:
+                handler(message.address, *message.params)
+            except Exception as e:
+                post_gui_event({'type': 'LOG', 'message': f"Router handler error for {message.address}: {e}", 'level': 'ERROR'})
+    return True
+
+
+class OscSourceListener:
+    """
+    Additional OSC input source (a game mod, a script) feeding its own InputLayer.
+
+    Listens on its own UDP port and thread and accepts the same parameter addresses as the
+    VRChat listener; the values go to `layer` instead of the VRChat role slots. With
+    MIXING_MATRIX set, contact values are mixed into the layer's roles with the same matrix
+    and combine policy as the VRChat input (one mix per received value).
+    """
+
+    def __init__(self, layer, address):
+        self.layer = layer
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind(address)
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.settimeout(RECEIVE_POLL_TIMEOUT_S)
+        self.parse_errors = 0
+        self.mixer = None
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # Built at start: the engine's scheduler has rebuilt the mixing tables by now
+        self.mixer = create_mixer()
+        self._mix_values = [0.0] * len(MIX_INPUT_ADDRESSES)
+        self._mix_roles = {address: [ROLE_INDEX[receiver_name] for receiver_name in mixing_weights(address)]
+                           for address in MIX_INPUT_ADDRESSES}
+        add_input_layer(self.layer)
+        self.thread = threading.Thread(target=self._serve, name=f"OscSource-{self.layer.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the listener and withdraws its layer. Safe to call twice."""
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.sock.close()
+        remove_input_layer(self.layer)
+
+    def _handle(self, address, *args):
+        self._route(address, float(args[0]))
+
+    def _route(self, address, value):
+        if not self.mixer:
+            self.layer.set(ROUTED_ADDRESSES[address], value)
+            return
+        self._mix_values[MIX_INPUT_INDEX[address]] = value
+        mixed = self.mixer.mix(self._mix_values)
+        # Only the roles this contact feeds can have changed
+        for index in self._mix_roles[address]:
+            self.layer.set(ROLE_NAMES[index], mixed[index])
+
+    def _serve(self):
+        buffer = bytearray(MAX_OSC_DATAGRAM_SIZE)
+        while not self._stop_event.is_set():
+            try:
+                size = self.sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            parsed = parse_osc_fast(buffer, size)
+            if parsed is None:
+                continue
+            if parsed is not FAST_PATH_FALLBACK:
+                self._route(parsed[1], parsed[2])
+            elif not dispatch_osc_datagram(bytes(buffer[:size]), self._handle):
+                self.parse_errors += 1
+
+    def describe(self):
+        return f"{self.layer.name} on {self.address[0]}:{self.address[1]} ({self.layer.mode}, priority {self.layer.priority})"
+
+
+def create_input_source(spec):
+    """Builds an OscSourceListener from an INPUT_SOURCES spec ("NAME:PORT[:MODE[:PRIORITY]]")."""
+    parts = spec.split(":")
+    if len(parts) < 2 or len(parts) > 4 or not parts[0]:
+        raise ValueError(f"Input source {spec!r} is not NAME:PORT[:MODE[:PRIORITY]]")
+    try:
+        port = int(parts[1])
+        priority = int(parts[3]) if len(parts) > 3 else 0
+    except ValueError:
+        raise ValueError(f"Input source {spec!r} has a non-numeric port or priority") from None
+    mode = parts[2] if len(parts) > 2 else "max"
+    layer = InputLayer(parts[0], mode, priority, SOURCE_LAYER_TIMEOUT_S)
+    return OscSourceListener(layer, (VRC_OSC_LISTEN_IP, port))
+
+
+class AudioSource:
+    """
+    Audio input source: AUDIO_BANDS envelopes of a WAV file or PCM stream feeding its own InputLayer.
+
+    Runs on its own thread, one hop at a time. A WAV file is paced to real time and its
+    layer is released when it ends; a stream is paced by its writer. pump() does one hop
+    without pacing (used by the thread and the benchmark).
+    """
+
+    def __init__(self, layer, path):
+        self.layer = layer
+        self.path = path
+        self.role_bands = []
+        for receiver_name in ROLE_NAMES:
+            bands = [index for index, (_, _, roles) in enumerate(AUDIO_BANDS) if receiver_name in roles]
+            if bands:
+                self.role_bands.append((receiver_name, bands))
+        unknown = {role for _, _, roles in AUDIO_BANDS for role in roles} - set(ROLE_NAMES)
+        if unknown:
+            raise ValueError(f"AUDIO_BANDS names unknown role(s): {', '.join(sorted(unknown))}")
+        self.reader = sharkee_audio.PcmReader(path, AUDIO_PIPE_SAMPLE_RATE, AUDIO_PIPE_CHANNELS)
+        try:
+            self.envelope = sharkee_audio.BandEnvelope(
+                self.reader.sample_rate, [(low_hz, high_hz) for low_hz, high_hz, _ in AUDIO_BANDS],
+                AUDIO_HOP_SAMPLES, AUDIO_ATTACK_MS, AUDIO_RELEASE_MS, AUDIO_FLOOR_DB, AUDIO_CEILING_DB)
+        except Exception:
+            self.reader.close()
+            raise
+        self.hops = 0
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        add_input_layer(self.layer)
+        self.thread = threading.Thread(target=self._serve, name=f"AudioSource-{self.layer.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops reading and withdraws the layer. Safe to call twice."""
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.reader.close()
+        self.layer.release_all()
+        remove_input_layer(self.layer)
+
+    def pump(self):
+        """Reads and applies one hop. Returns the number of samples read (0 at the end of the input)."""
+        samples = self.reader.read(AUDIO_HOP_SAMPLES)
+        if len(samples):
+            rows = self.envelope.process(samples)
+            if len(rows):
+                levels = rows[-1].tolist()
+                for receiver_name, bands in self.role_bands:
+                    self.layer.set(receiver_name, max(levels[index] for index in bands))
+                self.hops += len(rows)
+        return len(samples)
+
+    def _serve(self):
+        hop_s = AUDIO_HOP_SAMPLES / self.reader.sample_rate
+        start = time.perf_counter()
+        read = 0
+        while not self._stop_event.is_set():
+            try:
+                if not self.pump():
+                    break
+            except (OSError, ValueError) as e:
+                post_gui_event({'type': 'LOG', 'message': f"Audio source {self.path} failed: {e}", 'level': 'ERROR'})
+                break
+            read += 1
+            if self.reader.is_wav:
+                delay = start + read * hop_s - time.perf_counter()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+        self.layer.release_all()
+        if not self._stop_event.is_set():
+            seconds = self.reader.frames_read / self.reader.sample_rate
+            post_gui_event({'type': 'LOG', 'message': f"Audio source {self.path} ended after {seconds:.1f} s.", 'level': 'INFO'})
+
+    def describe(self):
+        return (f"{self.layer.name} from {self.path} ({self.reader.sample_rate} Hz, {self.reader.channels} ch, "
+                f"{len(AUDIO_BANDS)} bands; {self.layer.mode}, priority {self.layer.priority})")
+
+
+def create_audio_source(path):
+    """Builds the AudioSource for AUDIO_INPUT `path` on a new "audio" layer."""
+    return AudioSource(InputLayer("audio", AUDIO_LAYER_MODE, AUDIO_LAYER_PRIORITY), path)
+
+
+class _RouterEngineBase:
+    """Datagram dispatch shared by the router engines: byte-level fast path, pythonosc fallback."""
+
+    def _init_dispatch(self, handler):
+        self.handler = handler or sharkeehaptics_router_handler
+        # Fast-path hits go straight to route_intensity when the default handler is in use;
+        # a custom handler (benchmarks, replays) still receives (address, value)
+        if self.handler is sharkeehaptics_router_handler:
+            self._route_fast = route_intensity
+        else:
+            self._route_fast = lambda receiver_name, address, value: self.handler(address, value)
+        self.parse_errors = 0
+        self.fast_path_hits = 0
+        self.fallbacks = 0
+        self.sinks = create_output_fanout()
+        self.recorder = sharkee_session.SessionRecorder(SESSION_RECORD_PATH) if SESSION_RECORD_PATH else None
+        self.metrics = None
+        if METRICS_PORT:
+            self.metrics = sharkee_metrics.MetricsServer((METRICS_BIND_IP, METRICS_PORT), lambda: collect_router_metrics(self),
+                                                         METRICS_REFRESH_INTERVAL_S)
+        self.sources = []
+        try:
+            for spec in INPUT_SOURCES:
+                self.sources.append(create_input_source(spec))
+            if AUDIO_INPUT:
+                self.sources.append(create_audio_source(AUDIO_INPUT))
+        except Exception:
+            for source in self.sources:
+                source.stop()
+            raise
+        self.scheduler = OutputScheduler()
+
+    def _open_inputs(self):
+        """Registers the pattern layer (starting PATTERN_AUTOPLAY) and starts the additional input sources."""
+        add_input_layer(PATTERN_PLAYER)
+        for name in PATTERN_AUTOPLAY:
+            PATTERN_PLAYER.play(name)
+        for source in self.sources:
+            source.start()
+
+    def _close_inputs(self):
+        """Stops the input sources and withdraws every layer this engine registered."""
+        for source in self.sources:
+            source.stop()
+        PATTERN_PLAYER.stop()
+        PATTERN_PLAYER.release_all()
+        remove_input_layer(PATTERN_PLAYER)
+
+    def _open_transport(self):
+        """
+        Starts the engine's sinks (and recorder) and the metrics endpoint, and makes the fan-out the ACTIVE_TRANSPORT.
+
+        If any of them fails, what was already started is stopped again before the error propagates.
+        """
+        global ACTIVE_TRANSPORT
+        try:
+            if self.recorder:
+                self.recorder.start()
+                self.sinks.recorder = self.recorder
+            self.sinks.start()
+            # Last, so a failed sink never leaves the metrics port bound
+            if self.metrics:
+                self.metrics.start()
+        except Exception:
+            self.sinks.recorder = None
+            for part in (self.sinks, self.recorder, self.metrics):
+                if part:
+                    part.stop()
+            raise
+        ACTIVE_TRANSPORT = self.sinks
+
+    def _close_transport(self):
+        """Sends a stop to every role through the sinks, puts DEFAULT_TRANSPORT back and stops the sinks."""
+        global ACTIVE_TRANSPORT
+        if ACTIVE_TRANSPORT is self.sinks:
+            # The scheduler has stopped: these are the last datagrams queued (and recorded)
+            broadcast_stop(ROLE_NAMES)
+            ACTIVE_TRANSPORT = DEFAULT_TRANSPORT
+        self.sinks.stop()
+        if self.recorder:
+            self.recorder.stop()
+            stats = self.recorder.stats()
+            post_gui_event({'type': 'LOG', 'message': f"Session recorded to {stats['path']}: {stats['in']} received, "
+                            f"{stats['out']} sent, {stats['dropped']} dropped.", 'level': 'INFO'})
+        if self.metrics:
+            self.metrics.stop()
+
+    def dispatch_datagram(self, data, size=None):
+        """Routes one datagram from data[:size]; only bundles and unusual layouts are decoded by pythonosc."""
+        if size is None:
+            size = len(data)
+        if self.recorder:
+            self.recorder.record(sharkee_session.DIRECTION_IN, memoryview(data)[:size])
+        started = time.perf_counter_ns()
+        parsed = parse_osc_fast(data, size)
+        if parsed is FAST_PATH_FALLBACK:
+            self.fallbacks += 1
+            if not dispatch_osc_datagram(bytes(data[:size]), self.handler):
+                self.parse_errors += 1
+        elif parsed is not None:
+            self.fast_path_hits += 1
+            try:
+                self._route_fast(*parsed)
+            except Exception as e:
+                post_gui_event({'type': 'LOG', 'message': f"Router handler error for {parsed[1]}: {e}", 'level': 'ERROR'})
+        LATENCY_HANDLER.record(time.perf_counter_ns() - started)
+
+
+class OscReceiveEngine(_RouterEngineBase):
+    """
+    Single-threaded VRChat listener.
+
+    One thread reads datagrams with recv_into into a preallocated buffer and runs the
+    routing handler inline, so there is no per-datagram thread creation and the global
+    counters / LAST_INTENSITY only ever have one writer. Only addresses present in
+    VRC_OSC_MAP (or MIXING_MATRIX) reach the handler (same semantics as the old Dispatcher mapping).
+    Output is emitted by the OutputScheduler on its own thread. Timers (test pulse
+    stops) run on threading.Timer, off the Tk thread.
+    """
+
+    name = "thread"
+
+    def __init__(self, address=None, handler=None):
+        self.address = address or (VRC_OSC_LISTEN_IP, VRC_OSC_LISTEN_PORT)
+        self._init_dispatch(handler)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_SOCKET_BUFFER_BYTES)
+        try:
+            self.sock.bind(self.address)
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.settimeout(RECEIVE_POLL_TIMEOUT_S)
+        self._buffer = bytearray(MAX_OSC_DATAGRAM_SIZE)
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts the transport, the receive thread and the output scheduler thread."""
+        self._open_transport()
+        self._open_inputs()
+        self.thread = threading.Thread(target=self.serve_forever, name="OscReceiveEngine", daemon=True)
+        self.thread.start()
+        self.scheduler.start_thread()
+
+    def stop(self):
+        """Signals the receive thread to exit, waits for it and closes the socket. Safe to call twice."""
+        self.scheduler.stop()
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.sock.close()
+        self._close_inputs()
+        self._close_transport()
+
+    def serve_forever(self):
+        """Receive loop: recv_into the shared buffer, then dispatch inline on this thread."""
+        recv_into = self.sock.recv_into
+        buffer = self._buffer
+        dispatch = self.dispatch_datagram
+        while not self._stop_event.is_set():
+            try:
+                size = recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop_event.is_set():
+                    break
+                raise
+            if size:
+                # Parsed in place; the datagram is only copied if pythonosc has to decode it
+                dispatch(buffer, size)
+
+    def submit(self, callback):
+        """Runs callback now on the caller's thread (sends are plain socket calls here)."""
+        callback()
+
+    def schedule(self, delay_s, callback):
+        """Runs callback after delay_s seconds on a timer thread."""
+        timer = threading.Timer(delay_s, callback)
+        timer.daemon = True
+        timer.start()
+
+
+class _VrcListenerProtocol(asyncio.DatagramProtocol):
+    """Feeds VRChat datagrams from the asyncio listener endpoint into the engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def datagram_received(self, data, addr):
+        self.engine.dispatch_datagram(data)
+
+    def error_received(self, exc):
+        post_gui_event({'type': 'LOG', 'message': f"VRChat listener error: {exc}", 'level': 'ERROR'})
+
+
+class AsyncioRouterEngine(_RouterEngineBase):
+    """
+    Router core on asyncio DatagramProtocol endpoints, running in its own event-loop thread.
+
+    The VRChat listener is a loop endpoint, and test pulse / stop timers, as well as the
+    output scheduler ticks, are loop timers, so output keeps its timing while Tk is busy
+    redrawing. Datagrams are handed to the output sinks, which send from their own threads.
+    GUI-initiated actions go through submit()/schedule() so they execute on the loop thread.
+    """
+
+    name = "asyncio"
+
+    def __init__(self, address=None, handler=None):
+        self.address = address or (VRC_OSC_LISTEN_IP, VRC_OSC_LISTEN_PORT)
+        self._init_dispatch(handler)
+        # Sockets are created and bound up front so bind errors surface in the caller
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_SOCKET_BUFFER_BYTES)
+        try:
+            self.sock.bind(self.address)
+        except OSError:
+            self.sock.close()
+            raise
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self._listen_transport = None
+        self._ready = threading.Event()
+        self._startup_error = None
+        # Decides who closes the endpoints when stop() comes before they are open (see _run)
+        self._state_lock = threading.Lock()
+        self._stop_requested = False
+
+    def start(self):
+        """
+        Starts the event-loop thread and waits until the listener endpoint and the sinks are open.
+
+        Raises the loop thread's startup error, or TimeoutError when it has not finished
+        within ENGINE_STARTUP_TIMEOUT_S.
+        """
+        self.thread = threading.Thread(target=self._run, name="AsyncioRouterEngine", daemon=True)
+        self.thread.start()
+        if not self._ready.wait(timeout=ENGINE_STARTUP_TIMEOUT_S):
+            raise TimeoutError(f"asyncio engine did not open its endpoints within {ENGINE_STARTUP_TIMEOUT_S:g} s")
+        if self._startup_error:
+            # Let the thread finish so stop() releases the sockets itself
+            self.thread.join(timeout=1)
+            raise self._startup_error
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._open_endpoints())
+        except Exception as e:
+            self._startup_error = e
+            self._ready.set()
+            return
+        with self._state_lock:
+            self._ready.set()
+            stop_requested = self._stop_requested
+        if stop_requested:
+            # start() timed out and stop() left the endpoints opened since then to this thread
+            self._close_endpoints()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _open_endpoints(self):
+        self._listen_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _VrcListenerProtocol(self), sock=self.sock)
+        self._open_transport()
+        self._open_inputs()
+        self.scheduler.start_in_loop(self.loop)
+
+    def _close_endpoints(self):
+        self.scheduler.stop()
+        self._close_inputs()
+        self._close_transport()
+        if self._listen_transport:
+            self._listen_transport.close()
+        # Queued behind the transport's connection_lost, which closes the listening socket
+        self.loop.call_soon(self.loop.stop)
+
+    def stop(self):
+        """Closes the listener and the sinks, stops the loop and joins its thread. Safe to call twice."""
+        if self.thread and self.thread.is_alive():
+            with self._state_lock:
+                self._stop_requested = True
+                ready = self._ready.is_set()
+            if ready:
+                self.loop.call_soon_threadsafe(self._close_endpoints)
+            self.thread.join(timeout=3)
+            return
+        # Never started, or endpoint setup failed: release the sockets and whatever
+        # _open_transport had started (metrics, recorder) ourselves
+        self._close_inputs()
+        self._close_transport()
+        if not self.loop.is_closed():
+            if self._listen_transport:
+                # One pass of the (no longer running) loop runs its connection_lost
+                self._listen_transport.close()
+                self.loop.call_soon(self.loop.stop)
+                self.loop.run_forever()
+            self.loop.close()
+        self.sock.close()
+
+    def submit(self, callback):
+        """Runs callback on the loop thread as soon as possible."""
+        self.loop.call_soon_threadsafe(callback)
+
+    def schedule(self, delay_s, callback):
+        """Runs callback on the loop thread after delay_s seconds."""
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay_s, callback)
+
+
+# Engine name (ROUTER_ENGINE / --engine) -> engine class
+ROUTER_ENGINES = {
+    OscReceiveEngine.name: OscReceiveEngine,
+    AsyncioRouterEngine.name: AsyncioRouterEngine,
+}
+
+
+def start_router_engine(engine_name=None, handler=None):
+    """
+    Builds and starts the ROUTER_ENGINE (or `engine_name`) engine on the VRChat listen address.
+
+    Bind and startup errors propagate to the caller; a half-started engine is stopped first.
+    """
+    engine_class = ROUTER_ENGINES[engine_name or ROUTER_ENGINE]
+    engine = engine_class((VRC_OSC_LISTEN_IP, VRC_OSC_LISTEN_PORT), handler or sharkeehaptics_router_handler)
+    try:
+        engine.start()
+    except Exception:
+        engine.stop()
+        raise
+    return engine
+
+
+# --- HEADLESS ENTRY POINT ---
+
+def _print_event(message, level='INFO'):
+    """Prints a log line in the same "[time] [LEVEL] message" layout as the GUI activity log."""
+    print(f"{time.strftime('[%H:%M:%S]')} [{level}] {message}", flush=True)
+
+
+# GUI_EVENTS_DROPPED value already reported on stdout
+_printed_events_dropped = 0
+
+def _drain_events():
+    """Prints every queued log event and reports events dropped since the last call."""
+    global _printed_events_dropped
+    while True:
+        try:
+            event = GUI_QUEUE.get_nowait()
+        except queue.Empty:
+            break
+        if event.get('type') == 'LOG':
+            _print_event(event['message'], event['level'])
+        GUI_QUEUE.task_done()
+    if GUI_EVENTS_DROPPED != _printed_events_dropped:
+        _print_event(f"Event log fell behind: {GUI_EVENTS_DROPPED - _printed_events_dropped} events dropped.", 'WARN')
+        _printed_events_dropped = GUI_EVENTS_DROPPED
+
+
+def _print_stats():
+    line = f"Received: {PACKETS_RECEIVED} | Routed: {PACKETS_ROUTED} | Keepalive: {PACKETS_KEEPALIVE}"
+    stats = ROUTER_SNAPSHOT.scheduler_stats
+    if stats:
+        line += (" | " + format_scheduler_stats(stats) + " | " + format_sink_stats(stats['transport'])
+                 + " | " + format_layer_stats(stats['layers']) + " | " + format_role_stats(stats)
+                 + " | " + format_latency_stats(stats['latency']))
+    _print_event(line, 'STATS')
+
+
+def add_router_arguments(parser):
+    """Adds the router options shared by the GUI and the headless entry point."""
+    parser.add_argument("--engine", choices=sorted(ROUTER_ENGINES), default=ROUTER_ENGINE,
+                        help="router core: blocking receive thread or asyncio event loop")
+    parser.add_argument("--output-format", choices=sorted(OUTPUT_FORMATS), default=OUTPUT_FORMAT,
+                        help="one OSC message per role update, one OSC bundle or one binary frame per scheduler tick")
+    parser.add_argument("--transport", choices=sorted(OUTPUT_TRANSPORTS), default=OUTPUT_TRANSPORT,
+                        help="broadcast to every device, unicast to each role's resolved CLIENT_MAP hostname, "
+                             "or send to a multicast group")
+    parser.add_argument("--sink", action="append", default=list(OUTPUT_SINKS), metavar="SPEC",
+                        help="additional output sink, repeatable: broadcast, unicast, multicast, file:PATH "
+                             "or serial:PORT[@BAUD]")
+    parser.add_argument("--airtime-budget", type=float, default=AIRTIME_BUDGET_MS_PER_S, metavar="MS_PER_S",
+                        help="widen the deadbands while output airtime exceeds this many ms per second (0 = off)")
+    parser.add_argument("--device-gamma", type=float, default=DEVICE_GAMMA,
+                        help="gamma configured on the devices, used to quantize intensities to motor levels")
+    parser.add_argument("--no-quantize", dest="quantize", action="store_false", default=QUANTIZE_TO_DEVICE,
+                        help="detect changes on raw intensities (INTENSITY_THRESHOLD) instead of device levels")
+    parser.add_argument("--smoothing-ms", type=float, default=DEFAULT_CONDITIONING['smoothing_ms'],
+                        help="default per-role input smoothing time constant (0 = off)")
+    parser.add_argument("--mixing", default=MIXING_FILE, metavar="PATH",
+                        help="load MIXING_MATRIX (contact address -> {role: weight}) from a JSON file")
+    parser.add_argument("--mixing-combine", choices=sharkee_mixing.MIX_COMBINES, default=MIXING_COMBINE,
+                        help="how a role combines the MIXING_MATRIX contributions of several contacts")
+    parser.add_argument("--source", action="append", default=list(INPUT_SOURCES), metavar="NAME:PORT[:MODE[:PRIORITY]]",
+                        help="additional OSC input merged as a layer, repeatable; MODE is override, max or add")
+    parser.add_argument("--clips", action="append", default=list(PATTERN_CLIP_FILES), metavar="PATH",
+                        help="load haptic pattern clips from a JSON file, repeatable")
+    parser.add_argument("--play", action="append", default=list(PATTERN_AUTOPLAY), metavar="NAME",
+                        help="play a pattern clip when the router starts, repeatable")
+    parser.add_argument("--audio", default=AUDIO_INPUT, metavar="WAV|PIPE|-",
+                        help="drive the roles from the AUDIO_BANDS of a WAV file or a raw int16 PCM stream "
+                             "(a FIFO, or - for stdin)")
+    parser.add_argument("--record", default=SESSION_RECORD_PATH, metavar="PATH",
+                        help="record every received and sent datagram to a session log (see sharkee_session.py)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, metavar="PORT",
+                        help=f"serve Prometheus metrics on http://{METRICS_BIND_IP}:PORT/metrics (0 = off)")
+    parser.add_argument("--multicast-group", default=MULTICAST_GROUP, help="multicast transport group address")
+    parser.add_argument("--multicast-ttl", type=int, default=MULTICAST_TTL, help="multicast hop limit (1 = local subnet)")
+    parser.add_argument("--multicast-interface", default=MULTICAST_INTERFACE,
+                        help="IPv4 address of the interface to send multicast on (default: OS route)")
+    parser.add_argument("--multicast-loopback", action="store_true", default=MULTICAST_LOOPBACK,
+                        help="also deliver multicast to listeners on this machine")
+
+
+def apply_router_arguments(args):
+    """Stores the options added by add_router_arguments in the module configuration."""
+    global ROUTER_ENGINE, OUTPUT_FORMAT, OUTPUT_TRANSPORT, OUTPUT_SINKS, AIRTIME_BUDGET_MS_PER_S
+    global DEVICE_GAMMA, QUANTIZE_TO_DEVICE, MIXING_MATRIX, MIXING_FILE, MIXING_COMBINE, INPUT_SOURCES
+    global PATTERN_CLIP_FILES, PATTERN_AUTOPLAY, AUDIO_INPUT, SESSION_RECORD_PATH, METRICS_PORT
+    global MULTICAST_GROUP, MULTICAST_TTL, MULTICAST_INTERFACE, MULTICAST_LOOPBACK
+    ROUTER_ENGINE = args.engine
+    OUTPUT_FORMAT = args.output_format
+    OUTPUT_TRANSPORT = args.transport
+    OUTPUT_SINKS = args.sink
+    AIRTIME_BUDGET_MS_PER_S = args.airtime_budget
+    DEVICE_GAMMA = args.device_gamma
+    QUANTIZE_TO_DEVICE = args.quantize
+    DEFAULT_CONDITIONING['smoothing_ms'] = args.smoothing_ms
+    MIXING_FILE = args.mixing
+    if MIXING_FILE:
+        MIXING_MATRIX = sharkee_mixing.load_matrix_file(MIXING_FILE)
+    # Checks the matrix's role names now rather than at engine start
+    rebuild_mixing_tables()
+    MIXING_COMBINE = args.mixing_combine
+    INPUT_SOURCES = args.source
+    PATTERN_CLIP_FILES = args.clips
+    load_pattern_files(PATTERN_CLIP_FILES)
+    unknown = [name for name in args.play if name not in PATTERN_PLAYER.clips]
+    if unknown:
+        raise ValueError(f"Unknown pattern clip(s): {', '.join(unknown)}")
+    PATTERN_AUTOPLAY = args.play
+    AUDIO_INPUT = args.audio
+    SESSION_RECORD_PATH = args.record
+    METRICS_PORT = args.metrics_port
+    rebuild_level_thresholds()
+    MULTICAST_GROUP = args.multicast_group
+    MULTICAST_TTL = args.multicast_ttl
+    MULTICAST_INTERFACE = args.multicast_interface
+    MULTICAST_LOOPBACK = args.multicast_loopback
+
+
+def main(argv=None):
+    """Runs the router without a GUI until SIGTERM/SIGINT. Returns the process exit code."""
+    parser = argparse.ArgumentParser(description="SharkeeHaptics Broadcast Router (headless)")
+    add_router_arguments(parser)
+    parser.add_argument("--stats-interval", type=float, default=HEADLESS_STATS_INTERVAL_S,
+                        help="seconds between statistics lines on stdout (0 disables them)")
+    args = parser.parse_args(argv)
+    try:
+        apply_router_arguments(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    stop_requested = threading.Event()
+    def request_stop(signum, frame):
+        stop_requested.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    try:
+        engine = start_router_engine()
+    except Exception as e:
+        hint = ""
+        if isinstance(e, OSError) and e.errno == errno.EADDRINUSE:
+            hint = f" (is VRChat or another application already using port {VRC_OSC_LISTEN_PORT}?)"
+        _print_event(f"Failed to start router: {e}{hint}", 'ERROR')
+        return 1
+    _print_event(f"OSC Broadcast Router started ({ROUTER_ENGINE} engine). Listening for VRChat on {VRC_OSC_LISTEN_IP}:{VRC_OSC_LISTEN_PORT}. Sending to {engine.sinks.describe()}.", 'SUCCESS')
+    for source in engine.sources:
+        _print_event(f"Merging input source {source.describe()}.", 'INFO')
+    if engine.recorder:
+        _print_event(f"Recording session to {engine.recorder.path}.", 'INFO')
+    if engine.metrics:
+        _print_event(f"Serving metrics at {engine.metrics.describe()}.", 'INFO')
+
+    next_stats = time.monotonic() + args.stats_interval
+    try:
+        while not stop_requested.wait(HEADLESS_EVENT_POLL_S):
+            _drain_events()
+            if args.stats_interval > 0 and time.monotonic() >= next_stats:
+                next_stats += args.stats_interval
+                _print_stats()
+    finally:
+        # Sends the final stops through the engine's own sinks (and recorder) before closing them
+        engine.stop()
+        _drain_events()
+        _print_stats()
+        _print_event("OSC Router stopped.", 'INFO')
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,349 @@
+"""
+Session recording: every datagram the router receives from VRChat and sends to the devices.
+
+A session is an append-only log plus an index next to it (PATH + ".idx"):
+
+    log     SESSION_MAGIC, then per datagram: timestamp (ns, big-endian u64), direction
+            (DIRECTION_IN / DIRECTION_OUT, u8), length (u32), the datagram itself
+    index   per record: timestamp (ns), byte offset of the record in the log (little-endian u64s)
+
+Timestamps are wall-clock nanoseconds advanced by the monotonic clock, so they never step
+backwards within a run and a log appended to by several runs stays in order.
+
+SessionRecorder is called on the receive and send paths and only appends to an in-memory
+deque; a background thread writes the log and index. SessionReader memory-maps the log and
+finds records through the index (rebuilding the part missing after a crash by scanning).
+replay() feeds the records back at their recorded pace, N times faster or as fast as possible.
+
+    python sharkee_session.py info PATH
+    python sharkee_session.py replay PATH [--speed N | --max] [--via engine|handler|udp]
+                                     [--to HOST:PORT] [router options, e.g. --sink file:out.bin]
+"""
+import argparse
+import array
+import bisect
+import collections
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+SESSION_MAGIC = b"SHKSES01"
+SESSION_RECORD_HEADER = struct.Struct(">QBI")
+SESSION_INDEX_ENTRY = struct.Struct("<QQ")
+DIRECTION_IN = 0
+DIRECTION_OUT = 1
+DIRECTION_NAMES = {DIRECTION_IN: "in", DIRECTION_OUT: "out"}
+
+# Records held in memory before the recorder starts dropping (the writer fell behind)
+SESSION_MAX_PENDING = 100_000
+# How often the writer thread drains the pending records to disk
+SESSION_FLUSH_INTERVAL_S = 0.05
+# Idle gaps longer than this (e.g. between two appended runs) are shortened on replay
+SESSION_REPLAY_MAX_GAP_S = 2.0
+
+
+class SessionRecorder:
+    """
+    Appends (timestamp, direction, datagram) records to a session log from a writer thread.
+
+    record() may be called from any thread; it never blocks and never touches the disk.
+    """
+
+    def __init__(self, path, max_pending=SESSION_MAX_PENDING):
+        self.path = path
+        self.max_pending = max_pending
+        self.records = [0, 0]  # per direction
+        self.dropped = 0
+        self.bytes_written = 0
+        self._pending = collections.deque()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._log = None
+        self._index = None
+        self._base_wall_ns = 0
+        self._base_perf_ns = 0
+
+    def start(self):
+        self._log = open(self.path, "ab")
+        self._index = open(self.path + ".idx", "ab")
+        if self._log.tell() == 0:
+            self._log.write(SESSION_MAGIC)
+        self._offset = self._log.tell()
+        self._base_wall_ns = time.time_ns()
+        self._base_perf_ns = time.perf_counter_ns()
+        self._thread = threading.Thread(target=self._run, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def record(self, direction, datagram):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((time.perf_counter_ns(), direction, bytes(datagram)))
+
+    def _run(self):
+        while not self._stop_event.wait(SESSION_FLUSH_INTERVAL_S):
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        pending = self._pending
+        if not pending:
+            return
+        log_chunks = []
+        index_chunks = []
+        offset = self._offset
+        shift = self._base_wall_ns - self._base_perf_ns
+        pack_header = SESSION_RECORD_HEADER.pack
+        pack_entry = SESSION_INDEX_ENTRY.pack
+        while pending:
+            perf_ns, direction, datagram = pending.popleft()
+            timestamp = perf_ns + shift
+            log_chunks.append(pack_header(timestamp, direction, len(datagram)))
+            log_chunks.append(datagram)
+            index_chunks.append(pack_entry(timestamp, offset))
+            offset += SESSION_RECORD_HEADER.size + len(datagram)
+            self.records[direction] += 1
+        # Log first: the index may lag the log after a crash, never run ahead of it
+        self._log.write(b"".join(log_chunks))
+        self._log.flush()
+        self._index.write(b"".join(index_chunks))
+        self._index.flush()
+        self.bytes_written += offset - self._offset
+        self._offset = offset
+
+    def stop(self):
+        """Writes what is pending and closes the files. Safe to call twice."""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self._log:
+            self._log.close()
+            self._index.close()
+            self._log = None
+
+    def stats(self):
+        return {'path': self.path, 'in': self.records[DIRECTION_IN], 'out': self.records[DIRECTION_OUT],
+                'dropped': self.dropped, 'bytes': self.bytes_written, 'pending': len(self._pending)}
+
+
+class SessionReader:
+    """
+    Random access to a session log through its index; the log itself is memory-mapped.
+
+    `timestamps` and `offsets` hold one entry per complete record (arrays of u64).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(SESSION_MAGIC):
+            self._file.close()
+            raise ValueError(f"{path} is not a session log")
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(SESSION_MAGIC)] != SESSION_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a session log")
+        self.timestamps = array.array("Q")
+        self.offsets = array.array("Q")
+        self.indexed = self._load_index()
+        self.scanned = self._scan(self._end_of(len(self.offsets) - 1) if self.offsets else len(SESSION_MAGIC))
+
+    def _load_index(self):
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        entries = array.array("Q")
+        entries.frombytes(data[:len(data) - len(data) % SESSION_INDEX_ENTRY.size])
+        if sys.byteorder == "big":
+            entries.byteswap()
+        if not entries or entries[1] != len(SESSION_MAGIC):
+            return 0  # empty, or not covering the start of the log: rebuild it all by scanning
+        self.timestamps = entries[0::2]
+        self.offsets = entries[1::2]
+        # Drop entries pointing past the end of the log (log truncated after the index was written)
+        count = len(self.offsets)
+        while count and self._end_of(count - 1) > len(self.map):
+            count -= 1
+        del self.timestamps[count:]
+        del self.offsets[count:]
+        return count
+
+    def _end_of(self, index):
+        offset = self.offsets[index]
+        if offset + SESSION_RECORD_HEADER.size > len(self.map):
+            return len(self.map) + 1
+        return offset + SESSION_RECORD_HEADER.size + SESSION_RECORD_HEADER.unpack_from(self.map, offset)[2]
+
+    def _scan(self, offset):
+        """Indexes the complete records from `offset` on (the part the index does not cover). Returns their count."""
+        scanned = 0
+        size = len(self.map)
+        unpack_from = SESSION_RECORD_HEADER.unpack_from
+        while offset + SESSION_RECORD_HEADER.size <= size:
+            timestamp, _, length = unpack_from(self.map, offset)
+            if offset + SESSION_RECORD_HEADER.size + length > size:
+                break
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+            offset += SESSION_RECORD_HEADER.size + length
+            scanned += 1
+        return scanned
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def record(self, index):
+        """Returns (timestamp_ns, direction, datagram bytes) of record `index`."""
+        offset = self.offsets[index]
+        timestamp, direction, length = SESSION_RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + SESSION_RECORD_HEADER.size
+        return timestamp, direction, self.map[start:start + length]
+
+    def find(self, timestamp_ns):
+        """Index of the first record at or after `timestamp_ns`."""
+        return bisect.bisect_left(self.timestamps, timestamp_ns)
+
+    def records(self, start=0, stop=None):
+        for index in range(start, len(self) if stop is None else stop):
+            yield self.record(index)
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+
+
+def replay(reader, deliver, speed=1.0, direction=DIRECTION_IN, start=0, stop=None,
+           max_gap_s=SESSION_REPLAY_MAX_GAP_S, stop_event=None):
+    """
+    Calls deliver(datagram) for every `direction` record, paced by the recorded timestamps.
+
+    `speed` 1.0 is real time, N is N times faster and 0 is as fast as possible. Returns
+    {'records', 'elapsed_s', 'recorded_s', 'late_p50_ms', 'late_p99_ms', 'late_max_ms'};
+    lateness is how far each delivery fell behind its paced time.
+    """
+    max_gap_ns = int(max_gap_s * 1e9)
+    lateness = []
+    delivered = 0
+    first = previous = None
+    skipped_ns = 0
+    began = time.perf_counter_ns()
+    for timestamp, record_direction, datagram in reader.records(start, stop):
+        if record_direction != direction:
+            continue
+        if stop_event is not None and stop_event.is_set():
+            break
+        if first is None:
+            first = previous = timestamp
+        if timestamp - previous > max_gap_ns:
+            skipped_ns += timestamp - previous - max_gap_ns
+        previous = timestamp
+        if speed:
+            due = began + (timestamp - first - skipped_ns) / speed
+            wait_ns = due - time.perf_counter_ns()
+            if wait_ns > 0:
+                time.sleep(wait_ns / 1e9)
+            lateness.append(max(0.0, time.perf_counter_ns() - due))
+        deliver(datagram)
+        delivered += 1
+    elapsed_s = (time.perf_counter_ns() - began) / 1e9
+    lateness.sort()
+    late = lambda pct: lateness[min(len(lateness) - 1, int(len(lateness) * pct / 100.0))] / 1e6 if lateness else 0.0
+    return {'records': delivered, 'elapsed_s': elapsed_s,
+            'recorded_s': ((previous - first - skipped_ns) / 1e9) if first is not None else 0.0,
+            'late_p50_ms': late(50), 'late_p99_ms': late(99), 'late_max_ms': lateness[-1] / 1e6 if lateness else 0.0}
+
+
+def _info(args):
+    reader = SessionReader(args.path)
+    try:
+        counts = [0, 0]
+        for _, direction, _ in reader.records():
+            counts[direction] += 1
+        duration_s = (reader.timestamps[-1] - reader.timestamps[0]) / 1e9 if len(reader) else 0.0
+        print(f"{args.path}: {len(reader)} records ({counts[DIRECTION_IN]} in, {counts[DIRECTION_OUT]} out) "
+              f"over {duration_s:.1f} s, {len(reader.map)} bytes")
+        print(f"  index: {reader.indexed} entries, {reader.scanned} records recovered by scanning")
+        if len(reader):
+            print(f"  first record {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.timestamps[0] / 1e9))}")
+    finally:
+        reader.close()
+    return 0
+
+
+def _replay(args):
+    import sharkee_router as router
+
+    try:
+        router.apply_router_arguments(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    reader = SessionReader(args.path)
+    engine = None
+    sock = None
+    try:
+        if args.via == "udp":
+            host, _, port = (args.to or f"127.0.0.1:{router.VRC_OSC_LISTEN_PORT}").rpartition(":")
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            target = (host, int(port))
+            deliver = lambda datagram: sock.sendto(datagram, target)
+        else:
+            # The engine listens on an ephemeral loopback port; records are fed to it in-process
+            engine = router.ROUTER_ENGINES[router.ROUTER_ENGINE](("127.0.0.1", 0))
+            engine.start()
+            if args.via == "engine":
+                deliver = engine.dispatch_datagram
+            else:
+                deliver = lambda datagram: router.dispatch_osc_datagram(datagram, router.sharkeehaptics_router_handler)
+            print(f"Replaying into the {router.ROUTER_ENGINE} engine ({args.via}), sending to {engine.sinks.describe()}.")
+        result = replay(reader, deliver, 0.0 if args.max else args.speed)
+        if engine:
+            time.sleep(0.1)  # let the scheduler emit the last updates
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if engine:
+            engine.stop()
+        if sock:
+            sock.close()
+        reader.close()
+    rate = result['records'] / result['elapsed_s'] if result['elapsed_s'] > 0 else 0.0
+    print(f"Replayed {result['records']} datagrams ({result['recorded_s']:.1f} s recorded) in {result['elapsed_s']:.2f} s, "
+          f"{rate:.0f}/s; late p50 {result['late_p50_ms']:.2f} ms, p99 {result['late_p99_ms']:.2f} ms, "
+          f"max {result['late_max_ms']:.2f} ms")
+    if engine:
+        print(f"Router: {router.PACKETS_RECEIVED} received, {router.PACKETS_ROUTED} routed.")
+    return 0
+
+
+def main(argv=None):
+    import sharkee_router as router
+
+    parser = argparse.ArgumentParser(description="SharkeeHaptics session log tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_info = sub.add_parser("info", help="record counts, duration and index state of a session log")
+    p_info.add_argument("path")
+    p_info.set_defaults(func=_info)
+    p_replay = sub.add_parser("replay", help="feed the received datagrams of a session log back through the router")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=1.0, help="replay speed (1 = as recorded)")
+    p_replay.add_argument("--max", action="store_true", help="replay as fast as possible")
+    p_replay.add_argument("--via", choices=("engine", "handler", "udp"), default="engine",
+                          help="router core fast path, the pythonosc + sharkeehaptics_router_handler path, "
+                               "or UDP to a running router")
+    p_replay.add_argument("--to", metavar="HOST:PORT", help="UDP target of --via udp (default: the local VRChat listen port)")
+    router.add_router_arguments(p_replay)
+    p_replay.set_defaults(func=_replay)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Deterministic tests for the per-role signal conditioning (sharkee_conditioning.py)."""
+import math
+import random
+import unittest
+
+import sharkee_conditioning
+from sharkee_conditioning import DEFAULT_CONDITIONING, SETTLE_EPSILON, SignalConditioner, is_identity
+
+DT = 0.01
+
+
+def run(conditioner, rows, dt=DT):
+    return [conditioner.process(row, dt) for row in rows]
+
+
+def noisy_rows(ticks=400, roles=3, seed=16):
+    rng = random.Random(seed)
+    return [[rng.uniform(-0.2, 1.2) for _ in range(roles)] for _ in range(ticks)]
+
+
+class IdentityTest(unittest.TestCase):
+
+    def test_is_identity(self):
+        self.assertTrue(is_identity({}))
+        self.assertTrue(is_identity(dict(DEFAULT_CONDITIONING)))
+        for key, value in (('smoothing_ms', 20.0), ('attack_per_s', 5.0), ('release_per_s', 5.0),
+                           ('gain', 1.5), ('curve', 2.0)):
+            self.assertFalse(is_identity({key: value}), key)
+
+    def test_identity_passes_input_through_clamped(self):
+        rows = noisy_rows()
+        for use_numpy in self._paths():
+            output = run(SignalConditioner([{}] * 3, use_numpy=use_numpy), rows)
+            expected = [[min(1.0, max(0.0, value)) for value in row] for row in rows]
+            for got, want in zip(output, expected):
+                for a, b in zip(got, want):
+                    self.assertAlmostEqual(a, b, places=12)
+
+    def _paths(self):
+        return (False, True) if sharkee_conditioning.load_numpy() is not None else (False,)
+
+
+class SmoothingTest(unittest.TestCase):
+
+    def test_step_response_after_one_time_constant(self):
+        conditioner = SignalConditioner([{'smoothing_ms': 100.0}], use_numpy=False)
+        for _ in range(10):
+            value = conditioner.process([1.0], DT)[0]
+        self.assertAlmostEqual(value, 1.0 - math.exp(-1.0), places=9)
+
+    def test_settles_exactly(self):
+        conditioner = SignalConditioner([{'smoothing_ms': 20.0}], use_numpy=False)
+        for _ in range(200):
+            value = conditioner.process([0.7], DT)[0]
+        self.assertEqual(value, 0.7)
+
+    def test_reset_restarts_from_zero(self):
+        conditioner = SignalConditioner([{'smoothing_ms': 50.0}], use_numpy=False)
+        first = run(conditioner, [[1.0]] * 5)
+        conditioner.reset()
+        self.assertEqual(run(conditioner, [[1.0]] * 5), first)
+
+
+class SlewTest(unittest.TestCase):
+
+    def test_rise_and_fall_limits(self):
+        conditioner = SignalConditioner([{'attack_per_s': 4.0, 'release_per_s': 2.0}] * 3, use_numpy=False)
+        previous = [0.0] * 3
+        slack = SETTLE_EPSILON + 1e-9
+        for row in run(conditioner, noisy_rows()):
+            for before, after in zip(previous, row):
+                self.assertLessEqual(after - before, 4.0 * DT + slack)
+                self.assertLessEqual(before - after, 2.0 * DT + slack)
+            previous = row
+
+    def test_ramp_to_full_takes_one_over_attack(self):
+        conditioner = SignalConditioner([{'attack_per_s': 5.0}], use_numpy=False)
+        output = run(conditioner, [[1.0]] * 25)
+        self.assertAlmostEqual(output[9][0], 0.5, places=9)
+        self.assertEqual(output[-1][0], 1.0)
+
+
+class ShapingTest(unittest.TestCase):
+
+    def test_gain_clamps(self):
+        conditioner = SignalConditioner([{'gain': 2.0}], use_numpy=False)
+        self.assertEqual(conditioner.process([0.25], DT), [0.5])
+        self.assertEqual(conditioner.process([0.8], DT), [1.0])
+
+    def test_curve_exponent(self):
+        conditioner = SignalConditioner([{'curve': 2.0}], use_numpy=False)
+        self.assertAlmostEqual(conditioner.process([0.5], DT)[0], 0.25, places=12)
+        self.assertEqual(conditioner.process([1.0], DT), [1.0])
+        self.assertEqual(conditioner.process([0.0], DT), [0.0])
+
+    def test_invalid_parameters(self):
+        for params in ({'smoothing_ms': -1.0}, {'attack_per_s': -1.0}, {'release_per_s': -1.0}, {'curve': 0.0}):
+            with self.assertRaises(ValueError):
+                SignalConditioner([params])
+
+
+class DeterminismTest(unittest.TestCase):
+    PARAMS = [{'smoothing_ms': 30.0, 'attack_per_s': 8.0, 'release_per_s': 4.0, 'gain': 1.1, 'curve': 1.3}] * 3
+
+    def test_repeatable(self):
+        rows = noisy_rows()
+        self.assertEqual(run(SignalConditioner(self.PARAMS, use_numpy=False), rows),
+                         run(SignalConditioner(self.PARAMS, use_numpy=False), rows))
+
+    @unittest.skipIf(sharkee_conditioning.load_numpy() is None, "NumPy not installed")
+    def test_numpy_matches_python(self):
+        rows = noisy_rows()
+        reference = run(SignalConditioner(self.PARAMS, use_numpy=False), rows)
+        vectorized = run(SignalConditioner(self.PARAMS, use_numpy=True), rows)
+        worst = max(abs(a - b) for row_a, row_b in zip(vectorized, reference) for a, b in zip(row_a, row_b))
+        self.assertLess(worst, 1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Round-trip and error tests for the binary haptic frame (sharkee_frame.py)."""
+import random
+import unittest
+
+import sharkee_frame
+from sharkee_frame import FRAME_HEADER, FRAME_MAX_ROLES, FrameError, decode_frame, encode_frame
+
+
+class FrameRoundTripTest(unittest.TestCase):
+
+    def test_every_role(self):
+        levels = {index: (index * 23) % 256 for index in range(FRAME_MAX_ROLES)}
+        frame = encode_frame(7, levels)
+        self.assertEqual(len(frame), FRAME_HEADER.size + FRAME_MAX_ROLES)
+        self.assertEqual(decode_frame(frame), (7, levels))
+
+    def test_eleven_roles_fit_in_seventeen_bytes(self):
+        self.assertEqual(len(encode_frame(0, {index: 255 for index in range(11)})), 17)
+
+    def test_empty_mask(self):
+        frame = encode_frame(1, {})
+        self.assertEqual(len(frame), FRAME_HEADER.size)
+        self.assertEqual(decode_frame(frame), (1, {}))
+
+    def test_random_subsets(self):
+        rng = random.Random(8)
+        for _ in range(500):
+            roles = rng.sample(range(FRAME_MAX_ROLES), rng.randrange(FRAME_MAX_ROLES + 1))
+            levels = {index: rng.randrange(256) for index in roles}
+            sequence = rng.randrange(65536)
+            self.assertEqual(decode_frame(encode_frame(sequence, levels)), (sequence, levels))
+
+    def test_sequence_wraps(self):
+        self.assertEqual(decode_frame(encode_frame(65536 + 5, {0: 1}))[0], 5)
+
+    def test_pack_frame_into_matches_encoder(self):
+        buffer = bytearray(sharkee_frame.FRAME_MAX_SIZE)
+        levels = [0] * FRAME_MAX_ROLES
+        levels[1], levels[4], levels[10] = 12, 200, 255
+        size = sharkee_frame.pack_frame_into(buffer, 99, (1 << 1) | (1 << 4) | (1 << 10), levels)
+        self.assertEqual(bytes(buffer[:size]), encode_frame(99, {1: 12, 4: 200, 10: 255}))
+
+    def test_intensity_to_level(self):
+        self.assertEqual(sharkee_frame.intensity_to_level(-0.5), 0)
+        self.assertEqual(sharkee_frame.intensity_to_level(0.0), 0)
+        self.assertEqual(sharkee_frame.intensity_to_level(0.5), 128)
+        self.assertEqual(sharkee_frame.intensity_to_level(1.0), 255)
+        self.assertEqual(sharkee_frame.intensity_to_level(7.0), 255)
+
+
+class FrameErrorTest(unittest.TestCase):
+
+    def test_shorter_than_header(self):
+        for size in range(FRAME_HEADER.size):
+            with self.assertRaises(FrameError):
+                decode_frame(encode_frame(3, {0: 10})[:size])
+
+    def test_truncated_levels(self):
+        frame = encode_frame(3, {0: 10, 5: 20, 9: 30})
+        with self.assertRaises(FrameError):
+            decode_frame(frame[:-1])
+
+    def test_trailing_bytes(self):
+        with self.assertRaises(FrameError):
+            decode_frame(encode_frame(3, {0: 10}) + b"\x00")
+
+    def test_bad_magic(self):
+        frame = encode_frame(3, {0: 10})
+        with self.assertRaises(FrameError):
+            decode_frame(b"XX" + frame[2:])
+
+    def test_osc_message_is_not_a_frame(self):
+        with self.assertRaises(FrameError):
+            decode_frame(b"/sharkeehaptics/set_intensity/head\x00\x00,f\x00\x00?\x80\x00\x00")
+
+    def test_role_index_out_of_range(self):
+        for index in (FRAME_MAX_ROLES, FRAME_MAX_ROLES + 5, -1):
+            with self.assertRaises(FrameError):
+                encode_frame(0, {index: 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
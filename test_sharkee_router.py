@@ -0,0 +1,135 @@
+"""Tests for the router's change detection and engine startup (sharkee_router.py)."""
+import os
+import random
+import socket
+import tempfile
+import threading
+import unittest
+
+import sharkee_router as router
+
+
+def replay(values, receiver_name="Chest", quantize=True):
+    """Feeds `values` to emit_role_intensity from a fresh state; returns the values sent."""
+    router.reset_role_state()
+    router.QUANTIZE_TO_DEVICE = quantize
+    sent = []
+    for value in values:
+        router.emit_role_intensity(receiver_name, value, lambda name, value: sent.append(value))
+    return sent
+
+
+class LevelDeadbandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (router.QUANTIZE_TO_DEVICE, dict(router.ROLE_DEADBAND), router.DEADBAND_SCALE)
+
+    def tearDown(self):
+        router.QUANTIZE_TO_DEVICE, deadbands, router.DEADBAND_SCALE = self.saved
+        router.ROLE_DEADBAND.clear()
+        router.ROLE_DEADBAND.update(deadbands)
+        router.reset_role_state()
+
+    def noisy_trace(self, seed=15):
+        rng = random.Random(seed)
+        trace = []
+        for _ in range(40):
+            peak = rng.uniform(0.2, 1.0)
+            trace += [peak * step / 30 for step in range(1, 31)]
+            trace += [min(1.0, max(0.0, peak + rng.gauss(0.0, 0.01))) for _ in range(100)]
+            trace += [peak * (1.0 - step / 30) for step in range(1, 31)]
+        return trace
+
+    def test_never_more_sends_than_raw_detector(self):
+        trace = self.noisy_trace()
+        for scale in (1.0, 2.5):
+            router.DEADBAND_SCALE = scale
+            self.assertLessEqual(len(replay(trace)), len(replay(trace, quantize=False)), scale)
+
+    def test_one_level_step_inside_deadband_is_not_sent(self):
+        self.assertEqual(replay([0.5, 0.505, 0.51]), [0.5])
+
+    def test_change_past_deadband_is_sent(self):
+        self.assertEqual(replay([0.5, 0.6, 0.4]), [0.5, 0.6, 0.4])
+
+    def test_role_deadband_applies_to_levels(self):
+        router.ROLE_DEADBAND["Chest"] = 0.2
+        self.assertEqual(replay([0.5, 0.6, 0.65, 0.75]), [0.5, 0.75])
+        self.assertEqual(replay([0.5, 0.6], receiver_name="Head"), [0.5, 0.6])
+
+    def test_deadband_scale_widens_level_deadband(self):
+        router.DEADBAND_SCALE = 4.0
+        self.assertEqual(replay([0.5, 0.6, 0.7]), [0.5, 0.7])
+
+    def test_stop_sent_once(self):
+        self.assertEqual(replay([0.5, 0.0, 0.01, 0.0]), [0.5, 0.0])
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FailedStartTest(unittest.TestCase):
+    """A sink that cannot start must not leave the metrics endpoint or the recorder running."""
+
+    SETTINGS = ("OUTPUT_SINKS", "METRICS_PORT", "METRICS_BIND_IP", "SESSION_RECORD_PATH",
+                "VRC_OSC_LISTEN_IP", "VRC_OSC_LISTEN_PORT")
+
+    def setUp(self):
+        self.saved = {name: getattr(router, name) for name in self.SETTINGS}
+        self.directory = tempfile.TemporaryDirectory()
+        router.OUTPUT_SINKS = ["serial:/dev/nonexistent-sharkee"]
+        router.METRICS_BIND_IP = "127.0.0.1"
+        router.METRICS_PORT = free_port()
+        router.SESSION_RECORD_PATH = os.path.join(self.directory.name, "session.log")
+        router.VRC_OSC_LISTEN_IP = "127.0.0.1"
+        router.VRC_OSC_LISTEN_PORT = free_port()
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(router, name, value)
+        self.directory.cleanup()
+
+    def assert_released(self):
+        names = {thread.name for thread in threading.enumerate()}
+        self.assertFalse(names & {"MetricsServer", "MetricsRefresh", "SessionRecorder"}, names)
+        self.assertFalse([name for name in names if name.startswith("OutputSink")], names)
+        self.assertIs(router.ACTIVE_TRANSPORT, router.DEFAULT_TRANSPORT)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", router.METRICS_PORT))
+
+    def test_every_engine_releases_what_it_started(self):
+        for engine_name in sorted(router.ROUTER_ENGINES):
+            with self.subTest(engine=engine_name):
+                for _ in range(2):
+                    with self.assertRaises(Exception):
+                        router.start_router_engine(engine_name)
+                    self.assert_released()
+
+    def test_busy_metrics_port_stops_the_started_sinks(self):
+        router.OUTPUT_SINKS = []
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as busy:
+            busy.bind(("127.0.0.1", router.METRICS_PORT))
+            busy.listen()
+            for engine_name in sorted(router.ROUTER_ENGINES):
+                with self.subTest(engine=engine_name):
+                    with self.assertRaises(OSError):
+                        router.start_router_engine(engine_name)
+                    names = {thread.name for thread in threading.enumerate()}
+                    self.assertFalse([name for name in names if name.startswith(("OutputSink", "SessionRecorder"))], names)
+                    self.assertIs(router.ACTIVE_TRANSPORT, router.DEFAULT_TRANSPORT)
+
+    def test_open_transport_undoes_a_partial_start(self):
+        engine = router.ROUTER_ENGINES["thread"]((router.VRC_OSC_LISTEN_IP, router.VRC_OSC_LISTEN_PORT))
+        try:
+            with self.assertRaises(Exception):
+                engine._open_transport()
+            self.assert_released()
+        finally:
+            engine.sock.close()
+
+
+if __name__ == "__main__":
+    unittest.main()